@@ -1,20 +1,23 @@
+import sys
+from os.path import abspath, dirname
 from cobra import io
 
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from code.session import SimulationSession
+
 # Load model
 model = io.read_sbml_model(r"E:\22_CodeProjects\yeast-GEM_GuiY\model\yeast-GEM.xml")  # adjust path as needed
 
-# Check biomass objective value
-solution = model.optimize()
-print("Default biomass objective:", solution.objective_value)
-
-# Change objective: Ethanol production (check actual reaction ID first!)
-model.objective = "r_1761"
-solution = model.optimize()
-print("Max ethanol production:", solution.objective_value)
-
-# Optional: Knock out a gene
-gene = model.genes.get_by_id("YGR192C")  # example gene
-gene.knock_out()
-solution = model.optimize()
-print("Objective after knockout:", solution.objective_value)
-
+# One solver problem for all simulations: each scenario only changes what differs from the previous one
+scenarios = [
+    # Check biomass objective value
+    {"id": "Default biomass objective"},
+    # Change objective: Ethanol production (check actual reaction ID first!)
+    {"id": "Max ethanol production", "objective": "r_1761"},
+    # Optional: Knock out a gene (example gene)
+    {"id": "Objective after knockout", "objective": "r_1761", "genes": ["YGR192C"]},
+]
+with SimulationSession(model) as session:
+    results = session.run(scenarios)
+for name, objective_value in results["objective"].items():
+    print(f"{name}:", objective_value)
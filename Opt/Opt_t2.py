@@ -2,104 +2,32 @@
 查照关键字的相关反应
 """
 
-from cobra.io import read_sbml_model
-from collections import defaultdict
+import sys
+from os.path import abspath, dirname
 import pandas as pd
 
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from code.model_view import read_model_view
+from code.search import SearchIndex
 
 
-def find_keyword_related_components(model, keywords, case_sensitive=False):
+
+def find_keyword_related_components(model, keywords, case_sensitive=False, index=None):
     """
     查找模型中与关键字相关的反应和代谢物
     
     参数:
-        model: 加载的COBRA模型对象
+        model: 加载的COBRA模型对象或只读模型视图（ModelView）
         keywords: 字符串或字符串列表，要搜索的关键字
         case_sensitive: 是否区分大小写
+        index: 已建立的 SearchIndex（多次查询时复用，避免重复扫描模型）
         
     返回:
         dict: 包含反应和代谢物信息的字典
     """
-    if isinstance(keywords, str):
-        keywords = [keywords]
-    
-    # 初始化结果存储
-    results = {
-        'search_keywords': keywords,
-        'reactions': defaultdict(list),
-        'metabolites': defaultdict(list),
-        'summary': {}
-    }
-    
-    # 设置匹配函数
-    def is_match(text):
-        text = str(text)
-        if not case_sensitive:
-            text = text.lower()
-            kw_list = [kw.lower() for kw in keywords]
-        else:
-            kw_list = keywords
-        return any(kw in text for kw in kw_list)
-    
-    # 搜索代谢物
-    for met in model.metabolites:
-        fields_to_check = {
-            'id': met.id,
-            'name': met.name,
-            'formula': met.formula,
-            'compartment': met.compartment
-        }
-        
-        for field, value in fields_to_check.items():
-            if value and is_match(value):
-                results['metabolites'][met.id].append({
-                    'field': field,
-                    'value': value,
-                    'compartment': met.compartment
-                })
-    
-    # 搜索反应
-    for rxn in model.reactions:
-        # 检查反应ID和名称
-        fields_checked = {}
-        if is_match(rxn.id):
-            fields_checked['id'] = rxn.id
-        if rxn.name and is_match(rxn.name):
-            fields_checked['name'] = rxn.name
-        
-        # 检查反应方程式中的代谢物
-        met_matches = []
-        for met in rxn.metabolites:
-            if is_match(met.id) or (met.name and is_match(met.name)):
-                met_matches.append({
-                    'metabolite_id': met.id,
-                    'metabolite_name': met.name,
-                    'coefficient': rxn.metabolites[met]
-                })
-        
-        # 如果有匹配则记录
-        if fields_checked or met_matches:
-            results['reactions'][rxn.id] = {
-                'name': rxn.name,
-                'matches': fields_checked,
-                'metabolite_matches': met_matches,
-                'reaction_string': rxn.build_reaction_string(),
-                'subsystem': rxn.subsystem,
-                'lower_bound': rxn.lower_bound,
-                'upper_bound': rxn.upper_bound
-            }
-    
-    # 生成摘要统计
-    results['summary'] = {
-        'Reaction ID': rxn.id,
-        'Name': rxn.name,
-        'total_reactions_matched': len(results['reactions']),
-        'total_metabolites_matched': len(results['metabolites']),
-        'matched_reaction_ids': list(results['reactions'].keys()),
-        'matched_metabolite_ids': list(results['metabolites'].keys())
-    }
-    
-    return results
+    if index is None:
+        index = SearchIndex(model)
+    return index.search(keywords, case_sensitive=case_sensitive)
 
 # def save_results(results, output_prefix):
 #     """
@@ -204,7 +132,7 @@ if __name__ == "__main__":
     
     # 加载模型
     print(f"Loading model from {MODEL_PATH}...")
-    model = read_sbml_model(MODEL_PATH)
+    model = read_model_view(MODEL_PATH)  # 只读视图：不建COBRA对象和求解器，查询足够
     print(f"Model loaded: {len(model.reactions)} reactions, {len(model.metabolites)} metabolites")
     
     # # 执行搜索
@@ -227,7 +155,8 @@ if __name__ == "__main__":
 
     # 执行搜索
     print(f"\n正在搜索关键词: {', '.join(SEARCH_KEYWORDS)}")
-    results = find_keyword_related_components(model, SEARCH_KEYWORDS, case_sensitive=False)
+    index = SearchIndex.for_model_file(MODEL_PATH)  # 索引按模型文件缓存，文件不变时直接读取
+    results = find_keyword_related_components(model, SEARCH_KEYWORDS, case_sensitive=False, index=index)
     
     # 输出结果
     print_results(results)
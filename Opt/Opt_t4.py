@@ -1,17 +1,20 @@
 # analyze_mva.py
-from cobra.io import read_sbml_model
+import sys
+from os.path import abspath, dirname
 import pandas as pd
 
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from code.model_view import read_model_view
+from code.search import SearchIndex
+
 # 加载模型
 Model_path = r"D:\22_CodeProjects\yeast-GEM_GuiY\model\yeast-GEM.xml"
-model = read_sbml_model(Model_path)  # 修改为你的路径
+model = read_model_view(Model_path)  # 修改为你的路径；只读视图，无需求解器
 
 # 搜索包含 "mva" 或 "mevalonate" 的反应
 keywords = ["mva", "mevalonate"]
-mva_related_reactions = [
-    rxn for rxn in model.reactions
-    if any(k in rxn.id.lower() or k in rxn.name.lower() for k in keywords)
-]
+index = SearchIndex.for_model_file(Model_path)  # 索引按模型文件缓存，文件不变时直接读取
+mva_related_reactions = [model.reactions.get_by_id(rxn_id) for rxn_id in index.find_reactions(keywords)]
 
 # 打印相关反应信息
 for rxn in mva_related_reactions:
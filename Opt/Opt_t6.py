@@ -6,110 +6,58 @@
 输出敲除组合及对 MVA 的提升预测
 '''
 
+import sys
+from os.path import abspath, dirname
 from cobra.io import read_sbml_model
 from cobra.flux_analysis import pfba
-from itertools import combinations
-import pandas as pd
 
-# Step 1: 加载模型
-Model_path = r"D:\22_CodeProjects\yeast-GEM_GuiY\model\yeast-GEM.xml"
-model = read_sbml_model(Model_path)  # 路径根据你文件位置调整
-
-# Step 2: 查找 MVA 的胞外输出反应
-mva_met = next((m for m in model.metabolites 
-                if "mevalonate" in m.name.lower() and m.compartment == "c"), None)
-if not mva_met:
-    raise Exception("找不到胞质中的 mevalonate")
-
-mva_export_rxn = None
-for rxn in model.reactions:
-    if mva_met in rxn.metabolites and "->" in rxn.reaction and mva_met in rxn.products:
-        mva_export_rxn = rxn
-        break
-if not mva_export_rxn:
-    raise Exception("未找到 MVA 输出反应")
-
-# Step 3: 设置最大生长速率
-biomass_rxn = model.reactions.get_by_id("r_2111")  # 通常是 biomass
-max_growth = pfba(model).fluxes[biomass_rxn.id]
-biomass_rxn.lower_bound = 0.8 * max_growth
-print(f"生长下限设置为 {0.8 * max_growth:.4f} mmol/gDW/h")
-
-# Step 4: 筛选可敲除的基因相关反应（可选步骤）
-# 这里简化处理，选择所有非必需且非生物质相关的反应作为候选
-candidate_reactions = [rxn.id for rxn in model.reactions 
-                      if rxn.id != biomass_rxn.id 
-                      and not rxn.id.startswith(('EX_', 'DM_', 'sink_'))]
-
-print(f"候选敲除反应数量: {len(candidate_reactions)}")
-
-# 限制候选反应数量以避免组合爆炸
-if len(candidate_reactions) > 100:
-    import random
-    candidate_reactions = random.sample(candidate_reactions, 100)
-
-# Step 5: 简单的 OptKnock 实现（尝试有限组合）
-results = []
-max_knockouts = 3
-top_n = 10  # 保存前10个最佳结果
-
-# 评估所有可能的单敲除
-for knockout in candidate_reactions:
-    with model:
-        model.reactions.get_by_id(knockout).knock_out()
-        try:
-            growth = pfba(model).fluxes[biomass_rxn.id]
-            production = pfba(model).fluxes[mva_export_rxn.id]
-            results.append({
-                "knockouts": [knockout],
-                "fitness": production,
-                "biomass": growth,
-                "production": production
-            })
-        except:
-            continue
-
-# 评估双敲除组合（如果候选反应不太多）
-if len(candidate_reactions) <= 50:
-    for knockout1, knockout2 in combinations(candidate_reactions, 2):
-        with model:
-            model.reactions.get_by_id(knockout1).knock_out()
-            model.reactions.get_by_id(knockout2).knock_out()
-            try:
-                growth = pfba(model).fluxes[biomass_rxn.id]
-                production = pfba(model).fluxes[mva_export_rxn.id]
-                results.append({
-                    "knockouts": [knockout1, knockout2],
-                    "fitness": production,
-                    "biomass": growth,
-                    "production": production
-                })
-            except:
-                continue
-
-# 评估三敲除组合（如果候选反应很少）
-if len(candidate_reactions) <= 20:
-    for knockout_combo in combinations(candidate_reactions, 3):
-        with model:
-            for ko in knockout_combo:
-                model.reactions.get_by_id(ko).knock_out()
-            try:
-                growth = pfba(model).fluxes[biomass_rxn.id]
-                production = pfba(model).fluxes[mva_export_rxn.id]
-                results.append({
-                    "knockouts": list(knockout_combo),
-                    "fitness": production,
-                    "biomass": growth,
-                    "production": production
-                })
-            except:
-                continue
-
-# Step 6: 分析结果
-if results:
-    df = pd.DataFrame(results)
-    df = df.sort_values("fitness", ascending=False).head(top_n)
-    print("最佳基因敲除组合：")
-    print(df[["knockouts", "fitness", "biomass", "production"]])
-else:
-    print("没有找到可行的敲除组合")
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from code.exchange import ExchangeResolver
+from code.knockout_search import count_combinations, knockout_search, prune_candidates
+
+if __name__ == "__main__":  # 并行搜索需要（Windows 下子进程会重新导入本脚本）
+    # Step 1: 加载模型
+    Model_path = r"D:\22_CodeProjects\yeast-GEM_GuiY\model\yeast-GEM.xml"
+    model = read_sbml_model(Model_path)  # 路径根据你文件位置调整
+
+    # Step 2: 查找 MVA 的胞外输出反应
+    resolver = ExchangeResolver(model)
+    mva = resolver.resolve("(R)-mevalonate")
+    if not mva["cytosolic_id"]:
+        raise Exception("找不到胞质中的 mevalonate")
+
+    # 胞质 MVA 经转运反应到达胞外后由交换反应输出
+    if not mva["exchange_id"] or mva["transport_ids"] is None:
+        raise Exception("未找到 MVA 输出反应")
+    mva_export_rxn = model.reactions.get_by_id(mva["exchange_id"])
+
+    # Step 3: 设置最大生长速率
+    biomass_rxn = model.reactions.get_by_id("r_2111")  # 通常是 biomass
+    max_growth = pfba(model).fluxes[biomass_rxn.id]
+    biomass_rxn.lower_bound = 0.8 * max_growth
+    print(f"生长下限设置为 {0.8 * max_growth:.4f} mmol/gDW/h")
+    model.objective = mva_export_rxn
+
+    # Step 4: 筛选可敲除的反应
+    # 用一次 FVA 去掉零通量反应与必需反应，并把通量总是成比例的反应合并为一个候选
+    candidate_reactions = [rxn.id for rxn in model.reactions
+                          if rxn.id != biomass_rxn.id
+                          and rxn.id != mva_export_rxn.id
+                          and not rxn.boundary]
+    candidate_groups = prune_candidates(model, candidate_reactions)
+
+    print(f"候选敲除反应数量: {len(candidate_reactions)}（合并后 {len(candidate_groups)} 组）")
+
+    # Step 5: 组合敲除搜索（每个组合只求解一次，多进程枚举，只保留最佳的 top_n 个结果）
+    max_knockouts = 2  # 3 也可以，但组合数会大很多
+    top_n = 10  # 保存前10个最佳结果
+    print(f"最多需要求解 {count_combinations(len(candidate_groups), max_knockouts)} 个组合")
+    df = knockout_search(model, mva_export_rxn.id, candidate_groups,
+                         max_knockouts=max_knockouts, top_n=top_n)
+
+    # Step 6: 分析结果
+    if not df.empty:
+        print("最佳基因敲除组合：")
+        print(df[["knockouts", "fitness", "biomass", "production"]])
+    else:
+        print("没有找到可行的敲除组合")
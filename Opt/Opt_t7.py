@@ -7,6 +7,10 @@ from cobra.flux_analysis import single_gene_deletion
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from code.annotations import open_annotation_store
 
 # ----------------------------
 # STEP 1: 加载酵母9代谢模型
@@ -54,14 +58,17 @@ model.objective = "MVA_ex"
 # ----------------------------
 # STEP 3: 模拟基因敲除（酵母9基因ID）
 # ----------------------------
-# 靶点基因列表（根据酵母9的基因ID调整）
-target_genes = [
-    "YGR175C",  # ERG9 (角鲨烯合成酶)
-    "YPL028W",  # ERG12 (MVA激酶)
-    "YPL061W",  # ALD6 (乙醛脱氢酶)
-    "YLR044C",  # PDC1 (丙酮酸脱羧酶)
-    "YPL231W",  # FAS1 (脂肪酸合成)
+# 靶点基因列表（基因名通过本地注释库映射为酵母9的系统基因ID）
+target_names = [
+    "ERG9",   # 角鲨烯合成酶
+    "ERG12",  # MVA激酶
+    "ALD6",   # 乙醛脱氢酶
+    "PDC1",   # 丙酮酸脱羧酶
+    "FAS1",   # 脂肪酸合成
 ]
+annotations = open_annotation_store()
+target_genes = [annotations.gene_id(name) for name in target_names]
+print(dict(zip(target_names, target_genes)))
 
 # 单基因敲除分析
 ko_results = single_gene_deletion(
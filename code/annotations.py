@@ -0,0 +1,326 @@
+"""
+Indexed SQLite store of the annotation tables in data/databases (SGD gene names, SwissProt, KEGG, Complex
+Portal, YMDB concentrations and BiGG dictionaries), rebuilt automatically whenever a source file changes.
+"""
+
+import csv
+import os
+import re
+import sqlite3
+import tempfile
+from .cache import file_hash, snapshot_key
+from .io import CACHE_PATH, REPO_PATH
+
+DATABASES_PATH = f"{REPO_PATH}/data/databases"
+ANNOTATION_DB_PATH = f"{CACHE_PATH}/annotations.sqlite"
+STORE_VERSION = 1  # increase when the schema or the parsing changes, to force a rebuild
+SOURCE_FILES = ("SGDgeneNames.tsv", "swissprot.tsv", "kegg.tsv", "Yeast_complex_portal_2022.tsv",
+                "YMDBconcentrations.csv", "BiGGmetDictionary.csv", "BiGGmetDictionary_newIDs.csv",
+                "BiGGrxnDictionary.csv", "BiGGrxnDictionary_newIDs.csv")
+BIGG_FILES = {("metabolite", False): "BiGGmetDictionary.csv", ("metabolite", True): "BiGGmetDictionary_newIDs.csv",
+              ("reaction", False): "BiGGrxnDictionary.csv", ("reaction", True): "BiGGrxnDictionary_newIDs.csv"}
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE genes (systematic_name TEXT, standard_name TEXT);
+CREATE INDEX genes_systematic ON genes (systematic_name);
+CREATE INDEX genes_standard ON genes (standard_name COLLATE NOCASE);
+CREATE TABLE proteins (source TEXT, uniprot TEXT, name TEXT, gene_id TEXT, ec_code TEXT, mw REAL,
+                       pathway TEXT, sequence TEXT);
+CREATE INDEX proteins_uniprot ON proteins (uniprot);
+CREATE TABLE protein_genes (protein_id INTEGER, gene TEXT);
+CREATE INDEX protein_genes_gene ON protein_genes (gene COLLATE NOCASE);
+CREATE INDEX protein_genes_protein ON protein_genes (protein_id);
+CREATE TABLE protein_ecs (protein_id INTEGER, ec TEXT);
+CREATE INDEX protein_ecs_ec ON protein_ecs (ec);
+CREATE INDEX protein_ecs_protein ON protein_ecs (protein_id);
+CREATE TABLE complexes (complex_id TEXT PRIMARY KEY, name TEXT, aliases TEXT, taxonomy TEXT,
+                        go_annotations TEXT, description TEXT);
+CREATE TABLE complex_members (complex_id TEXT, member TEXT, stoichiometry INTEGER);
+CREATE INDEX complex_members_member ON complex_members (member);
+CREATE TABLE concentrations (ymdb_id TEXT, name TEXT, chebi TEXT, kegg TEXT, mean REAL, max REAL,
+                             min REAL, concs TEXT);
+CREATE INDEX concentrations_kegg ON concentrations (kegg);
+CREATE INDEX concentrations_chebi ON concentrations (chebi);
+CREATE TABLE bigg (kind TEXT, new_ids INTEGER, model_id TEXT, bigg_id TEXT);
+CREATE INDEX bigg_model_id ON bigg (kind, new_ids, model_id);
+CREATE INDEX bigg_bigg_id ON bigg (kind, bigg_id);
+"""
+
+# stores of this process by path, reopened only if the source files change:
+_stores = {}
+
+
+def sources_key(databases_path=DATABASES_PATH):
+    """Gets the key of the current content of the source files."""
+    return snapshot_key(STORE_VERSION, *(file_hash(f"{databases_path}/{name}") for name in SOURCE_FILES))
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _read_table(file_path, delimiter="\t"):
+    with open(file_path, encoding="utf-8", newline="") as table_file:
+        reader = csv.reader(table_file, delimiter=delimiter)
+        header = next(reader)
+        for row in reader:
+            yield dict(zip(header, row))
+
+
+def _fill_store(connection, databases_path):
+    connection.executemany("INSERT INTO genes VALUES (?, ?)",
+                           ((row["Systematic_name"], row["Standard_name"] or None)
+                            for row in _read_table(f"{databases_path}/SGDgeneNames.tsv")))
+    for source in ("swissprot", "kegg"):
+        for row in _read_table(f"{databases_path}/{source}.tsv"):
+            protein_id = connection.execute(
+                "INSERT INTO proteins VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (source, row["uniprot"] or None, row["name"], row["gene_id"], row["ec_code"] or None,
+                 _float(row["MW"]), row.get("pathway") or None, row["sequence"] or None)).lastrowid
+            connection.executemany("INSERT INTO protein_genes VALUES (?, ?)",
+                                   ((protein_id, gene) for gene in row["gene_id"].split()))
+            connection.executemany("INSERT INTO protein_ecs VALUES (?, ?)",
+                                   ((protein_id, ec) for ec in row["ec_code"].split()))
+    for row in _read_table(f"{databases_path}/Yeast_complex_portal_2022.tsv"):
+        complex_id = row["#Complex ac"]
+        connection.execute("INSERT INTO complexes VALUES (?, ?, ?, ?, ?, ?)",
+                           (complex_id, row["Recommended name"], row["Aliases for complex"],
+                            row["Taxonomy identifier"], row["Go Annotations"], row["Description"]))
+        members = re.findall(r"([^|(]+)\((\d+)\)", row["Identifiers (and stoichiometry) of molecules in complex"])
+        connection.executemany("INSERT INTO complex_members VALUES (?, ?, ?)",
+                               ((complex_id, member, int(stoichiometry)) for member, stoichiometry in members))
+    connection.executemany("INSERT INTO concentrations VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           ((row["IDs"], row["metNames"], row["chebi"] or None, row["kegg"] or None,
+                             _float(row["mean"]), _float(row["max"]), _float(row["min"]), row["concs"])
+                            for row in _read_table(f"{databases_path}/YMDBconcentrations.csv", ",")))
+    for (kind, new_ids), file_name in BIGG_FILES.items():
+        with open(f"{databases_path}/{file_name}", encoding="utf-8", newline="") as bigg_file:
+            connection.executemany("INSERT INTO bigg VALUES (?, ?, ?, ?)",
+                                   ((kind, new_ids, row[0], row[1]) for row in csv.reader(bigg_file) if row))
+
+
+def build_annotation_store(db_path=ANNOTATION_DB_PATH, databases_path=DATABASES_PATH):
+    """Compiles the source files into a new SQLite file, replacing the old one atomically.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        Path of the store.
+    databases_path : str, optional
+        Folder with the source files.
+
+    Returns
+    -------
+    str
+        Key of the sources the store was built from (see `sources_key`).
+    """
+    key = sources_key(databases_path)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=os.path.dirname(db_path), suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        connection = sqlite3.connect(tmp_path)
+        try:
+            with connection:
+                connection.executescript(SCHEMA)
+                _fill_store(connection, databases_path)
+                connection.execute("INSERT INTO meta VALUES ('sources_key', ?)", (key,))
+        finally:
+            connection.close()
+        os.replace(tmp_path, db_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return key
+
+
+class AnnotationStore:
+    """Read-only queries on the annotation store. Use `open_annotation_store` to get an up-to-date one.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        Path of the store.
+    """
+
+    def __init__(self, db_path=ANNOTATION_DB_PATH):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+
+    @property
+    def sources_key(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'sources_key'").fetchone()
+        return row[0] if row else None
+
+    def _column(self, query, *parameters):
+        return list(dict.fromkeys(row[0] for row in self.connection.execute(query, parameters)))
+
+    def gene_id(self, name):
+        """Gets the systematic name of a gene (e.g. "ERG9" -> "YHR190W") from SGD, or from the gene
+        aliases of SwissProt/KEGG. Systematic names are returned as they are.
+
+        Returns
+        -------
+        str or None
+        """
+        found = self._column("SELECT systematic_name FROM genes WHERE systematic_name = ? OR standard_name = ? "
+                             "COLLATE NOCASE", name, name)
+        if not found:
+            found = self._column("SELECT g2.gene FROM protein_genes g1 JOIN protein_genes g2 ON g1.protein_id = "
+                                 "g2.protein_id JOIN genes ON genes.systematic_name = g2.gene WHERE g1.gene = ? "
+                                 "COLLATE NOCASE", name)
+        return found[0] if found else None
+
+    def gene_name(self, gene_id):
+        """Gets the standard (SGD) name of a gene, or None."""
+        found = self._column("SELECT standard_name FROM genes WHERE systematic_name = ?", gene_id)
+        return found[0] if found else None
+
+    def proteins(self, gene=None, uniprot=None, ec=None, source=None):
+        """Gets the SwissProt/KEGG entries of a gene (any of its names), UniProt id or EC number.
+
+        Returns
+        -------
+        list of dict
+            Entries with the keys source, uniprot, name, gene_id, ec_code, mw, pathway and sequence.
+        """
+        conditions, parameters = [], []
+        if gene is not None:
+            conditions.append("rowid IN (SELECT protein_id FROM protein_genes WHERE gene = ? COLLATE NOCASE)")
+            parameters.append(gene)
+        if uniprot is not None:
+            conditions.append("uniprot = ?")
+            parameters.append(uniprot)
+        if ec is not None:
+            conditions.append("rowid IN (SELECT protein_id FROM protein_ecs WHERE ec = ?)")
+            parameters.append(ec)
+        if source is not None:
+            conditions.append("source = ?")
+            parameters.append(source)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return [dict(row) for row in self.connection.execute(f"SELECT * FROM proteins{where}", parameters)]
+
+    def uniprot_ids(self, gene):
+        """Gets the UniProt ids of a gene (any of its names)."""
+        return self._column("SELECT p.uniprot FROM proteins p JOIN protein_genes g ON g.protein_id = p.rowid "
+                            "WHERE g.gene = ? COLLATE NOCASE AND p.uniprot IS NOT NULL", gene)
+
+    def ec_codes(self, gene=None, uniprot=None):
+        """Gets the EC numbers of a gene (any of its names) or UniProt id."""
+        if gene is not None:
+            return self._column("SELECT e.ec FROM protein_ecs e JOIN protein_genes g ON e.protein_id = "
+                                "g.protein_id WHERE g.gene = ? COLLATE NOCASE", gene)
+        return self._column("SELECT e.ec FROM protein_ecs e JOIN proteins p ON e.protein_id = p.rowid WHERE "
+                            "p.uniprot = ?", uniprot)
+
+    def genes_with_ec(self, ec):
+        """Gets the systematic names of the genes annotated with an EC number."""
+        return self._column("SELECT g.gene FROM protein_ecs e JOIN protein_genes g ON e.protein_id = "
+                            "g.protein_id JOIN genes ON genes.systematic_name = g.gene WHERE e.ec = ?", ec)
+
+    def molecular_weight(self, uniprot):
+        """Gets the molecular weight (Da) of a protein, preferring SwissProt over KEGG, or None."""
+        found = self._column("SELECT mw FROM proteins WHERE uniprot = ? AND mw IS NOT NULL ORDER BY source = "
+                             "'kegg'", uniprot)
+        return found[0] if found else None
+
+    def complexes(self, member):
+        """Gets the Complex Portal complexes that include a molecule (e.g. a UniProt id).
+
+        Returns
+        -------
+        list of dict
+            Complexes with the keys complex_id, name, aliases, taxonomy, go_annotations, description and
+            stoichiometry (of the member).
+        """
+        query = ("SELECT c.*, m.stoichiometry FROM complexes c JOIN complex_members m ON c.complex_id = "
+                 "m.complex_id WHERE m.member = ?")
+        return [dict(row) for row in self.connection.execute(query, (member,))]
+
+    def concentrations(self, kegg=None, chebi=None):
+        """Gets the YMDB concentrations of a metabolite by KEGG or ChEBI id.
+
+        Returns
+        -------
+        list of dict
+        """
+        column, value = ("kegg", kegg) if kegg is not None else ("chebi", chebi)
+        query = f"SELECT * FROM concentrations WHERE {column} = ?"
+        return [dict(row) for row in self.connection.execute(query, (value,))]
+
+    def bigg_dict(self, kind, new_ids=True):
+        """Gets a BiGG dictionary as a dict (the last entry of repeated ids wins, as when reading the file).
+
+        Parameters
+        ----------
+        kind : str
+            "metabolite" or "reaction".
+        new_ids : bool, optional
+            Whether to use the dictionary of the new ids (*_newIDs.csv).
+
+        Returns
+        -------
+        dict
+            Original id -> BiGG id.
+        """
+        query = "SELECT model_id, bigg_id FROM bigg WHERE kind = ? AND new_ids = ? ORDER BY rowid"
+        return dict(self.connection.execute(query, (kind, new_ids)).fetchall())
+
+    def bigg_id(self, model_id, kind="reaction", new_ids=True):
+        """Gets the BiGG id of a model id, or None."""
+        query = "SELECT bigg_id FROM bigg WHERE kind = ? AND new_ids = ? AND model_id = ? ORDER BY rowid DESC"
+        row = self.connection.execute(query, (kind, new_ids, model_id)).fetchone()
+        return row[0] if row else None
+
+    def model_ids(self, bigg_id, kind="reaction"):
+        """Gets the model ids that map to a BiGG id, in either dictionary."""
+        return self._column("SELECT model_id FROM bigg WHERE kind = ? AND bigg_id = ?", kind, bigg_id)
+
+    def close(self):
+        self.connection.close()
+
+
+def open_annotation_store(db_path=ANNOTATION_DB_PATH, databases_path=DATABASES_PATH):
+    """Opens the annotation store, (re)building it first if it is missing or any source file changed.
+
+    Parameters
+    ----------
+    db_path : str, optional
+        Path of the store.
+    databases_path : str, optional
+        Folder with the source files.
+
+    Returns
+    -------
+    AnnotationStore
+        Store shared by the callers with the same `db_path`. When the sources change, a new store is
+        returned, and the outdated one is left open for the callers that still hold it.
+    """
+    key = sources_key(databases_path)
+    store = _stores.get(db_path)
+    if store is not None and store.sources_key == key:
+        return store
+    store = None
+    if os.path.exists(db_path):
+        try:
+            store = AnnotationStore(db_path)
+            if store.sources_key != key:
+                store.close()
+                store = None
+        except sqlite3.DatabaseError:
+            store = None
+    if store is None:
+        build_annotation_store(db_path, databases_path)
+        store = AnnotationStore(db_path)
+    _stores[db_path] = store
+    return store
+
+
+if __name__ == "__main__":
+    build_annotation_store()
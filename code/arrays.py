@@ -0,0 +1,223 @@
+"""
+Functions for exporting the yeast model as sparse/dense arrays (stoichiometric matrix, bounds and
+objective), and for storing them as on-disk bundles that can be shared between processes.
+"""
+
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+from cobra.util.solver import linear_reaction_coefficients
+from scipy import sparse
+from .io import CACHE_MAX_SIZE, CACHE_PATH, read_yeast_model, yeast_model_key
+
+ARRAYS_PATH = f"{CACHE_PATH}/arrays"
+ARRAY_FIELDS = ("data", "indices", "indptr", "lb", "ub", "c", "b")
+
+
+class ModelArrays:
+    """Array representation of a model: S v = b, lb <= v <= ub, objective c.
+
+    Parameters
+    ----------
+    S : scipy.sparse.csr_matrix
+        Stoichiometric matrix (metabolites x reactions).
+    lb, ub : numpy.ndarray
+        Lower and upper bounds of the reactions.
+    c : numpy.ndarray
+        Linear objective coefficients of the reactions.
+    b : numpy.ndarray
+        Right-hand side of the mass balances (zero unless a metabolite has a non-zero bound).
+    met_ids, rxn_ids : list of str
+        Ids of the rows/columns, in order.
+    """
+
+    def __init__(self, S, lb, ub, c, b, met_ids, rxn_ids):
+        self.S = S
+        self.lb = lb
+        self.ub = ub
+        self.c = c
+        self.b = b
+        self.met_ids = list(met_ids)
+        self.rxn_ids = list(rxn_ids)
+        self.met_index = {met_id: i for i, met_id in enumerate(self.met_ids)}
+        self.rxn_index = {rxn_id: j for j, rxn_id in enumerate(self.rxn_ids)}
+
+    @property
+    def S_csc(self):
+        """Stoichiometric matrix in CSC format, for column (reaction) slicing."""
+        return self.S.tocsc()
+
+    @property
+    def shape(self):
+        return self.S.shape
+
+
+def model_to_arrays(model):
+    """Converts a COBRA model to arrays.
+
+    Rows follow the order of `model.metabolites` and columns the order of `model.reactions`, so index
+    maps stay stable as long as the model does.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to convert.
+
+    Returns
+    -------
+    ModelArrays
+    """
+    met_index = {met.id: i for i, met in enumerate(model.metabolites)}
+    rows, cols, data = [], [], []
+    for j, rxn in enumerate(model.reactions):
+        for met, coeff in rxn.metabolites.items():
+            rows.append(met_index[met.id])
+            cols.append(j)
+            data.append(coeff)
+    shape = (len(model.metabolites), len(model.reactions))
+    S = sparse.coo_matrix((np.array(data, dtype=np.float64), (rows, cols)), shape=shape).tocsr()
+    S.sort_indices()
+    objective = {rxn.id: coeff for rxn, coeff in linear_reaction_coefficients(model).items()}
+    lb = np.array([rxn.lower_bound for rxn in model.reactions], dtype=np.float64)
+    ub = np.array([rxn.upper_bound for rxn in model.reactions], dtype=np.float64)
+    c = np.array([objective.get(rxn.id, 0.0) for rxn in model.reactions], dtype=np.float64)
+    b = np.array([met._bound for met in model.metabolites], dtype=np.float64)
+    return ModelArrays(S, lb, ub, c, b, met_index.keys(), [rxn.id for rxn in model.reactions])
+
+
+def save_arrays(arrays, path):
+    """Writes arrays to disk, either as a single .npz file or as a memory-mappable bundle directory.
+
+    The directory layout (one uncompressed .npy file per array, plus ids.json) is written to a
+    temporary directory first and then renamed, so readers never see a partial bundle.
+
+    Parameters
+    ----------
+    arrays : ModelArrays
+        Arrays to save.
+    path : str
+        Output path. If it ends with ".npz" a single (not memory-mappable) file is written, otherwise a
+        bundle directory.
+    """
+    S = arrays.S.tocsr()
+    values = {"data": S.data, "indices": S.indices, "indptr": S.indptr, "lb": arrays.lb,
+              "ub": arrays.ub, "c": arrays.c, "b": arrays.b}
+    ids = {"shape": list(S.shape), "met_ids": arrays.met_ids, "rxn_ids": arrays.rxn_ids}
+    if path.endswith(".npz"):
+        np.savez(path, ids=np.array(json.dumps(ids)), **values)
+        return
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=parent, suffix=".tmp")
+    try:
+        for name, value in values.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), value)
+        with open(os.path.join(tmp_path, "ids.json"), "w") as ids_file:
+            json.dump(ids, ids_file)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+
+def load_arrays(path, mmap=True):
+    """Reads arrays written by `save_arrays`.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .npz file or bundle directory.
+    mmap : bool, optional
+        Whether to memory-map the arrays of a bundle directory (read-only), so that all processes that
+        open the same bundle share a single copy in memory. Ignored for .npz files.
+
+    Returns
+    -------
+    ModelArrays
+    """
+    if path.endswith(".npz"):
+        with np.load(path) as npz_file:
+            values = {name: npz_file[name] for name in ARRAY_FIELDS}
+            ids = json.loads(str(npz_file["ids"]))
+    else:
+        mmap_mode = "r" if mmap else None
+        values = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                  for name in ARRAY_FIELDS}
+        with open(os.path.join(path, "ids.json")) as ids_file:
+            ids = json.load(ids_file)
+    S = sparse.csr_matrix((values["data"], values["indices"], values["indptr"]),
+                          shape=tuple(ids["shape"]), copy=False)
+    return ModelArrays(S, values["lb"], values["ub"], values["c"], values["b"], ids["met_ids"],
+                       ids["rxn_ids"])
+
+
+def _bundle_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def prune_bundles(keep=None, max_size=CACHE_MAX_SIZE, arrays_path=ARRAYS_PATH):
+    """Removes the least recently used bundles of `read_yeast_arrays` until they fit in `max_size` (as the
+    eviction of `code.cache.SnapshotCache`). Processes that already memory-mapped a removed bundle keep
+    their mapping.
+
+    Parameters
+    ----------
+    keep : str, optional
+        Path of a bundle that should never be removed (typically the one just written).
+    max_size : int, optional
+        Maximum total size in bytes of the bundles.
+    arrays_path : str, optional
+        Directory of the bundles.
+    """
+    if not os.path.isdir(arrays_path):
+        return
+    bundles = []
+    for entry in os.scandir(arrays_path):
+        # ".tmp" directories are bundles still being written:
+        if entry.is_dir() and not entry.name.endswith(".tmp"):
+            try:
+                bundles.append((entry.stat().st_mtime, _bundle_size(entry.path), entry.path))
+            except FileNotFoundError:
+                continue
+    total_size = sum(size for _, size, _ in bundles)
+    for _, size, path in sorted(bundles):
+        if total_size <= max_size:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total_size -= size
+
+
+def read_yeast_arrays(make_bigg_compliant=False, mmap=True):
+    """Reads the yeast model as arrays, from a cached bundle that is rebuilt when the SBML file changes.
+    Old bundles are pruned when a new one is written (see `prune_bundles`).
+
+    Parameters
+    ----------
+    make_bigg_compliant : bool, optional
+        Whether to use the BiGG compliant ids.
+    mmap : bool, optional
+        Whether to memory-map the cached bundle.
+
+    Returns
+    -------
+    ModelArrays
+    """
+    bundle_path = f"{ARRAYS_PATH}/{yeast_model_key(make_bigg_compliant)}"
+    if not os.path.isdir(bundle_path):
+        try:
+            save_arrays(model_to_arrays(read_yeast_model(make_bigg_compliant)), bundle_path)
+        except OSError:
+            # Another process finished writing the same bundle first:
+            if not os.path.isdir(bundle_path):
+                raise
+        prune_bundles(keep=bundle_path)
+    else:
+        # Mark as recently used for the pruning order:
+        os.utime(bundle_path)
+    return load_arrays(bundle_path, mmap=mmap)
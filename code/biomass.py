@@ -0,0 +1,278 @@
+"""
+Functions for changing the biomass composition and energy requirements of the yeast model (ports of the
+MATLAB scripts in code/otherChanges). Changes are computed as deltas (new stoichiometric coefficients and
+bounds) that are applied inside model contexts, instead of building modified copies of the model.
+"""
+
+import csv
+from .io import REPO_PATH
+
+FORSTER_PATH = f"{REPO_PATH}/data/physiology/biomassComposition_Forster2003.tsv"
+COFACTOR_ION_PATH = f"{REPO_PATH}/data/physiology/biomassComposition_Cofactor_Ion.tsv"
+
+BIOMASS_COMPONENTS = ("carbohydrate", "protein", "lipid", "RNA", "DNA", "ion", "cofactor")
+GAM_MET_NAMES = {"ATP", "ADP", "H2O", "H+", "phosphate"}
+COFACTOR_RXN_ID = "r_4598"
+ANAEROBIC_COFACTOR_IDS = ("s_3714", "s_1198", "s_1203", "s_1207", "s_1212", "s_0529")
+ANAEROBIC_LOWER_BOUNDS = {
+    "r_1992": 0,      # O2
+    "r_1757": -1000,  # ergosterol
+    "r_1915": -1000,  # lanosterol
+    "r_1994": -1000,  # palmitoleate
+    "r_2106": -1000,  # zymosterol
+    "r_2134": -1000,  # 14-demethyllanosterol
+    "r_2137": -1000,  # ergosta-5,7,22,24(28)-tetraen-3beta-ol
+    "r_2189": -1000,  # oleate
+    "r_0713": 0,      # oxaloacetate-malate shuttle (mitochondria)
+    "r_0714": 0,      # oxaloacetate-malate shuttle (cytoplasm)
+}
+ANAEROBIC_UPPER_BOUNDS = {
+    "r_0487": 0,  # glycerol dehydrogenase (only acts in microaerobic conditions)
+    "r_0472": 0,  # 2-oxoglutarate + L-glutamine -> 2 L-glutamate (alternative pathway)
+}
+
+
+def empty_delta():
+    """Gets a delta without changes: {"stoichiometry": {rxn id: {met id: coeff}}, "bounds": {rxn id:
+    (lb, ub)}}."""
+    return {"stoichiometry": {}, "bounds": {}}
+
+
+def merge_deltas(*deltas):
+    """Combines deltas, the later ones overriding the earlier ones."""
+    merged = empty_delta()
+    for delta in deltas:
+        for rxn_id, coefficients in delta["stoichiometry"].items():
+            merged["stoichiometry"].setdefault(rxn_id, {}).update(coefficients)
+        merged["bounds"].update(delta["bounds"])
+    return merged
+
+
+def apply_delta(model, delta):
+    """Applies a delta to the model (use it inside a `with model:` block to revert it).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to modify.
+    delta : dict
+        Changes, as returned by the functions of this module.
+    """
+    for rxn_id, coefficients in delta["stoichiometry"].items():
+        rxn = model.reactions.get_by_id(rxn_id)
+        rxn.add_metabolites({model.metabolites.get_by_id(met_id): coeff
+                             for met_id, coeff in coefficients.items()}, combine=False)
+    for rxn_id, bounds in delta["bounds"].items():
+        model.reactions.get_by_id(rxn_id).bounds = bounds
+
+
+def build_delta(model, steps):
+    """Computes the combined delta of changes that depend on each other, e.g. rescaling a component
+    after another one was rescaled.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to compute the changes for. It is left unchanged.
+    steps : list of callable
+        Functions taking the model and returning a delta. Each one sees the model with the deltas of the
+        previous steps applied.
+
+    Returns
+    -------
+    dict
+    """
+    deltas = []
+    with model:
+        for step in steps:
+            delta = step(model)
+            apply_delta(model, delta)
+            deltas.append(delta)
+    return merge_deltas(*deltas)
+
+
+def met_name(met, compartment_names):
+    """Gets the name of a metabolite without the compartment suffix of the SBML file."""
+    suffix = f" [{compartment_names.get(met.compartment, met.compartment)}]"
+    return met.name[:-len(suffix)] if met.name.endswith(suffix) else met.name
+
+
+def _rxn_by_name(model, rxn_name):
+    return next((rxn for rxn in model.reactions if rxn.name == rxn_name), None)
+
+
+def load_biomass_mws():
+    """Loads the molecular weights (g/mol) of the biomass components, by metabolite id."""
+    mws = {}
+    for file_path in (FORSTER_PATH, COFACTOR_ION_PATH):
+        with open(file_path) as mw_file:
+            mw_reader = csv.reader(mw_file, delimiter="\t")
+            next(mw_reader)
+            for row in mw_reader:
+                mws.setdefault(row[0], float(row[3]))
+    return mws
+
+
+def sum_biomass(model, mws=None):
+    """Calculates the breakdown of biomass (port of sumBioMass.m).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model.
+    mws : dict, optional
+        Molecular weights by metabolite id. Defaults to `load_biomass_mws()`.
+
+    Returns
+    -------
+    dict
+        Fraction (g/gDW) of each of BIOMASS_COMPONENTS, and the total "X" (gDW/gDW).
+    """
+    if mws is None:
+        mws = load_biomass_mws()
+    fractions = {}
+    for component in BIOMASS_COMPONENTS:
+        rxn_name = "lipid backbone pseudoreaction" if component == "lipid" else f"{component} pseudoreaction"
+        rxn = _rxn_by_name(model, rxn_name)
+        fraction = 0
+        if rxn is not None:
+            for met, coeff in rxn.metabolites.items():
+                if coeff >= 0:
+                    continue
+                if component == "lipid":
+                    fraction -= coeff
+                elif met.id in mws:
+                    # Polymerized components lose one water molecule per monomer:
+                    mw = mws[met.id] if component in ("ion", "cofactor") else mws[met.id] - 18
+                    fraction -= coeff * mw / 1000
+        fractions[component] = fraction
+    fractions["X"] = sum(fractions.values())
+    return fractions
+
+
+def rescale_pseudoreaction(model, component, factor):
+    """Gets the delta that rescales the substrates of a pseudoreaction (port of rescalePseudoReaction.m).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model.
+    component : str
+        Name of the component, e.g. "protein". "lipid" rescales both lipid backbone and chain.
+    factor : float
+        Rescaling factor.
+
+    Returns
+    -------
+    dict
+    """
+    if component == "lipid":
+        return merge_deltas(rescale_pseudoreaction(model, "lipid backbone", factor),
+                            rescale_pseudoreaction(model, "lipid chain", factor))
+    delta = empty_delta()
+    rxn = _rxn_by_name(model, f"{component} pseudoreaction")
+    if rxn is not None:
+        compartment_names = model.compartments
+        delta["stoichiometry"][rxn.id] = {met.id: factor * coeff for met, coeff in rxn.metabolites.items()
+                                          if coeff != 0 and met_name(met, compartment_names) != component}
+    return delta
+
+
+def scale_biomass(model, component, new_value, balance_out=None, mws=None):
+    """Gets the delta that sets the fraction of a biomass component (port of scaleBioMass.m).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model.
+    component : str
+        Component to rescale, one of BIOMASS_COMPONENTS.
+    new_value : float
+        New fraction of the component (g/gDW).
+    balance_out : str, optional
+        Another component rescaled to keep the total biomass unchanged.
+    mws : dict, optional
+        Molecular weights by metabolite id. Defaults to `load_biomass_mws()`.
+
+    Returns
+    -------
+    dict
+    """
+    fractions = sum_biomass(model, mws)
+    old_value = fractions[component]
+    delta = rescale_pseudoreaction(model, component, new_value / old_value)
+    if balance_out:
+        balance_value = fractions[balance_out]
+        factor = (balance_value - (new_value - old_value)) / balance_value
+        delta = merge_deltas(delta, rescale_pseudoreaction(model, balance_out, factor))
+    return delta
+
+
+def change_gam(model, gam, ngam=None):
+    """Gets the delta that sets the growth (and optionally non-growth) associated maintenance (port of
+    changeGAM.m).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model.
+    gam : float
+        Growth associated maintenance (mmol ATP/gDW).
+    ngam : float, optional
+        Non-growth associated maintenance (mmol ATP/gDW/h), set as both bounds of its reaction.
+
+    Returns
+    -------
+    dict
+    """
+    delta = empty_delta()
+    compartment_names = model.compartments
+    biomass_rxn = _rxn_by_name(model, "biomass pseudoreaction")
+    delta["stoichiometry"][biomass_rxn.id] = {
+        met.id: gam if coeff > 0 else -gam for met, coeff in biomass_rxn.metabolites.items()
+        if coeff != 0 and met_name(met, compartment_names) in GAM_MET_NAMES}
+    if ngam is not None:
+        ngam_rxn = _rxn_by_name(model, "non-growth associated maintenance reaction")
+        delta["bounds"][ngam_rxn.id] = (ngam, ngam)
+    return delta
+
+
+def _anaerobic_medium(model):
+    delta = empty_delta()
+    # Heme a, NAD(PH) and coenzyme A are not required under anaerobic conditions:
+    cofactor_rxn = model.reactions.get_by_id(COFACTOR_RXN_ID)
+    present_ids = {met.id for met in cofactor_rxn.metabolites}
+    delta["stoichiometry"][COFACTOR_RXN_ID] = {met_id: 0 for met_id in ANAEROBIC_COFACTOR_IDS
+                                               if met_id in present_ids}
+    # No O2 uptake, sterol and fatty acid uptake allowed, and pathways blocked for proper glycerol
+    # production:
+    for rxn_id, lower_bound in ANAEROBIC_LOWER_BOUNDS.items():
+        delta["bounds"][rxn_id] = (lower_bound, model.reactions.get_by_id(rxn_id).upper_bound)
+    for rxn_id, upper_bound in ANAEROBIC_UPPER_BOUNDS.items():
+        lower_bound = delta["bounds"].get(rxn_id, model.reactions.get_by_id(rxn_id).bounds)[0]
+        delta["bounds"][rxn_id] = (lower_bound, upper_bound)
+    return delta
+
+
+def anaerobic_steps(mws=None):
+    """Gets the steps of `build_delta` that convert the model to anaerobic (port of anaerobicModel.m):
+    GAM/NGAM refitted to Nissen et al. 1997, protein content of 0.461 g/gDW, no heme a/NAD(PH)/CoA
+    requirement, and anaerobic medium.
+
+    Parameters
+    ----------
+    mws : dict, optional
+        Molecular weights by metabolite id. Defaults to `load_biomass_mws()`.
+
+    Returns
+    -------
+    list of callable
+    """
+    return [lambda model: change_gam(model, 30.49, 0),
+            lambda model: scale_biomass(model, "protein", 0.461, "carbohydrate", mws),
+            _anaerobic_medium]
+
+
+def anaerobic_delta(model, mws=None):
+    """Gets the delta that converts the model to anaerobic (see `anaerobic_steps`)."""
+    return build_delta(model, anaerobic_steps(mws))
@@ -0,0 +1,179 @@
+"""
+Content-addressed snapshot cache for objects derived from the model files, such as parsed COBRA models.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+SNAPSHOT_SUFFIX = ".pkl"
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """Computes the SHA-256 hash of a file's content.
+
+    Parameters
+    ----------
+    file_path : str
+        Path of the file to hash.
+    chunk_size : int, optional
+        Number of bytes read at a time.
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_key(*parts):
+    """Combines several values (file hashes, flags, versions) into a single cache key.
+
+    Parameters
+    ----------
+    *parts
+        Values identifying the snapshot. They are converted to strings, so they should have a stable
+        string representation.
+
+    Returns
+    -------
+    str
+        Hexadecimal key usable as a file name.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SnapshotCache:
+    """Directory of pickled snapshots with size-bounded least-recently-used eviction.
+
+    Snapshots are looked up first in an optional read-only shared directory (e.g. one prepared once
+    before starting a pool of workers), and then in the private cache directory, which is the only one
+    that is ever written to or evicted from.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Writable directory for the snapshots. Created if missing.
+    max_size : int, optional
+        Maximum total size in bytes of the snapshots in `cache_dir`. The least recently used snapshots
+        are removed after each write until the directory fits. None disables eviction.
+    shared_dir : str, optional
+        Read-only directory that is searched before `cache_dir`.
+    """
+
+    def __init__(self, cache_dir, max_size=None, shared_dir=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.shared_dir = shared_dir
+
+    def _path(self, directory, key):
+        return os.path.join(directory, f"{key}{SNAPSHOT_SUFFIX}")
+
+    def load(self, key):
+        """Loads a snapshot.
+
+        Parameters
+        ----------
+        key : str
+            Key of the snapshot, as returned by `snapshot_key`.
+
+        Returns
+        -------
+        object or None
+            The unpickled object, or None if no (readable) snapshot exists for the key.
+        """
+        for directory in (self.shared_dir, self.cache_dir):
+            if not directory:
+                continue
+            path = self._path(directory, key)
+            try:
+                with open(path, "rb") as file:
+                    obj = pickle.load(file)
+            except FileNotFoundError:
+                continue
+            except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                # Truncated snapshot or one written by an incompatible package version:
+                continue
+            if directory == self.cache_dir:
+                # Mark as recently used for the eviction order:
+                os.utime(path)
+            return obj
+        return None
+
+    def save(self, key, obj, evict=True):
+        """Stores a snapshot atomically and evicts old snapshots if needed.
+
+        Parameters
+        ----------
+        key : str
+            Key of the snapshot, as returned by `snapshot_key`.
+        obj : object
+            Picklable object to store.
+        evict : bool, optional
+            Whether to evict old snapshots after writing. Callers storing many snapshots at once can
+            disable it and call `evict` once at the end.
+
+        Returns
+        -------
+        str
+            Path of the written snapshot.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(self.cache_dir, key)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(obj, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if evict:
+            self.evict(keep=key)
+        return path
+
+    def evict(self, keep=None):
+        """Removes the least recently used snapshots until the cache fits in `max_size`.
+
+        Parameters
+        ----------
+        keep : str, optional
+            Key of a snapshot that should never be removed (typically the one just written).
+        """
+        if self.max_size is None or not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(SNAPSHOT_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries, key=lambda item: item[0]):
+            if total_size <= self.max_size:
+                break
+            if entry.name == f"{keep}{SNAPSHOT_SUFFIX}":
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self):
+        """Removes all snapshots from the private cache directory."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(SNAPSHOT_SUFFIX):
+                os.remove(entry.path)
@@ -0,0 +1,260 @@
+"""
+Growth test of the yeast model on the chemostat data of Tobias 2013 (port of code/modelTests/growth.m),
+with the condition blocks simulated in parallel and the condition-specific changes applied as deltas.
+"""
+
+import numpy as np
+import pandas as pd
+import warnings
+from cobra import Configuration
+from multiprocessing import Pool
+from .biomass import COFACTOR_ION_PATH, FORSTER_PATH, anaerobic_steps, apply_delta, build_delta, \
+    load_biomass_mws, scale_biomass
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, REPO_PATH, read_yeast_model, yeast_model_key
+from .knockout import BIOMASS_ID
+
+CHEMOSTAT_PATH = f"{REPO_PATH}/data/physiology/chemostatData_Tobias2013.tsv"
+GROWTH_RESULTS_PATH = f"{REPO_PATH}/data/testResults/growth.md"
+GROWTH_PLOT_PATH = f"{REPO_PATH}/data/testResults/growth.png"
+DELTA_VERSION = 1  # increase when the condition changes are modified, to invalidate cached deltas
+DELTA_CACHE = SnapshotCache(f"{CACHE_PATH}/chemostat", max_size=CACHE_MAX_SIZE)
+
+# exchange reactions fixed to the measured rates, in the column order of the data:
+UPTAKE_IDS = {"glucose": "r_1714", "oxygen": "r_1992", "ammonium": "r_1654"}
+# condition blocks of the data: (name, first row, last row + 1, limitation, anaerobic)
+CHEMOSTAT_BLOCKS = [
+    ("N-limited aerobic", 0, 9, "N", False),
+    ("C-limited aerobic", 9, 20, "C", False),
+    ("C-limited anaerobic", 20, 26, "C", True),
+    ("N-limited anaerobic", 26, 32, "N", True),
+]
+# marker and color of each block in the growth plot, as in growth.m:
+PLOT_STYLES = {
+    "N-limited aerobic": ("o", (253 / 256, 174 / 256, 97 / 256)),
+    "C-limited aerobic": ("s", (215 / 256, 25 / 256, 28 / 256)),
+    "C-limited anaerobic": ("d", (171 / 256, 217 / 256, 233 / 256)),
+    "N-limited anaerobic": (">", (44 / 256, 123 / 256, 182 / 256)),
+}
+
+# model, deltas and data of each worker process, set once by _init_worker:
+_worker_state = None
+
+
+def load_chemostat_data(file_path=CHEMOSTAT_PATH):
+    """Loads the chemostat data, with the condition of each row.
+
+    Parameters
+    ----------
+    file_path : str, optional
+        Path of the data (tab separated: glucose, O2 and NH3 uptake in mmol/gDW/h, and growth rate in
+        1/h, with 1000 meaning unconstrained).
+
+    Returns
+    -------
+    pandas.DataFrame
+        With the columns "condition", "glucose", "oxygen", "ammonium" and "growth".
+    """
+    data = pd.read_csv(file_path, sep="\t")
+    data.columns = [*UPTAKE_IDS, "growth"]
+    conditions = [None] * len(data)
+    for name, first, last, _, _ in CHEMOSTAT_BLOCKS:
+        conditions[first:last] = [name] * (last - first)
+    data.insert(0, "condition", conditions)
+    return data
+
+
+def condition_steps(limitation, anaerobic, mws=None):
+    """Gets the model changes of a condition, as steps of `code.biomass.build_delta`.
+
+    N-limited cells have less protein, lipid and RNA (balanced out with carbohydrate), and anaerobic
+    cells get the changes of `code.biomass.anaerobic_steps`.
+
+    Parameters
+    ----------
+    limitation : str
+        "N" or "C".
+    anaerobic : bool
+        Whether the condition is anaerobic.
+    mws : dict, optional
+        Molecular weights by metabolite id. Defaults to `load_biomass_mws()`.
+
+    Returns
+    -------
+    list of callable
+    """
+    steps = []
+    if limitation == "N":
+        steps += [lambda model: scale_biomass(model, "protein", 0.289, mws=mws),
+                  lambda model: scale_biomass(model, "lipid", 0.048, mws=mws),
+                  lambda model: scale_biomass(model, "RNA", 0.077, "carbohydrate", mws)]
+    if anaerobic:
+        steps += anaerobic_steps(mws)
+    return steps
+
+
+def condition_deltas(model):
+    """Computes the delta of every condition block of CHEMOSTAT_BLOCKS.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model. It is left unchanged.
+
+    Returns
+    -------
+    dict
+        Block name -> delta.
+    """
+    mws = load_biomass_mws()
+    return {name: build_delta(model, condition_steps(limitation, anaerobic, mws))
+            for name, _, _, limitation, anaerobic in CHEMOSTAT_BLOCKS}
+
+
+def _simulate_block(model, delta, rows):
+    """Simulates the chemostats of one condition block, with its delta applied once for all rows.
+
+    Uptake rates are fixed to the measured values (or only bounded if 1000) and growth is maximized.
+    Returns the absolute glucose, O2, NH3 and growth fluxes of each row (zeros if infeasible).
+    """
+    results = []
+    with model:
+        apply_delta(model, delta)
+        model.objective = BIOMASS_ID
+        for row in rows:
+            with model:
+                for column, rxn_id in UPTAKE_IDS.items():
+                    rxn = model.reactions.get_by_id(rxn_id)
+                    if abs(row[column]) == 1000:
+                        rxn.lower_bound = -row[column]
+                    else:
+                        rxn.bounds = (-row[column], -row[column])
+                model.slim_optimize()
+                if model.solver.status == "optimal":
+                    results.append([abs(model.reactions.get_by_id(rxn_id).flux)
+                                    for rxn_id in [*UPTAKE_IDS.values(), BIOMASS_ID]])
+                else:
+                    results.append([0.0] * (len(UPTAKE_IDS) + 1))
+    return results
+
+
+def _init_worker(*state):
+    global _worker_state
+    _worker_state = state
+
+
+def _simulate_block_task(name):
+    model, deltas, blocks = _worker_state
+    return name, _simulate_block(model, deltas[name], blocks[name])
+
+
+def simulate_chemostats(model, data=None, deltas=None, processes=None):
+    """Simulates all chemostats, one condition block per process.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model. It is left unchanged.
+    data : pandas.DataFrame, optional
+        Chemostat data, as returned by `load_chemostat_data`. Defaults to Tobias 2013.
+    deltas : dict, optional
+        Block name -> delta, as returned by `condition_deltas`. Computed if not given.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The data, with the simulated fluxes in the columns "sim_glucose", "sim_oxygen", "sim_ammonium"
+        and "sim_growth".
+    """
+    if data is None:
+        data = load_chemostat_data()
+    if deltas is None:
+        deltas = condition_deltas(model)
+    blocks = {name: data[data["condition"] == name].to_dict("records") for name in deltas}
+    if processes is None:
+        processes = Configuration().processes
+    processes = max(1, min(processes, len(blocks)))
+    if processes == 1:
+        results = {name: _simulate_block(model, deltas[name], rows) for name, rows in blocks.items()}
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=(model, deltas, blocks)) as pool:
+            results = dict(pool.imap_unordered(_simulate_block_task, blocks))
+    columns = [f"sim_{column}" for column in [*UPTAKE_IDS, "growth"]]
+    simulated = pd.DataFrame(np.nan, index=data.index, columns=columns)
+    for name, rows in results.items():
+        simulated.loc[data["condition"] == name] = rows
+    return pd.concat([data, simulated], axis=1)
+
+
+def plot_growth(result, file_path=GROWTH_PLOT_PATH):
+    """Plots the simulated vs. measured growth rates of each condition block, as growth.m.
+
+    Parameters
+    ----------
+    result : pandas.DataFrame
+        Simulations (see `simulate_chemostats`).
+    file_path : str, optional
+        Path of the image.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots()
+    for name, (marker, color) in PLOT_STYLES.items():
+        block = result[result["condition"] == name]
+        ax.plot(block["growth"], block["sim_growth"], marker, markersize=10, markeredgecolor="k",
+                markerfacecolor=color, label=name)
+    lim = max(result["growth"].max(), result["sim_growth"].max()) + 0.05
+    ax.plot([0, lim], [0, lim], "--", color=(64 / 256, 64 / 256, 64 / 256))
+    ax.set_xlim(0, lim)
+    ax.set_ylim(0, lim)
+    ax.set_xlabel("Experimental growth rate [1/h]", fontsize=14)
+    ax.set_ylabel("In silico growth rate [1/h]", fontsize=14)
+    ax.legend(loc="upper left")
+    fig.savefig(file_path)
+    plt.close(fig)
+
+
+def growth_test(model=None, processes=None, write_output=False):
+    """Computes the R2 between measured and simulated growth rates of the chemostat data.
+
+    Parameters
+    ----------
+    model : cobra.core.Model, optional
+        Model to test. Defaults to the yeast model, whose condition deltas are cached until the model
+        file changes.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    write_output : bool, optional
+        Whether to write the R2 to data/testResults/growth.md and the plot to growth.png (the latter
+        requires matplotlib; without it the existing plot is kept).
+
+    Returns
+    -------
+    tuple of (float, pandas.DataFrame)
+        R2, and the simulations (see `simulate_chemostats`).
+    """
+    deltas = None
+    if model is None:
+        model = read_yeast_model()
+        # the deltas also depend on the biomass tables, through load_biomass_mws:
+        key = snapshot_key(yeast_model_key(), file_hash(FORSTER_PATH), file_hash(COFACTOR_ION_PATH),
+                           DELTA_VERSION)
+        deltas = DELTA_CACHE.load(key)
+        if deltas is None:
+            deltas = condition_deltas(model)
+            DELTA_CACHE.save(key, deltas)
+    result = simulate_chemostats(model, deltas=deltas, processes=processes)
+    r2 = np.corrcoef(result["growth"], result["sim_growth"])[0, 1] ** 2
+    if write_output:
+        with open(GROWTH_RESULTS_PATH, "w") as results_file:
+            results_file.write("## R2 of growth rate prediction\n")
+            results_file.write(f"{r2:.4g}\n\n")
+            results_file.write("![Growth curve](growth.png)\n")
+        try:
+            plot_growth(result)
+        except ImportError:
+            warnings.warn("matplotlib is not installed: growth.png was not updated")
+    return r2, result
@@ -0,0 +1,160 @@
+"""
+Decomposition of metabolites into the substructures (atom environments) used as features by dGPredictor,
+computed for all radii in a single pass per molecule and memoized on disk by canonical SMILES.
+
+RDKit is needed only by the functions that parse molecules, and is not part of code/requirements: install
+it in the environment of dGPredictor (together with code/requirements, as this module uses cobra).
+"""
+
+import csv
+from cobra import Configuration
+from multiprocessing import Pool
+from .cache import SnapshotCache, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, REPO_PATH, YML_PATH
+from .raven_yaml import iter_raven_yaml
+
+SMILES_DB_PATH = f"{REPO_PATH}/data/databases/smilesDB.tsv"
+RADII = (1, 2)
+DECOMPOSITION_VERSION = 1  # increase when the decomposition changes, to invalidate cached signatures
+DECOMPOSITION_CACHE = SnapshotCache(f"{CACHE_PATH}/decomposition", max_size=CACHE_MAX_SIZE)
+
+
+def canonical_smiles(smiles):
+    """Gets the canonical form of a SMILES string, or None if RDKit cannot parse it."""
+    from rdkit import Chem
+    mol = Chem.MolFromSmiles(smiles)
+    return None if mol is None else Chem.MolToSmiles(mol)
+
+
+def count_substructures_radii(mol, radii=RADII):
+    """Counts the substructures of a molecule for several radii, visiting each atom once (same
+    signatures as `count_substructures` of run_dgpredictor.py, one radius at a time).
+
+    Parameters
+    ----------
+    mol : rdkit.Chem.Mol
+        Molecule without explicit hydrogens.
+    radii : tuple of int, optional
+        Bond distances that define the environment of each atom.
+
+    Returns
+    -------
+    dict
+        Radius -> molecular signature ({substructure SMILES: count}).
+    """
+    from rdkit import Chem
+    signatures = {radius: {} for radius in radii}
+    for i in range(mol.GetNumAtoms()):
+        for radius in radii:
+            env = Chem.FindAtomEnvironmentOfRadiusN(mol, radius, i)
+            atoms = set()
+            for bidx in env:
+                bond = mol.GetBondWithIdx(bidx)
+                atoms.add(bond.GetBeginAtomIdx())
+                atoms.add(bond.GetEndAtomIdx())
+            # only one atom is in this environment, such as O in H2O
+            if not atoms:
+                atoms = {i}
+            smi = Chem.MolFragmentToSmiles(mol, atomsToUse=list(atoms), bondsToUse=list(env), canonical=True)
+            signatures[radius][smi] = signatures[radius].get(smi, 0) + 1
+    return signatures
+
+
+def _decompose_task(task):
+    from rdkit import Chem
+    smiles, radii = task
+    mol = Chem.RemoveHs(Chem.MolFromSmiles(smiles))
+    return smiles, count_substructures_radii(mol, radii)
+
+
+def decompose_smiles(smiles_by_id, radii=RADII, processes=None, use_cache=True):
+    """Decomposes metabolites into their molecular signatures.
+
+    Each distinct canonical SMILES is decomposed once for all radii. Signatures are looked up in an
+    on-disk cache (least recently used ones are evicted), and the missing ones are computed in a process
+    pool and stored.
+
+    Parameters
+    ----------
+    smiles_by_id : dict
+        Metabolite id -> SMILES. Metabolites whose SMILES cannot be parsed are left out of the result.
+    radii : tuple of int, optional
+        Radii of the signatures.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    use_cache : bool, optional
+        Whether to read and write the on-disk cache.
+
+    Returns
+    -------
+    dict
+        Radius -> {metabolite id: molecular signature}, the format of `decompse_novel_mets_rad1` and
+        `decompse_novel_mets_rad2` in run_dgpredictor.py.
+    """
+    radii = tuple(radii)
+    canonical_by_id = {}
+    canonical_cache = {}
+    for met_id, smiles in smiles_by_id.items():
+        if smiles not in canonical_cache:
+            canonical_cache[smiles] = canonical_smiles(smiles) if smiles else None
+        if canonical_cache[smiles] is not None:
+            canonical_by_id[met_id] = canonical_cache[smiles]
+
+    signatures = {}
+    missing = []
+    for smiles in set(canonical_by_id.values()):
+        key = snapshot_key(smiles, radii, DECOMPOSITION_VERSION)
+        cached = DECOMPOSITION_CACHE.load(key) if use_cache else None
+        if cached is None:
+            missing.append(smiles)
+        else:
+            signatures[smiles] = cached
+
+    if missing:
+        tasks = [(smiles, radii) for smiles in sorted(missing)]
+        if processes is None:
+            processes = Configuration().processes
+        processes = max(1, min(processes, len(tasks)))
+        if processes == 1:
+            signatures.update(map(_decompose_task, tasks))
+        else:
+            with Pool(processes) as pool:
+                signatures.update(pool.imap_unordered(_decompose_task, tasks, chunksize=16))
+        if use_cache:
+            for smiles in missing:
+                key = snapshot_key(smiles, radii, DECOMPOSITION_VERSION)
+                DECOMPOSITION_CACHE.save(key, signatures[smiles], evict=False)
+            DECOMPOSITION_CACHE.evict()
+
+    return {radius: {met_id: dict(signatures[smiles][radius]) for met_id, smiles in canonical_by_id.items()}
+            for radius in radii}
+
+
+def load_database_smiles(smiles_db_path=SMILES_DB_PATH, yml_path=YML_PATH):
+    """Loads the SMILES of data/databases/smilesDB.tsv (by metabolite name) and of the yeast model (by
+    metabolite id).
+
+    Returns
+    -------
+    dict
+        Metabolite name or id -> SMILES.
+    """
+    smiles_by_id = {}
+    with open(smiles_db_path, encoding="utf-8") as smiles_file:
+        for row in csv.reader(smiles_file, delimiter="\t", quoting=csv.QUOTE_NONE):
+            if len(row) > 1 and row[1]:
+                smiles_by_id[row[0]] = row[1]
+    for _, met in iter_raven_yaml(yml_path, sections=["metabolites"], fields=["smiles"]):
+        if met.get("smiles"):
+            smiles_by_id[met["id"]] = met["smiles"]
+    return smiles_by_id
+
+
+def decompose_database(radii=RADII, processes=None):
+    """Decomposes all metabolites with SMILES in smilesDB.tsv and the yeast model (see
+    `load_database_smiles` and `decompose_smiles`)."""
+    return decompose_smiles(load_database_smiles(), radii, processes)
+
+
+if __name__ == "__main__":
+    decompose_database()
@@ -0,0 +1,91 @@
+"""
+Detection of reactions with the same stoichiometry, forwards or backwards (port of
+code/modelTests/findDuplicatedRxns.m), by hashing a canonical form of each reaction.
+"""
+
+import pandas as pd
+from .biomass import met_name
+from .io import read_yeast_model
+
+NEAR_DUPLICATE_IGNORED_NAMES = ("H+", "H2O")
+DUPLICATE_COLUMNS = ["group", "id", "name", "reaction", "gene_reaction_rule", "lower_bound", "upper_bound",
+                     "sign"]
+
+
+def canonical_stoichiometry(rxn, ignored_met_ids=frozenset()):
+    """Gets a hashable form of the stoichiometry of a reaction that is the same for its reverse.
+
+    Parameters
+    ----------
+    rxn : cobra.core.Reaction
+        Reaction.
+    ignored_met_ids : set of str, optional
+        Metabolites left out of the comparison.
+
+    Returns
+    -------
+    tuple of (tuple, int)
+        Sorted (met id, coefficient) pairs scaled so that the first coefficient is positive, and the
+        sign (1 or -1) applied to the reaction to get them.
+    """
+    items = sorted((met.id, coeff) for met, coeff in rxn.metabolites.items()
+                   if coeff != 0 and met.id not in ignored_met_ids)
+    sign = -1 if items and items[0][1] < 0 else 1
+    return tuple((met_id, sign * coeff) for met_id, coeff in items), sign
+
+
+def find_duplicated_reactions(model, ignore_protons_water=False):
+    """Finds groups of reactions with the same stoichiometry (forwards or backwards) in one pass.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to check.
+    ignore_protons_water : bool, optional
+        Whether to also report near-duplicates, which only differ in H+ and H2O.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per duplicated reaction, with its group number, id, name, equation, GPR, bounds and
+        sign (-1 if it is written backwards relative to the other reactions of the group).
+    """
+    ignored_met_ids = frozenset()
+    if ignore_protons_water:
+        compartment_names = model.compartments
+        ignored_met_ids = frozenset(met.id for met in model.metabolites
+                                    if met_name(met, compartment_names) in NEAR_DUPLICATE_IGNORED_NAMES)
+    groups = {}
+    for rxn in model.reactions:
+        stoichiometry, sign = canonical_stoichiometry(rxn, ignored_met_ids)
+        if stoichiometry:
+            groups.setdefault(stoichiometry, []).append((rxn, sign))
+    rows = []
+    duplicated_groups = [members for members in groups.values() if len(members) > 1]
+    for group, members in enumerate(duplicated_groups):
+        first_sign = members[0][1]
+        for rxn, sign in members:
+            rows.append((group, rxn.id, rxn.name, rxn.build_reaction_string(), rxn.gene_reaction_rule,
+                         rxn.lower_bound, rxn.upper_bound, sign * first_sign))
+    return pd.DataFrame(rows, columns=DUPLICATE_COLUMNS)
+
+
+def print_duplicated_reactions(duplicates):
+    """Prints duplicated reactions in the format of findDuplicatedRxns.m.
+
+    Parameters
+    ----------
+    duplicates : pandas.DataFrame
+        Result of `find_duplicated_reactions`.
+    """
+    for _, group in duplicates.groupby("group", sort=True):
+        for row in group.itertuples():
+            print(row.reaction)
+            print(f"Name: {row.name} - GPR: {row.gene_reaction_rule} - LB={row.lower_bound:g} - "
+                  f"UB={row.upper_bound:g}")
+        print(" ")
+
+
+if __name__ == "__main__":
+    model = read_yeast_model()
+    print_duplicated_reactions(find_duplicated_reactions(model))
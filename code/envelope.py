@@ -0,0 +1,154 @@
+"""
+Functions for computing growth/product trade-off curves (production envelopes) of many products and
+knockout variants, by changing only bounds and objective on one model per process.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from cobra import Configuration
+from multiprocessing import Pool
+from .knockout import BIOMASS_ID
+
+ENVELOPE_COLUMNS = ["target", "variant", "axis_value", "growth_fraction", "growth", "product_min",
+                    "product_max"]
+
+# model and sweep settings of each worker process, set once by _init_worker:
+_worker_state = None
+
+
+def _envelope_task(model, target_id, knockout_ids, variant, biomass_id, growth_fractions, axis_id,
+                   axis_values):
+    """Computes the envelope of one target and knockout variant.
+
+    All points are solved on the same LP in sweep order, changing only the bounds of the growth (and
+    axis) reaction and the objective direction, so every solve starts from the previous basis.
+    """
+    rows = []
+    biomass_rxn = model.reactions.get_by_id(biomass_id)
+    target_rxn = model.reactions.get_by_id(target_id)
+    with model:
+        for rxn_id in knockout_ids:
+            model.reactions.get_by_id(rxn_id).bounds = (0, 0)
+        for axis_value in axis_values:
+            with model:
+                if axis_id is not None:
+                    model.reactions.get_by_id(axis_id).lower_bound = axis_value
+                model.objective = biomass_rxn
+                max_growth = model.slim_optimize(error_value=math.nan)
+                model.objective = target_rxn
+                for fraction in growth_fractions:
+                    growth = fraction * max_growth
+                    product_min = product_max = math.nan
+                    if not math.isnan(growth):
+                        with model:
+                            # relaxed by the tolerance, as fixing growth exactly at a (warm-started)
+                            # maximum can be infeasible by round-off:
+                            biomass_rxn.bounds = (max(growth - model.tolerance, 0), growth)
+                            model.objective_direction = "max"
+                            product_max = model.slim_optimize(error_value=math.nan)
+                            model.objective_direction = "min"
+                            product_min = model.slim_optimize(error_value=math.nan)
+                    rows.append((target_id, variant, axis_value, fraction, growth, product_min, product_max))
+    return rows
+
+
+def _init_worker(*state):
+    global _worker_state
+    _worker_state = state
+
+
+def _solve_task(task):
+    model, variants, *settings = _worker_state
+    target_id, variant = task
+    return _envelope_task(model, target_id, variants[variant], variant, *settings)
+
+
+def production_envelope(model, target_ids, growth_fractions=np.linspace(0, 1, 11), variants=None,
+                        axis_id=None, axis_values=None, biomass_id=BIOMASS_ID, processes=None):
+    """Computes the minimum and maximum flux of each target along a sweep of growth rates.
+
+    Growth is fixed to each fraction of its maximum (computed for every variant and axis value), and
+    the target flux is minimized and maximized. Targets and variants are split across a process pool
+    that receives the model once.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the medium of the study.
+    target_ids : list of str
+        Ids of the product reactions, e.g. the MVA exchange "r_1547".
+    growth_fractions : list of float, optional
+        Growth rates to sweep, as fractions of the maximum growth rate.
+    variants : dict, optional
+        Variant name -> ids of the reactions knocked out in that variant. Defaults to the wild type only.
+    axis_id : str, optional
+        Reaction of a second axis, e.g. the oxygen exchange "r_1992".
+    axis_values : list of float, optional
+        Lower bounds of the axis reaction to sweep (uptake limits for exchange reactions, which are
+        negative). Required if `axis_id` is given.
+    biomass_id : str, optional
+        Id of the growth reaction.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Tidy table with one row per point and the columns "target", "variant", "axis_value" (NaN
+        without axis), "growth_fraction", "growth", "product_min" and "product_max" (NaN if
+        infeasible).
+    """
+    if variants is None:
+        variants = {"wild_type": []}
+    if axis_id is None:
+        axis_values = [math.nan]
+    elif axis_values is None:
+        raise ValueError("axis_values are required when axis_id is given")
+    growth_fractions = list(growth_fractions)
+    axis_values = list(axis_values)
+    tasks = [(target_id, variant) for target_id in target_ids for variant in variants]
+    state = (model, variants, biomass_id, growth_fractions, axis_id, axis_values)
+    if processes is None:
+        processes = Configuration().processes
+    processes = max(1, min(processes, len(tasks)))
+    rows = []
+    if processes == 1:
+        for target_id, variant in tasks:
+            rows += _envelope_task(model, target_id, variants[variant], variant, *state[2:])
+    else:
+        with Pool(processes, initializer=_init_worker, initargs=state) as pool:
+            for task_rows in pool.imap(_solve_task, tasks):
+                rows += task_rows
+    return pd.DataFrame(rows, columns=ENVELOPE_COLUMNS)
+
+
+def envelope_arrays(envelope):
+    """Reshapes an envelope table into arrays indexed by target, variant, axis value and growth fraction.
+
+    Parameters
+    ----------
+    envelope : pandas.DataFrame
+        Result of `production_envelope`.
+
+    Returns
+    -------
+    dict
+        "targets", "variants", "axis_values" and "growth_fractions" (the coordinates), and "growth",
+        "product_min" and "product_max" (arrays of shape (targets, variants, axis values, fractions)).
+    """
+    coordinates = {}
+    codes = []
+    for column, key in (("target", "targets"), ("variant", "variants"), ("axis_value", "axis_values"),
+                        ("growth_fraction", "growth_fractions")):
+        values = pd.Index(pd.unique(envelope[column]))
+        if key in ("axis_values", "growth_fractions"):
+            values = values.sort_values()
+        coordinates[key] = values.to_numpy()
+        codes.append(values.get_indexer(envelope[column]))
+    shape = tuple(len(values) for values in coordinates.values())
+    for column in ("growth", "product_min", "product_max"):
+        array = np.full(shape, np.nan)
+        array[tuple(codes)] = envelope[column].to_numpy()
+        coordinates[column] = array
+    return coordinates
@@ -0,0 +1,176 @@
+"""
+Gene essentiality test of the yeast model on the Kennedy synthetic complete medium (port of
+code/modelTests/essentialGenes.m), solving one LP per distinct set of reactions inactivated by a gene.
+"""
+
+import math
+import re
+from .biomass import apply_delta, empty_delta
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .gpr import gene_reaction_map, knockout_reactions
+from .io import CACHE_MAX_SIZE, CACHE_PATH, REPO_PATH, read_yeast_model, yeast_model_key
+from .knockout import BIOMASS_ID, run_knockout_tasks
+
+ESSENTIAL_GENES_SCRIPT_PATH = f"{REPO_PATH}/code/modelTests/essentialGenes.m"
+ESSENTIAL_GENES_RESULTS_PATH = f"{REPO_PATH}/data/testResults/essentialGenes.md"
+ESSENTIALITY_VERSION = 1  # increase when the test changes, to invalidate cached results
+ESSENTIALITY_CACHE = SnapshotCache(f"{CACHE_PATH}/essentiality", max_size=CACHE_MAX_SIZE)
+KO_TOLERANCE = 1e-6  # growth ratio below which a deletion is lethal
+
+KENNEDY_CONSTRAINED_UPTAKE_IDS = (
+    "r_1604", "r_1639", "r_1873", "r_1879", "r_1880", "r_1881", "r_1671", "r_1883", "r_1757", "r_1891",
+    "r_1889", "r_1810", "r_1993", "r_1893", "r_1897", "r_1947", "r_1899", "r_1900", "r_1902", "r_1967",
+    "r_1903", "r_1548", "r_1904", "r_2028", "r_2038", "r_1906", "r_2067", "r_1911", "r_1912", "r_1913",
+    "r_2090", "r_1914", "r_2106")
+KENNEDY_GLUCOSE_ID = "r_1714"
+KENNEDY_UNCONSTRAINED_UPTAKE_IDS = (
+    "r_1672", "r_1654", "r_1992", "r_2005", "r_2060", "r_1861", "r_1832", "r_2100", "r_4593", "r_4595",
+    "r_4596", "r_4597", "r_2049", "r_4594", "r_4600", "r_2020")
+
+
+def kennedy_medium(model):
+    """Gets the delta that sets the Kennedy synthetic complete medium: no uptake through any exchange
+    reaction except 0.5 mmol/gDW/h of each supplement, 20 of glucose, and unconstrained ions, water,
+    O2, ammonium, phosphate and sulphate.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model.
+
+    Returns
+    -------
+    dict
+        Delta for `code.biomass.apply_delta`.
+    """
+    delta = empty_delta()
+    for rxn in model.reactions:
+        if rxn.boundary:
+            delta["bounds"][rxn.id] = (0, 1000)
+    for rxn_ids, lower_bound in ((KENNEDY_CONSTRAINED_UPTAKE_IDS, -0.5), ((KENNEDY_GLUCOSE_ID,), -20),
+                                 (KENNEDY_UNCONSTRAINED_UPTAKE_IDS, -1000)):
+        for rxn_id in rxn_ids:
+            upper_bound = delta["bounds"].get(rxn_id, model.reactions.get_by_id(rxn_id).bounds)[1]
+            delta["bounds"][rxn_id] = (lower_bound, upper_bound)
+    return delta
+
+
+def _read_gene_list(function_name, file_path=ESSENTIAL_GENES_SCRIPT_PATH):
+    """Reads a reference gene list from its MATLAB function in essentialGenes.m, ignoring commented
+    out genes."""
+    genes = set()
+    in_function = False
+    with open(file_path) as script_file:
+        for line in script_file:
+            if line.strip().startswith(f"function genes = {function_name}"):
+                in_function = True
+            elif in_function and "upper(genes)" in line:
+                break
+            elif in_function:
+                genes.update(gene.upper() for gene in re.findall(r"'([^']+)'", line.split("%")[0]))
+    return genes
+
+
+def reference_gene_lists():
+    """Gets the essential ORFs of the Yeast Deletion Project and the verified ORFs of SGD.
+
+    Returns
+    -------
+    tuple of (set, set)
+    """
+    return _read_gene_list("inviableORFs"), _read_gene_list("verifiedORFs")
+
+
+def growth_ratios(model, processes=None):
+    """Computes the growth ratio (mutant / wild type) of every single gene deletion.
+
+    Genes whose deletion inactivates the same set of reactions (by their GPR rules) share a single LP,
+    and the distinct sets are solved in a process pool. Genes that inactivate nothing keep a ratio of 1.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the medium of the test.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    dict
+        Gene id -> growth ratio (0 if infeasible).
+    """
+    with model:
+        model.objective = BIOMASS_ID
+        wild_type = model.slim_optimize(error_value=math.nan)
+        rules, gene_reactions = gene_reaction_map(model)
+        groups = {}
+        for gene in model.genes:
+            rxn_ids = frozenset(knockout_reactions([gene.id], rules, gene_reactions))
+            groups.setdefault(rxn_ids, []).append(gene.id)
+        rxn_sets = [rxn_ids for rxn_ids in groups if rxn_ids]
+        tasks = [(index, sorted(rxn_ids)) for index, rxn_ids in enumerate(rxn_sets)]
+        rows = run_knockout_tasks(model, tasks, [], processes)
+    ratios = {gene_id: 1.0 for gene_id in groups.get(frozenset(), [])}
+    for index, status, objective_value in rows:
+        ratio = objective_value / wild_type if status == "optimal" else 0.0
+        for gene_id in groups[rxn_sets[index]]:
+            ratios[gene_id] = ratio
+    return ratios
+
+
+def essential_genes(model=None, processes=None, write_output=False):
+    """Compares predicted and experimental gene essentiality on the Kennedy synthetic complete medium.
+
+    Parameters
+    ----------
+    model : cobra.core.Model, optional
+        Model to test. Defaults to the yeast model, whose results are cached until the model file or
+        the reference gene lists change.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    write_output : bool, optional
+        Whether to write the classified genes to data/testResults/essentialGenes.md.
+
+    Returns
+    -------
+    dict
+        "accuracy", "sensitivity", "specificity", "positive_predictive", "negative_predictive", "mcc"
+        and "geo_mean", and the sorted gene lists "tp" (true viable), "tn" (true inviable), "fp" (false
+        viable) and "fn" (false inviable).
+    """
+    key = None
+    result = None
+    if model is None:
+        key = snapshot_key(yeast_model_key(), file_hash(ESSENTIAL_GENES_SCRIPT_PATH), ESSENTIALITY_VERSION)
+        result = ESSENTIALITY_CACHE.load(key)
+        if result is None:
+            model = read_yeast_model()
+    if result is None:
+        with model:
+            apply_delta(model, kennedy_medium(model))
+            ratios = growth_ratios(model, processes)
+        inviable_orfs, verified_orfs = reference_gene_lists()
+        gene_ids = set(ratios) & verified_orfs
+        exp_inviable = gene_ids & inviable_orfs
+        exp_viable = gene_ids - inviable_orfs
+        mod_inviable = {gene_id for gene_id in gene_ids if ratios[gene_id] < KO_TOLERANCE}
+        mod_viable = gene_ids - mod_inviable
+        result = {"tp": sorted(exp_viable & mod_viable), "tn": sorted(exp_inviable & mod_inviable),
+                  "fp": sorted(exp_inviable & mod_viable), "fn": sorted(exp_viable & mod_inviable)}
+        tp, tn, fp, fn = (len(result[name]) for name in ("tp", "tn", "fp", "fn"))
+        result["accuracy"] = (tp + tn) / (tp + tn + fn + fp)
+        result["sensitivity"] = 100 * tp / (tp + fn)
+        result["specificity"] = 100 * tn / (tn + fp)
+        result["positive_predictive"] = 100 * tp / (tp + fp)
+        result["negative_predictive"] = 100 * tn / (fn + tn)
+        result["mcc"] = (tp * tn - fp * fn) / math.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn))
+        result["geo_mean"] = math.sqrt(result["sensitivity"] * result["specificity"])
+        if key is not None:
+            ESSENTIALITY_CACHE.save(key, result)
+    if write_output:
+        with open(ESSENTIAL_GENES_RESULTS_PATH, "w") as results_file:
+            for title, name in (("False non-essential genes", "fp"), ("False essential genes", "fn"),
+                                ("True non-essential genes", "tp"), ("True essential genes", "tn")):
+                results_file.write(f"## {title}\n")
+                results_file.writelines(f"{gene_id}\n" for gene_id in result[name])
+    return result
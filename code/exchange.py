@@ -0,0 +1,189 @@
+"""
+Resolution of target metabolites to their cytosolic species, the transport reactions that carry them to
+the extracellular space, and their exchange reaction, through indexes built once per model.
+"""
+
+import pandas as pd
+from collections import defaultdict, deque
+
+RESOLUTION_COLUMNS = ["species", "cytosolic_id", "extracellular_id", "transport_ids", "exchange_id"]
+
+
+def species_name(met, compartment_names):
+    """Gets the compartment-free, lowercase name shared by the copies of a metabolite.
+
+    Parameters
+    ----------
+    met : cobra.core.Metabolite
+        Metabolite of the model.
+    compartment_names : dict
+        Compartment id -> name, as `model.compartments`.
+
+    Returns
+    -------
+    str
+    """
+    name = met.name or met.id
+    suffix = f" [{compartment_names.get(met.compartment, met.compartment)}]"
+    if name.endswith(suffix):
+        name = name[:-len(suffix)]
+    return name.lower()
+
+
+class ExchangeResolver:
+    """Indexes of a model for finding how a metabolite leaves the cell.
+
+    The copies of a metabolite in different compartments are grouped into a species by their name. A
+    reaction is a transport of a species if the species is consumed in one compartment and produced in
+    another; the directions allowed by its bounds become edges between compartments. The model is only
+    read when building the indexes, so the resolver stays valid as long as the model structure and
+    bounds do not change.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to index.
+    cytosol : str, optional
+        Id of the cytosolic compartment.
+    extracellular : str, optional
+        Id of the extracellular compartment.
+    """
+
+    def __init__(self, model, cytosol="c", extracellular="e"):
+        self.cytosol = cytosol
+        self.extracellular = extracellular
+        self.met_species = {}  # met id -> species
+        self.species = defaultdict(dict)  # species -> compartment -> met id
+        self.exchanges = defaultdict(list)  # met id -> ids of its boundary reactions
+        self.transports = defaultdict(lambda: defaultdict(list))  # species -> from -> [(to, rxn id)]
+        self._chains = {}
+        compartment_names = model.compartments
+        for met in model.metabolites:
+            species = species_name(met, compartment_names)
+            self.met_species[met.id] = species
+            self.species[species][met.compartment] = met.id
+        for rxn in model.reactions:
+            if rxn.boundary:
+                for met in rxn.metabolites:
+                    self.exchanges[met.id].append(rxn.id)
+                continue
+            sides = defaultdict(list)
+            for met, coeff in rxn.metabolites.items():
+                sides[self.met_species[met.id]].append((met.compartment, coeff))
+            for species, compartments in sides.items():
+                if len(compartments) < 2:
+                    continue
+                for comp_from, coeff_from in compartments:
+                    for comp_to, coeff_to in compartments:
+                        if comp_from == comp_to or not coeff_from < 0 < coeff_to:
+                            continue
+                        if rxn.upper_bound > 0:
+                            self.transports[species][comp_from].append((comp_to, rxn.id))
+                        if rxn.lower_bound < 0:
+                            self.transports[species][comp_to].append((comp_from, rxn.id))
+        self.species = dict(self.species)
+        self.exchanges = dict(self.exchanges)
+
+    def find_species(self, query):
+        """Gets the species of a metabolite id or name (case insensitive, with or without compartment).
+
+        Parameters
+        ----------
+        query : str
+            Metabolite id, or metabolite name.
+
+        Returns
+        -------
+        str or None
+            Species name, or None if the metabolite is not in the model.
+        """
+        if query in self.met_species:
+            return self.met_species[query]
+        name = query.lower()
+        if name in self.species:
+            return name
+        if name.endswith("]") and " [" in name:
+            name = name[:name.rindex(" [")]
+            if name in self.species:
+                return name
+        return None
+
+    def transport_chain(self, species):
+        """Gets the shortest chain of transport reactions taking a species from the cytosol to the
+        extracellular space.
+
+        Parameters
+        ----------
+        species : str
+            Species name, as returned by `find_species`.
+
+        Returns
+        -------
+        list of str or None
+            Ids of the transport reactions in order (empty if the species does not need transport), or
+            None if it cannot reach the extracellular space.
+        """
+        if species in self._chains:
+            return self._chains[species]
+        compartments = self.species.get(species, {})
+        chain = None
+        if self.cytosol in compartments and self.extracellular in compartments:
+            edges = self.transports.get(species, {})
+            previous = {self.cytosol: None}
+            queue = deque([self.cytosol])
+            while queue:
+                compartment = queue.popleft()
+                if compartment == self.extracellular:
+                    chain = []
+                    while previous[compartment] is not None:
+                        compartment, rxn_id = previous[compartment]
+                        chain.append(rxn_id)
+                    chain.reverse()
+                    break
+                for comp_to, rxn_id in edges.get(compartment, []):
+                    if comp_to not in previous:
+                        previous[comp_to] = (compartment, rxn_id)
+                        queue.append(comp_to)
+        self._chains[species] = chain
+        return chain
+
+    def resolve(self, query):
+        """Finds the cytosolic species, the transport chain and the exchange reaction of a metabolite.
+
+        Parameters
+        ----------
+        query : str
+            Metabolite id or name, e.g. "(R)-mevalonate".
+
+        Returns
+        -------
+        dict
+            With the keys "species", "cytosolic_id", "extracellular_id", "transport_ids" and
+            "exchange_id". Values that cannot be resolved are None.
+        """
+        species = self.find_species(query)
+        compartments = self.species.get(species, {})
+        extracellular_id = compartments.get(self.extracellular)
+        exchange_ids = self.exchanges.get(extracellular_id, [])
+        return {"species": species,
+                "cytosolic_id": compartments.get(self.cytosol),
+                "extracellular_id": extracellular_id,
+                "transport_ids": self.transport_chain(species) if species is not None else None,
+                "exchange_id": exchange_ids[0] if exchange_ids else None}
+
+    def resolve_many(self, queries):
+        """Resolves a list of target metabolites at once (see `resolve`).
+
+        Parameters
+        ----------
+        queries : list of str
+            Metabolite ids or names.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Indexed by query, with one column per key of `resolve`.
+        """
+        queries = list(dict.fromkeys(queries))
+        rows = [self.resolve(query) for query in queries]
+        return pd.DataFrame(rows, index=pd.Index(queries, name="query"), columns=RESOLUTION_COLUMNS)
@@ -0,0 +1,252 @@
+"""
+Export of the yeast model to the formats kept in model/ (SBML, RAVEN YAML, text and Excel) or to COBRA's MAT
+format, with the writers running in parallel, outputs written atomically, and unchanged outputs left untouched.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from cobra import Configuration
+from cobra.io import save_matlab_model, write_sbml_model
+from multiprocessing import Pool
+from .biomass import met_name
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, REPO_PATH
+from .raven_yaml import ordered_compartments, write_raven_yaml
+
+EXPORT_VERSION = 1  # increase when a writer changes, to force rewriting all outputs
+EXPORT_CACHE = SnapshotCache(f"{CACHE_PATH}/exports", max_size=CACHE_MAX_SIZE)
+TEXT_FORMATS = ("xml", "yml", "txt")
+BINARY_FORMATS = ("xlsx",)  # model/yeast-GEM.mat is a RAVEN structure, which write_mat does not produce
+RAVEN_FORMATS = ("yml", "xlsx")  # formats with fields kept only in the notes of models read by read_raven_yaml
+RAVEN_META_DATA_FIELDS = ("version", "date", "defaultLB", "defaultUB")
+
+# model of each worker process, set once by _init_worker:
+_worker_model = None
+
+
+def _miriam(annotation, exclude=()):
+    return ";".join(f"{key}/{value}" for key in sorted(annotation) if key not in exclude
+                    for value in (annotation[key] if isinstance(annotation[key], list) else [annotation[key]]))
+
+
+def _num2str(value):
+    """Formats a coefficient as MATLAB's num2str (4 decimals beyond the integer digits)."""
+    if float(value).is_integer():
+        return str(int(value))
+    digits = max(len(str(int(abs(value)))) if abs(value) >= 1 else 1, 1) + 4
+    return f"{value:.{digits}g}"
+
+
+def reaction_equations(model):
+    """Gets the equation of each reaction as written by RAVEN, e.g. "(R)-lactate[c] + 2 ferricytochrome
+    c[m] => 2 ferrocytochrome c[m] + pyruvate[c]", with metabolites in model order.
+
+    Returns
+    -------
+    dict
+        Reaction id -> equation.
+    """
+    compartment_names = model.compartments
+    met_index = {met.id: index for index, met in enumerate(model.metabolites)}
+    met_labels = {met.id: f"{met_name(met, compartment_names)}[{met.compartment}]" for met in model.metabolites}
+    equations = {}
+    for rxn in model.reactions:
+        sides = ([], [])
+        for met, coeff in sorted(rxn.metabolites.items(), key=lambda item: met_index[item[0].id]):
+            amount = "" if abs(coeff) == 1 else f"{_num2str(abs(coeff))} "
+            sides[coeff > 0].append(amount + met_labels[met.id])
+        arrow = "<=>" if rxn.lower_bound < 0 else "=>"
+        equations[rxn.id] = f"{' + '.join(sides[0])} {arrow} {' + '.join(sides[1])}"
+    return equations
+
+
+def write_txt(model, file_path):
+    """Writes the reactions of a model as a tab-delimited file (as RAVEN's exportForGit)."""
+    equations = reaction_equations(model)
+    with open(file_path, "w", encoding="utf-8") as txt_file:
+        txt_file.write("Rxn name\tFormula\tGene-reaction association\tLB\tUB\tObjective\n")
+        for rxn in model.reactions:
+            txt_file.write(f"{rxn.id}\t{equations[rxn.id]} \t{rxn.gene_reaction_rule}\t{rxn.lower_bound:6.2f}\t"
+                           f"{rxn.upper_bound:6.2f}\t{rxn.objective_coefficient:6.2f}\n")
+
+
+def write_xlsx(model, file_path):
+    """Writes a model in the Excel format of RAVEN (sheets RXNS, METS, COMPS, GENES and MODEL)."""
+    import pandas as pd
+    names = ordered_compartments(model)
+    equations = reaction_equations(model)
+    sheets = {
+        "RXNS": pd.DataFrame(
+            [(None, rxn.id, rxn.name, equations[rxn.id],
+              ";".join(rxn.annotation.get("ec-code", []) if isinstance(rxn.annotation.get("ec-code"), list)
+                       else [rxn.annotation["ec-code"]] if "ec-code" in rxn.annotation else []),
+              rxn.gene_reaction_rule, rxn.lower_bound, rxn.upper_bound, rxn.objective_coefficient or None,
+              None, _miriam(rxn.annotation, ("ec-code",)), rxn.subsystem.replace("; ", ";"), None,
+              rxn.notes.get("rxnNotes"), rxn.notes.get("references"), rxn.notes.get("confidence_score"))
+             for rxn in model.reactions],
+            columns=["#", "ID", "NAME", "EQUATION", "EC-NUMBER", "GENE ASSOCIATION", "LOWER BOUND",
+                     "UPPER BOUND", "OBJECTIVE", "COMPARTMENT", "MIRIAM", "SUBSYSTEM", "REPLACEMENT ID", "NOTE",
+                     "REFERENCE", "CONFIDENCE SCORE"]),
+        "METS": pd.DataFrame(
+            [(None, f"{met_name(met, names)}[{met.compartment}]", met_name(met, names),
+              None, _miriam(met.annotation), met.formula, None, met.compartment, met.id, met.charge)
+             for met in model.metabolites],
+            columns=["#", "ID", "NAME", "UNCONSTRAINED", "MIRIAM", "COMPOSITION", "InChI", "COMPARTMENT",
+                     "REPLACEMENT ID", "CHARGE"]),
+        "COMPS": pd.DataFrame([(None, comp_id, name, None, None) for comp_id, name in names.items()],
+                              columns=["#", "ABBREVIATION", "NAME", "INSIDE", "MIRIAM"]),
+        "GENES": pd.DataFrame([(None, gene.id, _miriam(gene.annotation), gene.name, None) for gene in model.genes],
+                              columns=["#", "NAME", "MIRIAM", "SHORT NAME", "COMPARTMENT"]),
+        "MODEL": pd.DataFrame(
+            [(None, model.id, model.name, model.notes.get("taxonomy"), model.notes.get("defaultLB"),
+              model.notes.get("defaultUB"), model.notes.get("givenName"), model.notes.get("familyName"),
+              model.notes.get("email"), model.notes.get("organization"), model.notes.get("note"))],
+            columns=["#", "ID", "NAME", "TAXONOMY", "DEFAULT LOWER", "DEFAULT UPPER", "CONTACT GIVEN NAME",
+                     "CONTACT FAMILY NAME", "CONTACT EMAIL", "ORGANIZATION", "NOTES"]),
+    }
+    with pd.ExcelWriter(file_path, engine="openpyxl") as writer:
+        for name, sheet in sheets.items():
+            sheet.to_excel(writer, sheet_name=name, index=False)
+
+
+def write_mat(model, file_path):
+    """Writes a model as a MAT file (COBRA structure, named "model"), which cannot replace the RAVEN
+    structure of model/yeast-GEM.mat."""
+    save_matlab_model(model, file_path, varname="model")
+
+
+WRITERS = {
+    "xml": lambda model, file_path: write_sbml_model(model, file_path),
+    "yml": write_raven_yaml,
+    "txt": write_txt,
+    "xlsx": write_xlsx,
+    "mat": write_mat,
+}
+
+
+def has_raven_notes(model):
+    """Checks whether a model has the RAVEN fields that COBRA lacks (metaData, SMILES, deltaG, confidence
+    scores, ...) in its notes, as the models read by `code.raven_yaml.read_raven_yaml`."""
+    return all(key in model.notes for key in RAVEN_META_DATA_FIELDS)
+
+
+def model_content_key(model):
+    """Hashes everything that the writers export from a model (ids, names, stoichiometry, bounds, rules,
+    annotations and notes), to know whether its outputs can be reused.
+
+    Returns
+    -------
+    str
+    """
+    digest = hashlib.sha256()
+
+    def update(value):
+        digest.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+
+    update([model.id, model.name, model.notes, model.compartments])
+    for met in model.metabolites:
+        update([met.id, met.name, met.compartment, met.formula, met.charge, met.annotation, met.notes])
+    for rxn in model.reactions:
+        update([rxn.id, rxn.name, [(met.id, coeff) for met, coeff in rxn.metabolites.items()], rxn.lower_bound,
+                rxn.upper_bound, rxn.objective_coefficient, rxn.gene_reaction_rule, rxn.subsystem,
+                rxn.annotation, rxn.notes])
+    for gene in model.genes:
+        update([gene.id, gene.name, gene.annotation, gene.notes])
+    return digest.hexdigest()
+
+
+def _export(model, output_format, file_path):
+    """Writes one output through a temporary file in the same folder, replacing the existing file only
+    if the content differs. Returns the hash of the file, and whether it was replaced."""
+    directory, file_name = os.path.split(os.path.abspath(file_path))
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{file_name}.", suffix=f".{output_format}")
+    os.close(file_descriptor)
+    try:
+        WRITERS[output_format](model, tmp_path)
+        new_hash = file_hash(tmp_path)
+        replaced = not os.path.exists(file_path) or file_hash(file_path) != new_hash
+        if replaced:
+            # temporary files are private (mode 0600): give the output the mode of the file it replaces,
+            # or the default mode of new files
+            if os.path.exists(file_path):
+                shutil.copymode(file_path, tmp_path)
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmp_path, 0o666 & ~umask)
+            os.replace(tmp_path, file_path)
+        else:
+            os.remove(tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return new_hash, replaced
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _export_task(task):
+    output_format, file_path = task
+    return (output_format, *_export(_worker_model, output_format, file_path))
+
+
+def export_model(model, paths, processes=None):
+    """Writes a model in several formats at once.
+
+    An output is skipped without running its writer if it was written by this function from a model with
+    the same content (see `model_content_key`) and the file was not modified since. The other outputs are
+    written in parallel, each through a temporary file that replaces the output only if its content
+    changed (formats with timestamps, such as xlsx and mat, are always replaced when rewritten).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to write.
+    paths : dict
+        Format ("xml", "yml", "txt", "xlsx" or "mat") -> output path.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    dict
+        Format -> "unchanged" or "written".
+    """
+    content_key = model_content_key(model)
+    status = {}
+    tasks = []
+    for output_format, file_path in paths.items():
+        record = EXPORT_CACHE.load(snapshot_key(os.path.abspath(file_path)))
+        if (record is not None and record["content_key"] == snapshot_key(content_key, output_format, EXPORT_VERSION)
+                and os.path.exists(file_path) and file_hash(file_path) == record["file_hash"]):
+            status[output_format] = "unchanged"
+        else:
+            tasks.append((output_format, file_path))
+    if tasks:
+        if processes is None:
+            processes = Configuration().processes
+        processes = max(1, min(processes, len(tasks)))
+        if processes == 1:
+            results = [(output_format, *_export(model, output_format, file_path)) for output_format, file_path in tasks]
+        else:
+            with Pool(processes, initializer=_init_worker, initargs=(model,)) as pool:
+                results = list(pool.imap_unordered(_export_task, tasks))
+        for output_format, new_hash, replaced in results:
+            file_path = paths[output_format]
+            EXPORT_CACHE.save(snapshot_key(os.path.abspath(file_path)),
+                              {"content_key": snapshot_key(content_key, output_format, EXPORT_VERSION),
+                               "file_hash": new_hash})
+            status[output_format] = "written" if replaced else "unchanged"
+    return {output_format: status[output_format] for output_format in paths}
+
+
+def yeast_model_paths(formats=TEXT_FORMATS):
+    """Gets the paths of the yeast model files in model/, by format."""
+    return {output_format: f"{REPO_PATH}/model/yeast-GEM.{output_format}" for output_format in formats}
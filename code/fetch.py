@@ -0,0 +1,255 @@
+"""
+Asynchronous fetching of annotation data from web APIs (UniProt, ModelSEED, ...), with bounded
+concurrency, rate limiting, retries with exponential backoff, a persistent response cache (with expiry) and
+resumable checkpoints. Sources are pluggable, so a local directory or fixture server can stand in for the live API.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import warnings
+import httpx
+from .cache import SnapshotCache, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH
+
+RESPONSE_VERSION = 1  # increase when the cached records change, to invalidate cached responses
+RESPONSE_CACHE = SnapshotCache(f"{CACHE_PATH}/responses", max_size=CACHE_MAX_SIZE)
+RESPONSE_MAX_AGE = 30 * 24 * 3600  # seconds, after which a cached response is fetched again
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+              "Chrome/104.0.0.0 Safari/537.36")
+
+
+class RetryableError(Exception):
+    """Raised by sources for failures that are worth retrying, optionally after a given delay."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ResponseError(Exception):
+    """Raised by sources for failures that are not worth retrying (e.g. HTTP 404), with the text of the
+    response, which is parsed (as the scripts did before) but not cached."""
+
+    def __init__(self, message, text=""):
+        super().__init__(message)
+        self.text = text
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for coroutines: on average `rate` acquisitions per second, with bursts
+    of up to `capacity`.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+    capacity : int, optional
+        Maximum number of stored tokens. Defaults to 1 (no bursts).
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HttpSource:
+    """Source that gets each key from a URL template, e.g. "https://rest.uniprot.org/uniprotkb/{key}".
+
+    Parameters
+    ----------
+    url_template : str
+        URL with a "{key}" placeholder. It may be relative to `base_url`.
+    base_url : str, optional
+        Base URL of the API, e.g. that of a local fixture server.
+    headers : dict, optional
+        Request headers. Defaults to a browser user agent.
+    timeout : float, optional
+        Timeout of each request, in seconds.
+    transport : httpx.AsyncBaseTransport, optional
+        Transport of the client (e.g. httpx.MockTransport in tests).
+    """
+
+    def __init__(self, url_template, base_url="", headers=None, timeout=30, transport=None):
+        self.url_template = url_template
+        self.client = httpx.AsyncClient(base_url=base_url, headers=headers or {"user-agent": USER_AGENT},
+                                        timeout=timeout, transport=transport)
+
+    def cache_id(self, key):
+        return str(self.client.base_url.join(self.url_template.format(key=key)))
+
+    async def get(self, key):
+        try:
+            response = await self.client.get(self.url_template.format(key=key))
+        except httpx.TransportError as error:
+            raise RetryableError(f"{key}: {error!r}")
+        if response.status_code in RETRY_STATUS_CODES:
+            retry_after = response.headers.get("retry-after")
+            raise RetryableError(f"{key}: HTTP {response.status_code}",
+                                 float(retry_after) if retry_after and retry_after.isdigit() else None)
+        if response.is_error:
+            raise ResponseError(f"{key}: HTTP {response.status_code}", response.text)
+        return response.text
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class DirectorySource:
+    """Source that reads each key from a file "{directory}/{key}{suffix}", as an offline stand-in for an
+    API (e.g. saved responses used as test fixtures). Missing files raise FileNotFoundError.
+    """
+
+    def __init__(self, directory, suffix=".json"):
+        self.directory = directory
+        self.suffix = suffix
+
+    def cache_id(self, key):
+        return None  # local files are not cached
+
+    async def get(self, key):
+        with open(os.path.join(self.directory, f"{key}{self.suffix}"), encoding="utf-8") as file:
+            return file.read()
+
+    async def close(self):
+        pass
+
+
+class Checkpoint:
+    """Append-only JSON-lines file of the parsed result of each fetched key, so that an interrupted run
+    resumes where it stopped.
+
+    Parameters
+    ----------
+    file_path : str, optional
+        Path of the checkpoint. None keeps the results in memory only.
+    """
+
+    def __init__(self, file_path=None):
+        self.file_path = file_path
+        self.results = {}
+        if file_path and os.path.exists(file_path):
+            with open(file_path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # line truncated by a crash, fetched again
+                    self.results[record["key"]] = record["value"]
+
+    def add(self, key, value):
+        self.results[key] = value
+        if self.file_path:
+            with open(self.file_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps({"key": key, "value": value}) + "\n")
+
+
+async def _fetch_one(key, source, parse, bucket, semaphore, retries, backoff, cache, max_age):
+    cache_id = source.cache_id(key) if cache is not None else None
+    cache_key = snapshot_key(cache_id, RESPONSE_VERSION) if cache_id else None
+    record = cache.load(cache_key) if cache_key else None
+    if record is not None and (max_age is None or time.time() - record["time"] <= max_age):
+        return parse(key, record["text"])
+    async with semaphore:
+        for attempt in range(retries + 1):
+            await bucket.acquire()
+            try:
+                text = await source.get(key)
+                break
+            except RetryableError as error:
+                if attempt == retries:
+                    raise
+                delay = error.retry_after or backoff * 2 ** attempt
+                await asyncio.sleep(delay * random.uniform(1, 1.5))
+            except ResponseError as error:
+                warnings.warn(f"{error}: parsed, but not cached")
+                return parse(key, error.text)
+    if cache_key:
+        cache.save(cache_key, {"time": time.time(), "text": text}, evict=False)
+    return parse(key, text)
+
+
+async def fetch_all(keys, source, parse, checkpoint_path=None, concurrency=8, rate=5, retries=5, backoff=1,
+                    cache=RESPONSE_CACHE, max_age=RESPONSE_MAX_AGE, progress=None):
+    """Fetches and parses many keys concurrently.
+
+    Parameters
+    ----------
+    keys : iterable of str
+        Keys to fetch (e.g. gene ids).
+    source : HttpSource or DirectorySource
+        Where the raw text of each key is fetched from. It is closed at the end.
+    parse : callable
+        Function of (key, text) returning a JSON-serializable result.
+    checkpoint_path : str, optional
+        Checkpoint file. Keys already in it are not fetched again.
+    concurrency : int, optional
+        Maximum number of requests in flight.
+    rate : float, optional
+        Maximum average number of requests per second.
+    retries : int, optional
+        Number of retries of a failed request, waiting `backoff` * 2 ** attempt seconds (with jitter) or
+        the delay asked by the server.
+    backoff : float, optional
+        Initial delay between retries, in seconds.
+    cache : code.cache.SnapshotCache, optional
+        Cache of raw responses, by URL. None disables it.
+    max_age : float, optional
+        Age in seconds after which a cached response is fetched again. None keeps responses until they
+        are evicted.
+    progress : callable, optional
+        Called with (number done, total) after each key.
+
+    Returns
+    -------
+    dict
+        Key -> parsed result, in the order of `keys`.
+    """
+    keys = list(dict.fromkeys(keys))
+    checkpoint = Checkpoint(checkpoint_path)
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = [key for key in keys if key not in checkpoint.results]
+    done = len(keys) - len(pending)
+
+    async def fetch_and_record(key):
+        nonlocal done
+        value = await _fetch_one(key, source, parse, bucket, semaphore, retries, backoff, cache, max_age)
+        checkpoint.add(key, value)
+        done += 1
+        if progress:
+            progress(done, len(keys))
+
+    tasks = [asyncio.ensure_future(fetch_and_record(key)) for key in pending]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # a key that failed all its retries stops the run; the checkpoint keeps the finished ones
+        for task in tasks:
+            task.cancel()
+        await source.close()
+        if cache is not None:
+            cache.evict()
+    return {key: checkpoint.results[key] for key in keys}
+
+
+def run_fetch(keys, source, parse, **kwargs):
+    """Runs `fetch_all` to completion from synchronous code."""
+    return asyncio.run(fetch_all(keys, source, parse, **kwargs))
@@ -0,0 +1,242 @@
+"""
+Flux variability analysis (FVA) split in chunks of reactions over a process pool, with results cached by
+model content and constraints, and incremental updates after bound changes.
+"""
+
+import hashlib
+import math
+import pandas as pd
+from cobra import Configuration
+from cobra.util.solver import linear_reaction_coefficients
+from multiprocessing import Pool
+from optlang.symbolics import Zero
+from .cache import SnapshotCache, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH
+
+FVA_VERSION = 1  # increase when the computation changes, to invalidate cached results
+FVA_CACHE = SnapshotCache(f"{CACHE_PATH}/fva", max_size=CACHE_MAX_SIZE)
+
+# model of each worker process, prepared once by _init_worker:
+_worker_model = None
+
+
+def constraints_key(model, fraction_of_optimum, rxn_ids=None):
+    """Gets the cache key of an FVA: stoichiometry, bounds, metabolite bounds, objective, the other
+    constraints of the solver (e.g. growth floors or coupling constraints), solver tolerance and FVA
+    settings.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the constraints of the FVA.
+    fraction_of_optimum : float
+        Fraction of the optimum that the objective must keep.
+    rxn_ids : list of str, optional
+        Reactions of the FVA (all if None).
+
+    Returns
+    -------
+    str
+    """
+    digest = hashlib.sha256()
+    objective = {rxn.id: coeff for rxn, coeff in linear_reaction_coefficients(model).items()}
+    for rxn in model.reactions:
+        stoichiometry = ",".join(f"{met.id}:{coeff!r}" for met, coeff in rxn.metabolites.items())
+        digest.update(f"{rxn.id};{rxn.lower_bound!r};{rxn.upper_bound!r};{objective.get(rxn.id, 0)!r};"
+                      f"{stoichiometry}\n".encode("utf-8"))
+    for met in model.metabolites:
+        if met._bound:
+            digest.update(f"{met.id};{met._bound!r}\n".encode("utf-8"))
+    for constraint in model.constraints:
+        # mass balances are already covered by the stoichiometry:
+        if constraint.name not in model.metabolites:
+            digest.update(f"{constraint.name};{constraint.expression};{constraint.lb!r};{constraint.ub!r}\n"
+                          .encode("utf-8"))
+    return snapshot_key(digest.hexdigest(), model.objective_direction, model.tolerance, fraction_of_optimum,
+                        None if rxn_ids is None else sorted(rxn_ids), FVA_VERSION)
+
+
+def _prepare_model(model, fraction_of_optimum):
+    """Constrains the objective to a fraction of its optimum and clears it (inside a model context)."""
+    if fraction_of_optimum > 0:
+        optimum = model.slim_optimize(error_value=math.nan)
+        if math.isnan(optimum):
+            raise ValueError(f"The model is infeasible ({model.solver.status}), FVA cannot be computed")
+        bound = fraction_of_optimum * optimum
+        if model.objective_direction == "max":
+            floor = model.problem.Constraint(model.solver.objective.expression, lb=bound,
+                                             name="fva_objective_floor")
+        else:
+            floor = model.problem.Constraint(model.solver.objective.expression, ub=bound,
+                                             name="fva_objective_floor")
+        model.add_cons_vars([floor])
+    model.objective = model.problem.Objective(Zero, direction="max")
+
+
+def _fva_chunk(model, rxn_ids):
+    """Minimizes and maximizes each reaction of a chunk on the same LP.
+
+    Only the objective coefficients of one reaction change between solves, so each solve starts from
+    the basis of the previous one.
+    """
+    rows = []
+    objective = model.solver.objective
+    for rxn_id in rxn_ids:
+        rxn = model.reactions.get_by_id(rxn_id)
+        objective.set_linear_coefficients({rxn.forward_variable: 1, rxn.reverse_variable: -1})
+        values = []
+        for direction in ("min", "max"):
+            objective.direction = direction
+            values.append(model.slim_optimize(error_value=math.nan))
+        objective.set_linear_coefficients({rxn.forward_variable: 0, rxn.reverse_variable: 0})
+        rows.append((rxn_id, *values))
+    return rows
+
+
+def _init_worker(model, fraction_of_optimum):
+    global _worker_model
+    _prepare_model(model, fraction_of_optimum)
+    _worker_model = model
+
+
+def _solve_chunk(rxn_ids):
+    return _fva_chunk(_worker_model, rxn_ids)
+
+
+def _compute_fva(model, rxn_ids, fraction_of_optimum, processes, chunks_per_process=4):
+    if processes is None:
+        processes = Configuration().processes
+    processes = max(1, min(processes, len(rxn_ids)))
+    if processes == 1:
+        with model:
+            _prepare_model(model, fraction_of_optimum)
+            rows = _fva_chunk(model, rxn_ids)
+    else:
+        # Contiguous chunks keep reactions of the same pathway (and a similar basis) together:
+        chunk_size = math.ceil(len(rxn_ids) / (processes * chunks_per_process))
+        chunks = [rxn_ids[i:i + chunk_size] for i in range(0, len(rxn_ids), chunk_size)]
+        rows = []
+        with Pool(processes, initializer=_init_worker, initargs=(model, fraction_of_optimum)) as pool:
+            for chunk_rows in pool.imap_unordered(_solve_chunk, chunks):
+                rows.extend(chunk_rows)
+    return pd.DataFrame(rows, columns=["reaction", "minimum", "maximum"]).set_index("reaction")
+
+
+def flux_variability(model, rxn_ids=None, fraction_of_optimum=0.0, processes=None, use_cache=True):
+    """Computes the minimum and maximum flux of reactions, as a cached replacement of
+    `cobra.flux_analysis.flux_variability_analysis`.
+
+    Results are stored keyed by the stoichiometry, bounds and objective of the model, so repeating an
+    analysis under the same constraints does not solve any LP.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the constraints of the analysis. It is not modified.
+    rxn_ids : list of str, optional
+        Reactions to analyze. Defaults to all reactions.
+    fraction_of_optimum : float, optional
+        Fraction of the optimum of the current objective that must be kept.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    use_cache : bool, optional
+        Whether to look up and store the result in the cache.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by reaction id, with the columns "minimum" and "maximum" (NaN if infeasible).
+    """
+    all_rxn_ids = [rxn.id for rxn in model.reactions]
+    rxn_ids = all_rxn_ids if rxn_ids is None else list(dict.fromkeys(rxn_ids))
+    key = constraints_key(model, fraction_of_optimum, None if rxn_ids == all_rxn_ids else rxn_ids)
+    if use_cache:
+        result = FVA_CACHE.load(key)
+        if result is not None:
+            return result.loc[rxn_ids]
+    result = _compute_fva(model, rxn_ids, fraction_of_optimum, processes).loc[rxn_ids]
+    if use_cache:
+        FVA_CACHE.save(key, result)
+    return result
+
+
+def _optimum_with_bounds(model, bounds):
+    with model:
+        for rxn_id, rxn_bounds in bounds.items():
+            model.reactions.get_by_id(rxn_id).bounds = rxn_bounds
+        return model.slim_optimize(error_value=math.nan)
+
+
+def update_flux_variability(model, previous, old_bounds, fraction_of_optimum=0.0, processes=None,
+                            tolerance=1e-9, use_cache=True):
+    """Updates an FVA result after changing the bounds of some reactions, recomputing only the
+    reactions whose range may have changed.
+
+    - If every changed bound was not active (the previous range of the reaction lies strictly inside
+      both the old and new bounds), the feasible space is unchanged and no LP is solved.
+    - If all changes tighten bounds and the optimum is unchanged, the new feasible space is a subset of
+      the previous one, so reactions with a fixed flux (including blocked reactions) keep it and only
+      the other reactions are recomputed.
+    - Otherwise, all reactions are recomputed.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the new bounds already set.
+    previous : pandas.DataFrame
+        FVA result before the change (see `flux_variability`), with the same `fraction_of_optimum`.
+    old_bounds : dict
+        Reaction id -> (lower bound, upper bound) before the change, for every changed reaction.
+    fraction_of_optimum : float, optional
+        Fraction of the optimum of the current objective that must be kept.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    tolerance : float, optional
+        Tolerance for comparing fluxes and optima.
+    use_cache : bool, optional
+        Whether to look up and store the result in the cache.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Same format as `previous`.
+    """
+    rxn_ids = list(previous.index)
+    all_rxn_ids = [rxn.id for rxn in model.reactions]
+    key = constraints_key(model, fraction_of_optimum, None if rxn_ids == all_rxn_ids else rxn_ids)
+    if use_cache:
+        result = FVA_CACHE.load(key)
+        if result is not None:
+            return result
+
+    inactive = True
+    tightened = True
+    for rxn_id, (old_lb, old_ub) in old_bounds.items():
+        new_lb, new_ub = model.reactions.get_by_id(rxn_id).bounds
+        # An unknown or infeasible previous range cannot show that the bound was inactive:
+        minimum, maximum = previous.loc[rxn_id] if rxn_id in previous.index else (math.nan, math.nan)
+        if not (minimum > max(old_lb, new_lb) + tolerance and maximum < min(old_ub, new_ub) - tolerance):
+            inactive = False
+        if new_lb < old_lb or new_ub > old_ub:
+            tightened = False
+
+    if inactive:
+        result = previous.copy()
+    else:
+        to_compute = rxn_ids
+        if tightened and previous.notna().all(axis=None):
+            # The new space must not be empty, and the objective floor only keeps the subset property
+            # if the optimum did not change:
+            optimum = model.slim_optimize(error_value=math.nan)
+            subset = not math.isnan(optimum)
+            if subset and fraction_of_optimum > 0:
+                subset = abs(optimum - _optimum_with_bounds(model, old_bounds)) <= tolerance
+            if subset:
+                fixed = (previous["maximum"] - previous["minimum"]).abs() <= tolerance
+                to_compute = list(previous.index[~fixed])
+        result = previous.copy()
+        if to_compute:
+            result.loc[to_compute] = _compute_fva(model, to_compute, fraction_of_optimum, processes)
+    if use_cache:
+        FVA_CACHE.save(key, result)
+    return result
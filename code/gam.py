@@ -0,0 +1,193 @@
+"""
+Fitting of the growth (and non-growth) associated maintenance of the yeast model to chemostat data (port
+of code/otherChanges/fitGAM.m), with a bounded Brent search instead of nested grids.
+"""
+
+import math
+import numpy as np
+import pandas as pd
+from cobra import Configuration
+from multiprocessing import Pool
+from scipy.optimize import minimize_scalar
+from .biomass import apply_delta, change_gam
+from .io import REPO_PATH
+
+VANHOEK_PATH = f"{REPO_PATH}/data/physiology/chemostatData_VanHoek1998.tsv"
+# reactions of the simulated values, in the column order of the data:
+FIT_RXN_NAMES = ("growth", "D-glucose exchange", "oxygen exchange", "carbon dioxide exchange")
+
+# model of each worker process, set once by _init_worker:
+_worker_model = None
+
+
+def load_vanhoek_data(file_path=VANHOEK_PATH):
+    """Loads chemostat data with the columns dilution rate (1/h), glucose uptake, O2 uptake and CO2
+    production (mmol/gDW/h), as an array with one row per chemostat."""
+    return pd.read_csv(file_path, sep="\t").to_numpy(dtype=float)
+
+
+def _fit_rxn_ids(model):
+    rxn_ids = {rxn.name: rxn.id for rxn in model.reactions if rxn.name in FIT_RXN_NAMES}
+    return [rxn_ids[name] for name in FIT_RXN_NAMES]
+
+
+def _simulate_points(model, rxn_ids, gam, ngam, points):
+    """Simulates chemostats with a given GAM: growth fixed to the dilution rate and glucose uptake
+    minimized. The GAM is changed in place in the LP, which keeps the basis of the previous solve.
+
+    Returns the absolute growth, glucose, O2 and CO2 fluxes of each point (NaN if infeasible).
+    """
+    growth_rxn = model.reactions.get_by_id(rxn_ids[0])
+    glucose_rxn = model.reactions.get_by_id(rxn_ids[1])
+    results = []
+    with model:
+        apply_delta(model, change_gam(model, gam, ngam))
+        glucose_rxn.lower_bound = -10
+        model.objective = glucose_rxn
+        model.objective_direction = "max"
+        for dilution_rate in points:
+            with model:
+                growth_rxn.lower_bound = dilution_rate
+                model.slim_optimize()
+                if model.solver.status == "optimal":
+                    results.append([abs(model.reactions.get_by_id(rxn_id).flux) for rxn_id in rxn_ids])
+                else:
+                    results.append([math.nan] * len(rxn_ids))
+    return results
+
+
+def _init_worker(model):
+    global _worker_model
+    _worker_model = model
+
+
+def _simulate_chunk(task):
+    return _simulate_points(_worker_model, *task)
+
+
+class _ChemostatEvaluator:
+    """Simulates all chemostat points of several datasets for a given GAM, split over a pool."""
+
+    def __init__(self, model, datasets, processes):
+        self.model = model
+        self.rxn_ids = _fit_rxn_ids(model)
+        self.data = np.vstack(datasets)
+        self.pool = None
+        if processes is None:
+            processes = Configuration().processes
+        processes = max(1, min(processes, len(self.data)))
+        # Contiguous chunks of dilution rates, so consecutive solves differ little:
+        self.chunks = [list(chunk) for chunk in np.array_split(self.data[:, 0], processes)]
+        if processes > 1:
+            self.pool = Pool(processes, initializer=_init_worker, initargs=(model,))
+
+    def simulate(self, gam, ngam):
+        if self.pool is None:
+            return np.array(_simulate_points(self.model, self.rxn_ids, gam, ngam, self.chunks[0]))
+        tasks = [(self.rxn_ids, gam, ngam, chunk) for chunk in self.chunks]
+        results = self.pool.map(_simulate_chunk, tasks)
+        return np.array([row for chunk_rows in results for row in chunk_rows])
+
+    def error(self, gam, ngam):
+        """Gets the norm of the relative errors of all simulated values, as fitGAM.m."""
+        relative = (self.simulate(gam, ngam) - self.data) / self.data
+        error = math.sqrt(np.sum(relative ** 2))
+        return error if not math.isnan(error) else math.inf
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+
+def _minimize(function, bounds, tolerance):
+    """Bounded Brent search."""
+    result = minimize_scalar(function, bounds=bounds, method="bounded", options={"xatol": tolerance})
+    return result.x, result.fun
+
+
+def _check_bounds(value, bounds, tolerance, name):
+    """Raises an error if a fitted value is at the bounds of its search, as in fitGAM.m."""
+    if min(value - bounds[0], bounds[1] - value) <= 2 * tolerance:
+        raise ValueError(f"{name} found is sub-optimal: please expand {name} search bounds.")
+
+
+def fit_gam(model, datasets=None, bounds=(30, 70), ngam=None, tolerance=0.01, processes=None):
+    """Finds the GAM that best fits the exchange fluxes of chemostats, by a bounded Brent search on the
+    error of fitGAM.m (norm of the relative errors of growth, glucose, O2 and CO2).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model. It is left unchanged; apply the result with
+        `code.biomass.apply_delta(model, code.biomass.change_gam(model, gam))`.
+    datasets : list of numpy.ndarray, optional
+        Chemostat datasets fitted jointly, as returned by `load_vanhoek_data`. Defaults to VanHoek1998.
+    bounds : tuple of float, optional
+        Search interval of the GAM (mmol ATP/gDW).
+    ngam : float, optional
+        NGAM (mmol ATP/gDW/h) during the fit. Defaults to the NGAM of the model.
+    tolerance : float, optional
+        Absolute tolerance of the GAM.
+    processes : int, optional
+        Number of processes over which the chemostat points are split. Defaults to the COBRA
+        configuration.
+
+    Returns
+    -------
+    tuple of (float, float)
+        Fitted GAM, and its error.
+    """
+    if datasets is None:
+        datasets = [load_vanhoek_data()]
+    evaluator = _ChemostatEvaluator(model, datasets, processes)
+    try:
+        gam, error = _minimize(lambda gam: evaluator.error(gam, ngam), bounds, tolerance)
+    finally:
+        evaluator.close()
+    _check_bounds(gam, bounds, tolerance, "GAM")
+    return gam, error
+
+
+def fit_gam_ngam(model, datasets=None, gam_bounds=(30, 70), ngam_bounds=(0, 10), tolerance=0.01,
+                 processes=None):
+    """Finds the GAM and NGAM that best fit the chemostats, with a bounded Brent search on the NGAM
+    whose evaluations fit the GAM (see `fit_gam`).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model. It is left unchanged.
+    datasets : list of numpy.ndarray, optional
+        Chemostat datasets fitted jointly. Defaults to VanHoek1998.
+    gam_bounds : tuple of float, optional
+        Search interval of the GAM (mmol ATP/gDW).
+    ngam_bounds : tuple of float, optional
+        Search interval of the NGAM (mmol ATP/gDW/h).
+    tolerance : float, optional
+        Absolute tolerance of GAM and NGAM.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    tuple of (float, float, float)
+        Fitted GAM, fitted NGAM, and their error.
+    """
+    if datasets is None:
+        datasets = [load_vanhoek_data()]
+    evaluator = _ChemostatEvaluator(model, datasets, processes)
+    fitted_gams = {}
+
+    def ngam_error(ngam):
+        # the GAM of each NGAM probe may be at its bounds; only the fitted pair is checked:
+        fitted_gams[ngam], error = _minimize(lambda gam: evaluator.error(gam, ngam), gam_bounds, tolerance)
+        return error
+
+    try:
+        # NGAM may be at its bounds (e.g. 0 under anaerobic conditions):
+        ngam, error = _minimize(ngam_error, ngam_bounds, tolerance)
+    finally:
+        evaluator.close()
+    _check_bounds(fitted_gams[ngam], gam_bounds, tolerance, "GAM")
+    return fitted_gams[ngam], ngam, error
@@ -0,0 +1,119 @@
+"""
+Functions for evaluating gene-reaction rules (GPRs) of the yeast model without modifying the model.
+"""
+
+import re
+
+_TOKEN_PATTERN = re.compile(r"\(|\)|[^\s()]+")
+_OPERATOR_TOKENS = {"or": ("or", "|"), "and": ("and", "&")}
+
+
+def parse_gpr(rule):
+    """Parses a gene-reaction rule into a nested tuple tree.
+
+    Parameters
+    ----------
+    rule : str
+        Rule such as "(YDL174C and YEL039C) or YJR048W". Both "and"/"or" and "&"/"|" are accepted.
+
+    Returns
+    -------
+    tuple, str or None
+        ("or", child, ...) / ("and", child, ...) nodes with gene ids as leaves, or None if the rule is
+        empty.
+    """
+    tokens = _TOKEN_PATTERN.findall(rule or "")
+    if not tokens:
+        return None
+    position = 0
+
+    def parse_expression(operator):
+        # operator is "or" (lowest precedence) or "and"
+        nonlocal position
+        children = [parse_expression("and") if operator == "or" else parse_atom()]
+        while position < len(tokens) and tokens[position].lower() in _OPERATOR_TOKENS[operator]:
+            position += 1
+            children.append(parse_expression("and") if operator == "or" else parse_atom())
+        return children[0] if len(children) == 1 else (operator, *children)
+
+    def parse_atom():
+        nonlocal position
+        token = tokens[position]
+        position += 1
+        if token == "(":
+            node = parse_expression("or")
+            position += 1  # closing parenthesis
+            return node
+        return token
+
+    return parse_expression("or")
+
+
+def eval_gpr(tree, knockouts):
+    """Evaluates whether a parsed rule still holds when some genes are knocked out.
+
+    Parameters
+    ----------
+    tree : tuple, str or None
+        Rule parsed with `parse_gpr`.
+    knockouts : set of str
+        Ids of the knocked out genes.
+
+    Returns
+    -------
+    bool
+        True if the reaction is still catalysed (always True for reactions without a rule).
+    """
+    if tree is None:
+        return True
+    if isinstance(tree, str):
+        return tree not in knockouts
+    if tree[0] == "and":
+        return all(eval_gpr(child, knockouts) for child in tree[1:])
+    return any(eval_gpr(child, knockouts) for child in tree[1:])
+
+
+def gene_reaction_map(model):
+    """Gets the parsed rule of every reaction with genes, indexed by the genes in it.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to index.
+
+    Returns
+    -------
+    tuple of (dict, dict)
+        Reaction id -> parsed rule, and gene id -> list of reaction ids whose rule contains the gene.
+    """
+    rules = {}
+    gene_reactions = {}
+    for rxn in model.reactions:
+        tree = parse_gpr(rxn.gene_reaction_rule)
+        if tree is None:
+            continue
+        rules[rxn.id] = tree
+        for gene in rxn.genes:
+            gene_reactions.setdefault(gene.id, []).append(rxn.id)
+    return rules, gene_reactions
+
+
+def knockout_reactions(gene_ids, rules, gene_reactions):
+    """Finds the reactions that are inactivated by knocking out a set of genes.
+
+    Parameters
+    ----------
+    gene_ids : iterable of str
+        Ids of the knocked out genes.
+    rules, gene_reactions : dict
+        Output of `gene_reaction_map`.
+
+    Returns
+    -------
+    list of str
+        Ids of the inactivated reactions, in model order of first appearance.
+    """
+    knockouts = set(gene_ids)
+    candidates = dict.fromkeys(rxn_id for gene_id in knockouts
+                               for rxn_id in gene_reactions.get(gene_id, []))
+    return [rxn_id for rxn_id in candidates if not eval_gpr(rules[rxn_id], knockouts)]
@@ -2,31 +2,220 @@
 Functions for importing and exporting the yeast model using COBRA from anywhere in the repo.
 """
 
+import cobra
 import csv
-from cobra.io import read_sbml_model, write_sbml_model
-from copy import copy
+import os
+from cobra.io import read_sbml_model
 from dotenv import find_dotenv
 from os.path import dirname
+from .cache import SnapshotCache, file_hash, snapshot_key
 
 # find .env + define paths:
 dotenv_path = find_dotenv()
 REPO_PATH = dirname(dotenv_path)
 MODEL_PATH = f"{REPO_PATH}/model/yeast-GEM.xml"
+YML_PATH = f"{REPO_PATH}/model/yeast-GEM.yml"
+BIGG_MET_DICT_PATH = f"{REPO_PATH}/data/databases/BiGGmetDictionary_newIDs.csv"
+BIGG_RXN_DICT_PATH = f"{REPO_PATH}/data/databases/BiGGrxnDictionary_newIDs.csv"
 
-def read_yeast_model(make_bigg_compliant=False):
+# snapshot cache of parsed models (the shared location is read-only, e.g. prepared for pool workers):
+CACHE_PATH = os.environ.get("YEAST_GEM_CACHE", f"{REPO_PATH}/.cache")
+SHARED_CACHE_PATH = os.environ.get("YEAST_GEM_SHARED_CACHE")
+CACHE_MAX_SIZE = 1024**3  # bytes
+MODEL_CACHE = SnapshotCache(f"{CACHE_PATH}/models", max_size=CACHE_MAX_SIZE, shared_dir=SHARED_CACHE_PATH)
+ID_TABLE_CACHE = SnapshotCache(f"{CACHE_PATH}/bigg_ids", max_size=CACHE_MAX_SIZE, shared_dir=SHARED_CACHE_PATH)
+
+# compartment ids that differ in BiGG:
+COMP_DIC = {"er":"r", "erm":"rm", "p":"x"}
+
+def yeast_model_key(make_bigg_compliant=False):
+    """Gets the cache key of the yeast model, which changes whenever the SBML file changes (or, for the
+    BiGG compliant version, the BiGG dictionaries).
+
+    Parameters
+    ----------
+    make_bigg_compliant : bool, optional
+        Whether the key refers to the BiGG compliant version of the model.
+
+    Returns
+    -------
+    str
+    """
+    if make_bigg_compliant:
+        return snapshot_key(file_hash(MODEL_PATH), True, file_hash(BIGG_MET_DICT_PATH),
+                            file_hash(BIGG_RXN_DICT_PATH), cobra.__version__)
+    return snapshot_key(file_hash(MODEL_PATH), False, cobra.__version__)
+
+def read_yeast_model(make_bigg_compliant=False, use_cache=True):
     """Reads the SBML file of the yeast model using COBRA.
 
+    Parsed models are stored as snapshots keyed by the content of the SBML file, so that only the first
+    read after a model change pays for parsing the SBML.
+
     Parameters
     ----------
     make_bigg_compliant : bool, optional
         Whether the model should be initialized with BiGG compliance or not.
         If false, the original ids/names/compartments will be used instead.
+    use_cache : bool, optional
+        Whether to load the model from (and store it in) the snapshot cache.
 
     Returns
     -------
     cobra.core.Model
     """
 
+    if not use_cache:
+        return _parse_yeast_model(make_bigg_compliant)
+    key = yeast_model_key(make_bigg_compliant)
+    model = MODEL_CACHE.load(key)
+    if model is None:
+        model = _parse_yeast_model(make_bigg_compliant)
+        MODEL_CACHE.save(key, model)
+    return model
+
+def prepare_shared_cache(shared_path=SHARED_CACHE_PATH, bigg_options=(False, True)):
+    """Writes model snapshots to a shared location, e.g. before starting a pool of workers that point
+    YEAST_GEM_SHARED_CACHE to it.
+
+    Parameters
+    ----------
+    shared_path : str, optional
+        Directory for the snapshots. Defaults to YEAST_GEM_SHARED_CACHE.
+    bigg_options : tuple of bool, optional
+        Values of `make_bigg_compliant` for which to write a snapshot.
+    """
+    if not shared_path:
+        raise ValueError("No shared cache location given (set YEAST_GEM_SHARED_CACHE).")
+    shared_cache = SnapshotCache(shared_path)
+    for make_bigg_compliant in bigg_options:
+        key = yeast_model_key(make_bigg_compliant)
+        if shared_cache.load(key) is None:
+            shared_cache.save(key, read_yeast_model(make_bigg_compliant))
+
+def _load_bigg_dict(bigg_file_path):
+    """Loads a BiGG dictionary file (original id, BiGG id) as a dict."""
+    bigg_dict = {}
+    with open(bigg_file_path, encoding="utf-8", newline="") as bigg_file:
+        for row in csv.reader(bigg_file, delimiter=","):
+            if row:
+                bigg_dict[row[0]] = row[1]
+    return bigg_dict
+
+def _unique_id(base_id, taken_ids, current_id, suffix=""):
+    """Gets the first id of the form base_id[_copyN]suffix that is not already taken."""
+    new_id = f"{base_id}{suffix}"
+    copy_number = 1
+    while new_id != current_id and new_id in taken_ids:
+        new_id = f"{base_id}_copy{str(copy_number)}{suffix}"
+        copy_number += 1
+    return new_id
+
+def compute_bigg_id_table(model, met_bigg_dict, rxn_bigg_dict):
+    """Computes the old->new id table for making the yeast model BiGG compliant.
+
+    Ids are taken from the BiGG annotations or, if missing, from the BiGG dictionaries. Clashing ids get
+    a _copyN suffix, assigned in model order, exactly as if the elements were renamed one by one.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Yeast model with the original ids.
+    met_bigg_dict : dict
+        Original metabolite id -> BiGG id (without compartment).
+    rxn_bigg_dict : dict
+        Original reaction id -> BiGG id.
+
+    Returns
+    -------
+    dict
+        {"metabolites": {old_id: new_id}, "reactions": {old_id: new_id}}, only with the changed ids.
+    """
+    met_ids = {}
+    taken_ids = {met.id for met in model.metabolites}
+    for met in model.metabolites:
+        comp = COMP_DIC.get(met.compartment, met.compartment)
+        if "bigg.metabolite" in met.annotation:
+            new_id = _unique_id(met.annotation['bigg.metabolite'], taken_ids, met.id, f"_{comp}")
+        elif met.id in met_bigg_dict:
+            new_id = _unique_id(met_bigg_dict[met.id], taken_ids, met.id, f"_{comp}")
+        else:
+            new_id = met.id.replace(f"[{comp}]", f"_{comp}")
+        if new_id != met.id:
+            taken_ids.discard(met.id)
+            taken_ids.add(new_id)
+            met_ids[met.id] = new_id
+
+    rxn_ids = {}
+    taken_ids = {rxn.id for rxn in model.reactions}
+    for rxn in model.reactions:
+        if "bigg.reaction" in rxn.annotation:
+            new_id = _unique_id(rxn.annotation['bigg.reaction'], taken_ids, rxn.id)
+        elif rxn.id in rxn_bigg_dict:
+            new_id = _unique_id(rxn_bigg_dict[rxn.id], taken_ids, rxn.id)
+        else:
+            continue
+        taken_ids.discard(rxn.id)
+        taken_ids.add(new_id)
+        rxn_ids[rxn.id] = new_id
+
+    return {"metabolites": met_ids, "reactions": rxn_ids}
+
+def get_bigg_id_table(model=None):
+    """Gets the old->new BiGG id table of the yeast model, reusing the persisted table if the model
+    file and the BiGG dictionaries have not changed.
+
+    Parameters
+    ----------
+    model : cobra.core.Model, optional
+        Yeast model with the original ids. Only parsed from the SBML file if the table is not cached.
+
+    Returns
+    -------
+    dict
+        {"metabolites": {old_id: new_id}, "reactions": {old_id: new_id}}
+    """
+    key = snapshot_key(file_hash(MODEL_PATH), file_hash(BIGG_MET_DICT_PATH), file_hash(BIGG_RXN_DICT_PATH))
+    id_table = ID_TABLE_CACHE.load(key)
+    if id_table is None:
+        if model is None:
+            model = read_yeast_model(make_bigg_compliant=False)
+        id_table = compute_bigg_id_table(model, _load_bigg_dict(BIGG_MET_DICT_PATH),
+                                         _load_bigg_dict(BIGG_RXN_DICT_PATH))
+        ID_TABLE_CACHE.save(key, id_table)
+    return id_table
+
+def apply_id_table(model, id_table):
+    """Renames metabolites and reactions in a single pass, rebuilding the model indexes only once.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to rename in place.
+    id_table : dict
+        {"metabolites": {old_id: new_id}, "reactions": {old_id: new_id}}, with new ids that are unique.
+    """
+    met_ids = id_table["metabolites"]
+    for met in model.metabolites:
+        new_id = met_ids.get(met.id)
+        if new_id is not None and new_id != met.id:
+            model.constraints[met.id].name = new_id
+            met._id = new_id
+    rxn_ids = id_table["reactions"]
+    for rxn in model.reactions:
+        new_id = rxn_ids.get(rxn.id)
+        if new_id is not None and new_id != rxn.id:
+            forward_variable = rxn.forward_variable
+            reverse_variable = rxn.reverse_variable
+            rxn._id = new_id
+            forward_variable.name = rxn.id
+            reverse_variable.name = rxn.reverse_id
+    model.metabolites._generate_index()
+    model.reactions._generate_index()
+
+def _parse_yeast_model(make_bigg_compliant):
+    """Parses the SBML file of the yeast model, without using the snapshot cache."""
+
     # Load model:
     model = read_sbml_model(MODEL_PATH)
 
@@ -35,51 +224,18 @@ def read_yeast_model(make_bigg_compliant=False):
 
     # Convert to BiGG compliant if not already:
     if not is_bigg_compliant and make_bigg_compliant:
-        # Load met/rxn dictionaries:
-        def load_bigg_dict(bigg_file_path):
-            bigg_dict = {}
-            with open(bigg_file_path) as bigg_file:
-                bigg_reader = csv.reader(bigg_file, delimiter=',')
-                for row in bigg_reader:
-                    bigg_dict[row[0]] = row[1]
-            return bigg_dict
-        data_path = f"{REPO_PATH}/data/databases"
-        met_bigg_dict = load_bigg_dict(f"{data_path}/BiGGmetDictionary_newIDs.csv")
-        rxn_bigg_dict = load_bigg_dict(f"{data_path}/BiGGrxnDictionary_newIDs.csv")
-
-        # Function for adding unique ids to the model:
-        def add_new_id(model_element, new_id):
-            original_id = copy(new_id)
-            id_assigned = False
-            copy_number = 1
-            while not id_assigned:
-                try:
-                    if hasattr(model_element, "compartment"):  # metabolites
-                        model_element.id = f"{new_id}_{model_element.compartment}"
-                    else:  # reactions
-                        model_element.id = new_id
-                    id_assigned = True
-                except ValueError:
-                    new_id = f"{original_id}_copy{str(copy_number)}"
-                    copy_number += 1
+        # Compute (or reuse) the old->new id table before touching the model:
+        id_table = get_bigg_id_table(model)
 
         # Metabolite changes:
-        comp_dic = {"er":"r", "erm":"rm", "p":"x"}
         for met in model.metabolites:
             # Save original id in notes:
             met.notes["Original ID"] = met.id
             # Change name to not include compartment at the end:
             met.name = met.name.replace(f" [{model.compartments[met.compartment]}]", "")
             # Change compartment info:
-            if met.compartment in comp_dic:
-                met.compartment = comp_dic[met.compartment]
-            # Update id with BiGG information:
-            if "bigg.metabolite" in met.annotation:
-                add_new_id(met, met.annotation['bigg.metabolite'])
-            elif met.id in met_bigg_dict:
-                add_new_id(met, met_bigg_dict[met.id])
-            else:
-                met.id = met.id.replace(f"[{met.compartment}]", f"_{met.compartment}")
+            if met.compartment in COMP_DIC:
+                met.compartment = COMP_DIC[met.compartment]
 
         # Compartment changes:
         comps = model.compartments
@@ -90,22 +246,44 @@ def read_yeast_model(make_bigg_compliant=False):
 
         # Reaction changes:
         for rxn in model.reactions:
-            # Update id with BiGG information:
-            if "bigg.reaction" in rxn.annotation:
-                rxn.notes["Original ID"] = rxn.id
-                add_new_id(rxn, rxn.annotation['bigg.reaction'])
-            elif rxn.id in rxn_bigg_dict:
+            if rxn.id in id_table["reactions"]:
                 rxn.notes["Original ID"] = rxn.id
-                add_new_id(rxn, rxn_bigg_dict[rxn.id])
+
+        # Update ids with BiGG information:
+        apply_id_table(model, id_table)
 
     return model
 
-def write_yeast_model(model):
-    """Writes the SBML file of the yeast model using COBRA.
+def write_yeast_model(model, formats=("xml",), processes=None):
+    """Writes the yeast model in model/, by default only as SBML. Several formats are written in parallel,
+    and files whose content would not change are left untouched (see `code.export.export_model`).
 
     Parameters
     ----------
     model : cobra.core.Model
-        Yeast model to be written
+        Yeast model to be written. It cannot be BiGG compliant (write it with `code.export.export_model`
+        to other paths), and the .yml and .xlsx files need a model read by `code.raven_yaml.read_raven_yaml`,
+        as the SBML file lacks some of their fields.
+    formats : tuple of str, optional
+        Formats to write, among "xml", "yml", "txt" and "xlsx".
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    dict
+        Format -> "unchanged" or "written".
     """
-    write_sbml_model(model, MODEL_PATH)
+    # imported here, as code.export depends on the paths of this module:
+    from .export import BINARY_FORMATS, RAVEN_FORMATS, TEXT_FORMATS, export_model, has_raven_notes, \
+        yeast_model_paths
+    unknown = set(formats) - set(TEXT_FORMATS + BINARY_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown formats: {', '.join(sorted(unknown))}")
+    if "x" in model.compartments:
+        raise ValueError("The model is BiGG compliant: write it to other paths with code.export.export_model.")
+    raven_formats = [output_format for output_format in formats if output_format in RAVEN_FORMATS]
+    if raven_formats and not has_raven_notes(model):
+        raise ValueError(f"The model lacks the RAVEN fields of {', '.join(raven_formats)} in its notes: read it "
+                         "with code.raven_yaml.read_raven_yaml to write these formats.")
+    return export_model(model, yeast_model_paths(formats), processes)
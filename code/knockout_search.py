@@ -0,0 +1,177 @@
+"""
+Functions for searching combinations of reaction knockouts that maximize a product, with the candidate
+set pruned up front and the enumeration spread over a pool of processes.
+"""
+
+import heapq
+import math
+import pandas as pd
+from cobra import Configuration
+from multiprocessing import Pool
+from .fva import flux_variability
+from .knockout import BIOMASS_ID
+
+# search state of each worker process, set once by _init_worker:
+_worker_state = None
+
+
+def prune_candidates(model, candidate_ids=None, tolerance=1e-9, processes=None):
+    """Reduces a set of reaction knockout candidates without changing the search result.
+
+    A single FVA under the current constraints (e.g. the growth floor), cached by `code.fva`, is used to
+    drop reactions that can only carry zero flux (knocking them out changes nothing) and reactions whose
+    flux range excludes zero (knocking them out is infeasible). Reactions sharing a metabolite that no
+    other remaining reaction uses are fully coupled (their fluxes are proportional), so knocking out any
+    of them has the same effect; such groups are collapsed into a single candidate.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the objective and constraints of the search already set.
+    candidate_ids : list of str, optional
+        Reactions that may be knocked out. Defaults to all reactions that are not boundary reactions,
+        the growth reaction or part of the objective.
+    tolerance : float, optional
+        Flux values below this are considered zero.
+    processes : int, optional
+        Number of processes for the FVA. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    list of list of str
+        Groups of coupled reaction ids. Knocking out a candidate means blocking its whole group.
+    """
+    if candidate_ids is None:
+        objective_ids = {variable.name for variable in model.objective.variables}
+        candidate_ids = [rxn.id for rxn in model.reactions
+                         if not rxn.boundary and rxn.id != BIOMASS_ID and rxn.id not in objective_ids]
+    fva = flux_variability(model, fraction_of_optimum=0.0, processes=processes)
+    blocked = set(fva.index[(fva["minimum"].abs() < tolerance) & (fva["maximum"].abs() < tolerance)])
+    essential = set(fva.index[(fva["minimum"] > tolerance) | (fva["maximum"] < -tolerance)])
+
+    # Fully coupled reactions: a metabolite with only two active reactions couples their fluxes.
+    parent = {rxn.id: rxn.id for rxn in model.reactions if rxn.id not in blocked}
+
+    def find(rxn_id):
+        while parent[rxn_id] != rxn_id:
+            parent[rxn_id] = parent[parent[rxn_id]]
+            rxn_id = parent[rxn_id]
+        return rxn_id
+
+    for met in model.metabolites:
+        active = [rxn.id for rxn in met.reactions if rxn.id not in blocked]
+        if len(active) == 2:
+            parent[find(active[0])] = find(active[1])
+
+    groups = {}
+    for rxn_id in parent:
+        groups.setdefault(find(rxn_id), []).append(rxn_id)
+    candidates = {}
+    for rxn_id in candidate_ids:
+        if rxn_id in blocked or rxn_id in essential:
+            continue
+        group = groups[find(rxn_id)]
+        if any(member in essential for member in group):
+            continue
+        # Keep only the candidates of each group, but block the whole group when knocking it out:
+        candidates.setdefault(find(rxn_id), group)
+    return list(candidates.values())
+
+
+def _init_worker(model, groups, product_id, biomass_id, max_knockouts, top_n):
+    global _worker_state
+    _worker_state = (model, groups, product_id, biomass_id, max_knockouts, top_n)
+
+
+def _search_branch(first):
+    return _search(first, *_worker_state)
+
+
+def _search(first, model, groups, product_id, biomass_id, max_knockouts, top_n):
+    """Depth-first search over all combinations whose lowest candidate index is `first`.
+
+    Knockouts are nested model contexts, so each combination extends the bounds of its parent and is
+    solved once. If a combination is infeasible, none of its supersets is explored.
+    """
+    heap = []
+    counter = [0]
+    product_rxn = model.reactions.get_by_id(product_id)
+    biomass_rxn = model.reactions.get_by_id(biomass_id)
+
+    def extend(combination, start):
+        with model:
+            for rxn_id in groups[combination[-1]]:
+                model.reactions.get_by_id(rxn_id).bounds = (0, 0)
+            model.slim_optimize()
+            counter[0] += 1
+            if model.solver.status != "optimal":
+                return
+            production = product_rxn.flux
+            entry = (production, counter[0], combination, biomass_rxn.flux)
+            if len(heap) < top_n:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            if len(combination) < max_knockouts:
+                for index in range(start, len(groups)):
+                    extend(combination + (index,), index + 1)
+
+    extend((first,), first + 1)
+    return heap, counter[0]
+
+
+def knockout_search(model, product_id, groups, max_knockouts=3, top_n=10, biomass_id=BIOMASS_ID,
+                    processes=None):
+    """Finds the reaction knockout combinations with the highest product flux.
+
+    Every combination of up to `max_knockouts` candidate groups is solved once (FBA with the objective
+    set on the model, reading growth and product from the same solution). The enumeration is split by
+    the first candidate of each combination across a process pool, and each worker keeps a bounded
+    heap with its `top_n` best results.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the objective and constraints of the search already set (see
+        `code.knockout.set_production_objective`).
+    product_id : str
+        Id of the product reaction to report and rank by.
+    groups : list of list of str
+        Knockout candidates, as returned by `prune_candidates`.
+    max_knockouts : int, optional
+        Maximum number of candidates knocked out at once.
+    top_n : int, optional
+        Number of best combinations to return.
+    biomass_id : str, optional
+        Id of the growth reaction.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Best combinations sorted by production, with the columns "knockouts" (list of reaction ids),
+        "fitness", "biomass", "production" and "n_solved" (total number of LPs solved).
+    """
+    if processes is None:
+        processes = Configuration().processes
+    processes = max(1, min(processes, len(groups)))
+    state = (model, groups, product_id, biomass_id, max_knockouts, top_n)
+    if processes == 1:
+        branches = [_search(first, *state) for first in range(len(groups))]
+    else:
+        # Early indices have the largest subtrees, so they are handed out first:
+        with Pool(processes, initializer=_init_worker, initargs=state) as pool:
+            branches = list(pool.imap_unordered(_search_branch, range(len(groups)), chunksize=1))
+    best = heapq.nlargest(top_n, (entry for heap, _ in branches for entry in heap))
+    n_solved = sum(count for _, count in branches)
+    rows = [{"knockouts": [rxn_id for index in combination for rxn_id in groups[index]],
+             "fitness": production, "biomass": growth, "production": production,
+             "n_solved": n_solved}
+            for production, _, combination, growth in best]
+    return pd.DataFrame(rows, columns=["knockouts", "fitness", "biomass", "production", "n_solved"])
+
+
+def count_combinations(n_candidates, max_knockouts):
+    """Gets the number of combinations (LPs) of a search before infeasibility pruning."""
+    return sum(math.comb(n_candidates, k) for k in range(1, max_knockouts + 1))
@@ -0,0 +1,314 @@
+"""
+Structural diff between versions of the yeast model (SBML or RAVEN YAML files, or files in the git history):
+each reaction, metabolite and gene gets a content fingerprint, and two versions are compared with a hash join
+on ids and fingerprints.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from os.path import exists
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, REPO_PATH
+from .raven_yaml import iter_raven_yaml
+
+DIFF_VERSION = 1  # increase when the fingerprints change, to invalidate cached ones
+FINGERPRINT_CACHE = SnapshotCache(f"{CACHE_PATH}/fingerprints", max_size=CACHE_MAX_SIZE)
+GIT_MODEL_PATH = "model/yeast-GEM.yml"
+SECTIONS = ("metabolites", "reactions", "genes")
+# parts of each entity that are fingerprinted separately, to report what changed:
+ASPECTS = {
+    "metabolites": ("name", "compartment", "formula", "charge", "annotation"),
+    "reactions": ("name", "stoichiometry", "bounds", "gpr", "subsystem", "objective", "annotation"),
+    "genes": ("name", "annotation"),
+}
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _annotation(annotation):
+    return {key: sorted(str(value) for value in _as_list(values))
+            for key, values in annotation.items() if _as_list(values)}
+
+
+def _float(value):
+    return None if value is None else float(value)
+
+
+def _yml_aspects(section, entry):
+    """Gets the aspects of an entry of `code.raven_yaml.iter_raven_yaml`."""
+    annotation = _annotation(entry.get("annotation", {}))
+    if section == "metabolites":
+        return {"name": entry.get("name", ""), "compartment": entry.get("compartment"),
+                "formula": entry.get("formula") or "", "charge": _float(entry.get("charge")),
+                "annotation": annotation}
+    if section == "reactions":
+        if "eccodes" in entry:
+            annotation["ec-code"] = sorted(str(ec) for ec in _as_list(entry["eccodes"]))
+        return {"name": entry.get("name", ""),
+                "stoichiometry": sorted((met_id, float(coeff)) for met_id, coeff
+                                        in entry.get("metabolites", {}).items()),
+                "bounds": [_float(entry.get("lower_bound", -1000)), _float(entry.get("upper_bound", 1000))],
+                "gpr": entry.get("gene_reaction_rule", ""),
+                "subsystem": [str(subsystem) for subsystem in _as_list(entry.get("subsystem"))],
+                "objective": _float(entry.get("objective_coefficient", 0)),
+                "annotation": annotation}
+    return {"name": entry.get("name", ""), "annotation": annotation}
+
+
+def iter_yml_entities(file_path):
+    """Streams the (section, id, aspects) of all metabolites, reactions and genes of a RAVEN YAML file."""
+    for section, entry in iter_raven_yaml(file_path, sections=SECTIONS):
+        yield section, entry["id"], _yml_aspects(section, entry)
+
+
+def iter_sbml_entities(file_path):
+    """Gets the (section, id, aspects) of all metabolites, reactions and genes of an SBML file, in the
+    same form as `iter_yml_entities` (metabolite names without the compartment suffix)."""
+    from cobra.io import read_sbml_model
+    from .biomass import met_name
+    model = read_sbml_model(file_path)
+    compartment_names = model.compartments
+    for met in model.metabolites:
+        yield "metabolites", met.id, {
+            "name": met_name(met, compartment_names), "compartment": met.compartment,
+            "formula": met.formula or "", "charge": _float(met.charge), "annotation": _annotation(met.annotation)}
+    for rxn in model.reactions:
+        subsystems = [subsystem for subsystem in rxn.subsystem.split("; ") if subsystem] if rxn.subsystem else []
+        yield "reactions", rxn.id, {
+            "name": rxn.name or "",
+            "stoichiometry": sorted((met.id, float(coeff)) for met, coeff in rxn.metabolites.items()),
+            "bounds": [float(rxn.lower_bound), float(rxn.upper_bound)], "gpr": rxn.gene_reaction_rule,
+            "subsystem": subsystems, "objective": float(rxn.objective_coefficient),
+            "annotation": _annotation(rxn.annotation)}
+    for gene in model.genes:
+        yield "genes", gene.id, {"name": gene.name or "", "annotation": _annotation(gene.annotation)}
+
+
+def _digest(value):
+    return hashlib.blake2b(json.dumps(value, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fingerprint_entities(entities):
+    """Fingerprints entities.
+
+    Parameters
+    ----------
+    entities : iterable of tuple
+        (section, id, aspects), as yielded by `iter_yml_entities` or `iter_sbml_entities`.
+
+    Returns
+    -------
+    dict
+        Section -> {id: (fingerprint, {aspect: hash})}, where the fingerprint hashes all aspects (but not
+        the id, so that renamed entities can be matched).
+    """
+    table = {section: {} for section in SECTIONS}
+    for section, entity_id, aspects in entities:
+        hashes = {aspect: _digest(aspects[aspect]) for aspect in ASPECTS[section]}
+        table[section][entity_id] = (_digest([hashes[aspect] for aspect in ASPECTS[section]]), hashes)
+    return table
+
+
+def model_fingerprints(file_path, use_cache=True):
+    """Fingerprints a model file, reusing cached fingerprints of files with the same content.
+
+    Parameters
+    ----------
+    file_path : str
+        SBML file, or RAVEN YAML file (.yml/.yaml).
+    use_cache : bool, optional
+        Whether to read and write the fingerprint cache.
+
+    Returns
+    -------
+    dict
+        See `fingerprint_entities`.
+    """
+    is_yml = file_path.endswith((".yml", ".yaml"))
+    key = snapshot_key(file_hash(file_path), is_yml, DIFF_VERSION)
+    table = FINGERPRINT_CACHE.load(key) if use_cache else None
+    if table is None:
+        table = fingerprint_entities(iter_yml_entities(file_path) if is_yml else iter_sbml_entities(file_path))
+        if use_cache:
+            FINGERPRINT_CACHE.save(key, table)
+    return table
+
+
+def _git(*args):
+    return subprocess.run(["git", *args], cwd=REPO_PATH, check=True, capture_output=True).stdout
+
+
+def git_revision(version):
+    """Gets the git revision of a model version as in getEarlierModelVersion.m: a branch, a release
+    (e.g. "8.6.3" -> "refs/tags/v8.6.3") or a commit."""
+    parts = version.split(".")
+    if len(parts) == 3 and all(part.isdigit() for part in parts):
+        return f"refs/tags/v{version}"
+    return version
+
+
+def git_fingerprints(version, model_path=GIT_MODEL_PATH, use_cache=True):
+    """Fingerprints the YAML model of a version in the git history of the repository, without checking
+    it out. Fingerprints are cached by the git object id of the file.
+
+    Parameters
+    ----------
+    version : str
+        Branch, release (e.g. "8.6.3") or commit.
+    model_path : str, optional
+        Path of the YAML model in the repository.
+    use_cache : bool, optional
+        Whether to read and write the fingerprint cache.
+
+    Returns
+    -------
+    dict
+        See `fingerprint_entities`.
+    """
+    object_spec = f"{git_revision(version)}:{model_path}"
+    blob_id = _git("rev-parse", object_spec).decode().strip()
+    key = snapshot_key("git", blob_id, DIFF_VERSION)
+    table = FINGERPRINT_CACHE.load(key) if use_cache else None
+    if table is None:
+        file_descriptor, tmp_path = tempfile.mkstemp(suffix=".yml")
+        try:
+            with os.fdopen(file_descriptor, "wb") as tmp_file:
+                subprocess.run(["git", "cat-file", "-p", blob_id], cwd=REPO_PATH, check=True, stdout=tmp_file)
+            table = fingerprint_entities(iter_yml_entities(tmp_path))
+        finally:
+            os.remove(tmp_path)
+        if use_cache:
+            FINGERPRINT_CACHE.save(key, table)
+    return table
+
+
+def version_fingerprints(version, use_cache=True):
+    """Fingerprints a model file if `version` is an existing path, or a version in the git history
+    otherwise (see `git_fingerprints`)."""
+    if exists(version):
+        return model_fingerprints(version, use_cache)
+    return git_fingerprints(version, use_cache=use_cache)
+
+
+def iter_diff(old, new):
+    """Streams the changes between two fingerprinted versions.
+
+    Entities are joined by id; the unmatched ones are then joined by fingerprint, to detect renamed
+    entities. Changes in the fields that are not fingerprinted (e.g. deltaG or notes) are not reported.
+
+    Parameters
+    ----------
+    old, new : dict
+        Fingerprints of the versions, as returned by `model_fingerprints` or `git_fingerprints`.
+
+    Yields
+    ------
+    dict
+        Change with the keys "section", "change" ("added", "removed", "modified" or "renamed"), "id",
+        "old_id" (of renamed entities, else None) and "aspects" (list of the changed aspects).
+    """
+    for section in SECTIONS:
+        old_entities = old[section]
+        new_entities = new[section]
+        added = []
+        for entity_id, (fingerprint, hashes) in new_entities.items():
+            old_entity = old_entities.get(entity_id)
+            if old_entity is None:
+                added.append(entity_id)
+            elif old_entity[0] != fingerprint:
+                aspects = [aspect for aspect in ASPECTS[section] if old_entity[1][aspect] != hashes[aspect]]
+                yield {"section": section, "change": "modified", "id": entity_id, "old_id": None,
+                       "aspects": aspects}
+        removed_by_fingerprint = {}
+        for entity_id, (fingerprint, _) in old_entities.items():
+            if entity_id not in new_entities:
+                removed_by_fingerprint.setdefault(fingerprint, []).append(entity_id)
+        for entity_id in added:
+            candidates = removed_by_fingerprint.get(new_entities[entity_id][0])
+            if candidates:
+                yield {"section": section, "change": "renamed", "id": entity_id, "old_id": candidates.pop(0),
+                       "aspects": ["id"]}
+            else:
+                yield {"section": section, "change": "added", "id": entity_id, "old_id": None, "aspects": []}
+        for entity_ids in removed_by_fingerprint.values():
+            for entity_id in entity_ids:
+                yield {"section": section, "change": "removed", "id": entity_id, "old_id": None, "aspects": []}
+
+
+def diff_models(old_version, new_version, use_cache=True):
+    """Streams the changes between two model files or versions (see `version_fingerprints` and
+    `iter_diff`)."""
+    return iter_diff(version_fingerprints(old_version, use_cache), version_fingerprints(new_version, use_cache))
+
+
+def diff_chain(versions, use_cache=True):
+    """Streams the changes between each pair of consecutive versions, fingerprinting each version once.
+
+    Parameters
+    ----------
+    versions : iterable of str
+        Model files or versions in the git history, oldest first.
+    use_cache : bool, optional
+        Whether to read and write the fingerprint cache.
+
+    Yields
+    ------
+    tuple of (str, str, dict)
+        Old version, new version, and change (see `iter_diff`).
+    """
+    previous = None
+    previous_table = None
+    for version in versions:
+        table = version_fingerprints(version, use_cache)
+        if previous_table is not None:
+            for change in iter_diff(previous_table, table):
+                yield previous, version, change
+        previous, previous_table = version, table
+
+
+def write_diff_report(changes, report_file=sys.stdout):
+    """Writes changes one line at a time, as they are produced.
+
+    Parameters
+    ----------
+    changes : iterable of dict or tuple
+        Changes of `iter_diff`/`diff_models`, or (old version, new version, change) of `diff_chain`.
+    report_file : file, optional
+        Where to write the report.
+
+    Returns
+    -------
+    dict
+        Number of changes by (section, change).
+    """
+    counts = {}
+    header = None
+    for change in changes:
+        if isinstance(change, tuple):
+            old_version, new_version, change = change
+            if header != (old_version, new_version):
+                header = (old_version, new_version)
+                report_file.write(f"## {old_version} -> {new_version}\n")
+        counts[change["section"], change["change"]] = counts.get((change["section"], change["change"]), 0) + 1
+        line = f"{change['section']}\t{change['change']}\t{change['id']}"
+        if change["old_id"]:
+            line += f"\t(was {change['old_id']})"
+        elif change["change"] == "modified":
+            line += f"\t({', '.join(change['aspects'])})"
+        report_file.write(line + "\n")
+    return counts
+
+
+if __name__ == "__main__":
+    # e.g. python -m code.model_diff 9.0.0 9.0.1 main model/yeast-GEM.yml
+    if len(sys.argv) < 3:
+        sys.exit("usage: python -m code.model_diff OLD NEW [NEWER ...] (model files or git versions)")
+    write_diff_report(diff_chain(sys.argv[1:]))
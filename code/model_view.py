@@ -0,0 +1,582 @@
+"""
+Read-only, array-backed view of a model for query-only workloads (searches, reports): built directly from
+the SBML or RAVEN YAML file, without COBRA objects or a solver interface, and cached per model file.
+"""
+
+import math
+import re
+from array import array
+from collections.abc import Sequence
+from xml.etree.ElementTree import iterparse
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, MODEL_PATH
+from .raven_yaml import _as_list, iter_raven_yaml
+
+VIEW_VERSION = 1  # increase when the view layout changes, to invalidate cached views
+VIEW_CACHE = SnapshotCache(f"{CACHE_PATH}/views", max_size=CACHE_MAX_SIZE)
+YML_FIELDS = ("name", "compartment", "formula", "charge", "annotation", "metabolites", "lower_bound",
+              "upper_bound", "objective_coefficient", "gene_reaction_rule", "eccodes", "subsystem")
+
+# same decoding of SBML ids as COBRA (e.g. "M_s_0001__91__c__93__" -> "s_0001[c]"):
+_SBML_ESCAPE = re.compile(r"__(\d+)__")
+_IDENTIFIERS_URL = re.compile(r"^https?://identifiers.org/(.+?)[:/](.+)")
+_GPR_TOKEN = re.compile(r"[^\s()]+")
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _attributes(elem):
+    return {_local(key): value for key, value in elem.attrib.items()}
+
+
+def _sbml_id(sid, prefix):
+    if sid.startswith(prefix):
+        sid = sid[len(prefix):]
+    return _SBML_ESCAPE.sub(lambda match: chr(int(match.group(1))), sid)
+
+
+def _sbml_annotation(elem, attributes):
+    """Gets the annotation of an SBML element as COBRA does (identifiers.org resources by provider, a
+    single identifier as a string, and the SBO term)."""
+    annotation = {}
+    for child in elem:
+        if _local(child.tag) != "annotation":
+            continue
+        for item in child.iter():
+            if _local(item.tag) != "li":
+                continue
+            match = _IDENTIFIERS_URL.match(_attributes(item).get("resource", ""))
+            if match:
+                annotation.setdefault(match.group(1), []).append(match.group(2))
+    annotation = {provider: ids[0] if len(ids) == 1 else ids for provider, ids in annotation.items()}
+    if "sboTerm" in attributes:
+        annotation["sbo"] = attributes["sboTerm"]
+    return annotation
+
+
+def _sbml_gpr(elem, level=0):
+    """Gets the rule of a fbc:geneProductAssociation child, in the format of COBRA (nested operations in
+    parentheses)."""
+    tag = _local(elem.tag)
+    if tag == "geneProductRef":
+        return _sbml_id(_attributes(elem)["geneProduct"], "G_")
+    if tag in ("and", "or"):
+        rule = f" {tag} ".join(_sbml_gpr(child, level + 1) for child in elem)
+        return f"({rule})" if level else rule
+    return next((_sbml_gpr(child, level) for child in elem), "")
+
+
+def _format_coefficient(coeff):
+    # as COBRA's build_reaction_string:
+    return "" if coeff == 1 else str(coeff).rstrip(".") + " "
+
+
+class _Record:
+    """Element of a `ModelView`, reading its fields from the columns of the view."""
+
+    __slots__ = ("_view", "_index")
+
+    def __init__(self, view, index):
+        self._view = view
+        self._index = index
+
+    @property
+    def index(self):
+        """Position of the element in the model (row/column of the adjacency arrays)."""
+        return self._index
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._view is self._view and other._index == self._index
+
+    def __hash__(self):
+        return hash((type(self), self._index))
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.id}>"
+
+
+class MetaboliteRecord(_Record):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self._view.met_ids[self._index]
+
+    @property
+    def name(self):
+        return self._view.met_names[self._index]
+
+    @property
+    def formula(self):
+        return self._view.met_formulas[self._index]
+
+    @property
+    def compartment(self):
+        return self._view.met_compartments[self._index]
+
+    @property
+    def charge(self):
+        charge = self._view.met_charges[self._index]
+        if math.isnan(charge):
+            return None
+        return int(charge) if charge.is_integer() else charge
+
+    @property
+    def annotation(self):
+        return self._view.met_annotations[self._index] or {}
+
+    @property
+    def reactions(self):
+        view = self._view
+        start, end = view.met_indptr[self._index], view.met_indptr[self._index + 1]
+        return tuple(ReactionRecord(view, j) for j in view.met_rxn_indices[start:end])
+
+
+class ReactionRecord(_Record):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self._view.rxn_ids[self._index]
+
+    @property
+    def name(self):
+        return self._view.rxn_names[self._index]
+
+    @property
+    def subsystem(self):
+        return self._view.rxn_subsystems[self._index]
+
+    @property
+    def lower_bound(self):
+        return self._view.lower_bounds[self._index]
+
+    @property
+    def upper_bound(self):
+        return self._view.upper_bounds[self._index]
+
+    @property
+    def bounds(self):
+        return self.lower_bound, self.upper_bound
+
+    @property
+    def reversibility(self):
+        return self.lower_bound < 0 < self.upper_bound
+
+    @property
+    def objective_coefficient(self):
+        return self._view.objective[self._index]
+
+    @property
+    def gene_reaction_rule(self):
+        return self._view.rxn_gprs[self._index]
+
+    @property
+    def annotation(self):
+        return self._view.rxn_annotations[self._index] or {}
+
+    def _stoichiometry(self):
+        view = self._view
+        start, end = view.rxn_indptr[self._index], view.rxn_indptr[self._index + 1]
+        return zip(view.rxn_met_indices[start:end], view.rxn_coeffs[start:end])
+
+    @property
+    def metabolites(self):
+        """Metabolite -> coefficient, as `cobra.Reaction.metabolites`."""
+        return {MetaboliteRecord(self._view, i): coeff for i, coeff in self._stoichiometry()}
+
+    @property
+    def reactants(self):
+        return [MetaboliteRecord(self._view, i) for i, coeff in self._stoichiometry() if coeff < 0]
+
+    @property
+    def products(self):
+        return [MetaboliteRecord(self._view, i) for i, coeff in self._stoichiometry() if coeff > 0]
+
+    @property
+    def genes(self):
+        view = self._view
+        start, end = view.rxn_gene_indptr[self._index], view.rxn_gene_indptr[self._index + 1]
+        return tuple(GeneRecord(view, k) for k in view.rxn_gene_indices[start:end])
+
+    def build_reaction_string(self, use_metabolite_names=False):
+        """Renders the equation in the format of `cobra.Reaction.build_reaction_string`."""
+        view = self._view
+        labels = view.met_names if use_metabolite_names else view.met_ids
+        reactants, products = [], []
+        for i, coeff in sorted(self._stoichiometry(), key=lambda item: view.met_ids[item[0]]):
+            if coeff >= 0:
+                products.append(_format_coefficient(coeff) + labels[i])
+            else:
+                reactants.append(_format_coefficient(abs(coeff)) + labels[i])
+        if self.reversibility:
+            arrow = " <=> "
+        elif self.lower_bound < 0 and self.upper_bound <= 0:
+            arrow = " <-- "
+        else:
+            arrow = " --> "
+        return " + ".join(reactants) + arrow + " + ".join(products)
+
+    @property
+    def reaction(self):
+        """Equation with metabolite ids, rendered on access."""
+        return self.build_reaction_string()
+
+
+class GeneRecord(_Record):
+    __slots__ = ()
+
+    @property
+    def id(self):
+        return self._view.gene_ids[self._index]
+
+    @property
+    def name(self):
+        return self._view.gene_names[self._index]
+
+    @property
+    def annotation(self):
+        return self._view.gene_annotations[self._index] or {}
+
+    @property
+    def reactions(self):
+        view = self._view
+        start, end = view.gene_indptr[self._index], view.gene_indptr[self._index + 1]
+        return tuple(ReactionRecord(view, j) for j in view.gene_rxn_indices[start:end])
+
+
+class RecordList(Sequence):
+    """Records of one kind of element, accessible by position or by id (as a cobra DictList)."""
+
+    __slots__ = ("_view", "_record", "_ids", "_positions")
+
+    def __init__(self, view, record, ids, positions):
+        self._view = view
+        self._record = record
+        self._ids = ids
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._record(self._view, self._positions[key])
+        if isinstance(key, slice):
+            return [self._record(self._view, i) for i in range(len(self._ids))[key]]
+        return self._record(self._view, range(len(self._ids))[key])
+
+    def __iter__(self):
+        view, record = self._view, self._record
+        return (record(view, i) for i in range(len(self._ids)))
+
+    def __contains__(self, item):
+        if isinstance(item, str):
+            return item in self._positions
+        return isinstance(item, self._record) and item._view is self._view
+
+    def get_by_id(self, element_id):
+        return self[element_id]
+
+    def get(self, element_id, default=None):
+        position = self._positions.get(element_id)
+        return default if position is None else self._record(self._view, position)
+
+    def ids(self):
+        return list(self._ids)
+
+
+class ModelView:
+    """Read-only view of the metabolites, reactions and genes of a model.
+
+    Fields are stored by column (lists of strings and `array.array` of numbers), and the elements are
+    accessed through `metabolites`, `reactions` and `genes`, which behave as the cobra DictLists for
+    reading (e.g. `view.reactions["r_0001"].reaction`). Records are created on access and reaction
+    equations are only rendered when requested. The view is built with `from_sbml`, `from_yaml` or
+    `from_model`, or loaded from the cache with `read_model_view`.
+
+    Adjacency arrays (CSR-like: the items of element `i` are `indices[indptr[i]:indptr[i + 1]]`):
+
+    - `rxn_indptr`, `rxn_met_indices`, `rxn_coeffs`: stoichiometry of each reaction.
+    - `met_indptr`, `met_rxn_indices`: reactions of each metabolite.
+    - `rxn_gene_indptr`, `rxn_gene_indices`: genes of each reaction, in order of the rule.
+    - `gene_indptr`, `gene_rxn_indices`: reactions of each gene.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.name = None
+        self.notes = {}
+        self.compartments = {}
+        self.met_ids, self.met_names, self.met_formulas, self.met_compartments = [], [], [], []
+        self.met_charges = array("d")
+        self.met_annotations = []
+        self.rxn_ids, self.rxn_names, self.rxn_subsystems, self.rxn_gprs = [], [], [], []
+        self.lower_bounds, self.upper_bounds, self.objective = array("d"), array("d"), array("d")
+        self.rxn_annotations = []
+        self.rxn_indptr, self.rxn_met_indices, self.rxn_coeffs = array("i", [0]), array("i"), array("d")
+        self.gene_ids, self.gene_names, self.gene_annotations = [], [], []
+        self.met_index, self.rxn_index, self.gene_index = {}, {}, {}
+
+    @property
+    def metabolites(self):
+        return RecordList(self, MetaboliteRecord, self.met_ids, self.met_index)
+
+    @property
+    def reactions(self):
+        return RecordList(self, ReactionRecord, self.rxn_ids, self.rxn_index)
+
+    @property
+    def genes(self):
+        return RecordList(self, GeneRecord, self.gene_ids, self.gene_index)
+
+    def __repr__(self):
+        return (f"<ModelView {self.id}: {len(self.met_ids)} metabolites, {len(self.rxn_ids)} reactions, "
+                f"{len(self.gene_ids)} genes>")
+
+    def _add_metabolite(self, met_id, name, compartment, formula, charge, annotation):
+        self.met_index[met_id] = len(self.met_ids)
+        self.met_ids.append(met_id)
+        self.met_names.append(name or "")
+        self.met_compartments.append(compartment)
+        self.met_formulas.append(formula)
+        self.met_charges.append(math.nan if charge is None else float(charge))
+        self.met_annotations.append(annotation or None)
+
+    def _add_reaction(self, rxn_id, name, stoichiometry, lower_bound, upper_bound, gpr, subsystem,
+                      annotation, objective=0):
+        self.rxn_index[rxn_id] = len(self.rxn_ids)
+        self.rxn_ids.append(rxn_id)
+        self.rxn_names.append(name or "")
+        for met_id, coeff in stoichiometry:
+            self.rxn_met_indices.append(self.met_index[met_id])
+            self.rxn_coeffs.append(coeff)
+        self.rxn_indptr.append(len(self.rxn_met_indices))
+        self.lower_bounds.append(lower_bound)
+        self.upper_bounds.append(upper_bound)
+        self.rxn_gprs.append(gpr or "")
+        self.rxn_subsystems.append(subsystem or "")
+        self.rxn_annotations.append(annotation or None)
+        self.objective.append(objective)
+
+    def _add_gene(self, gene_id, name, annotation):
+        self.gene_index[gene_id] = len(self.gene_ids)
+        self.gene_ids.append(gene_id)
+        self.gene_names.append(name or "")
+        self.gene_annotations.append(annotation or None)
+
+    def _finish(self):
+        """Builds the reverse adjacency arrays, once all elements are added."""
+        met_reactions = [[] for _ in self.met_ids]
+        for j in range(len(self.rxn_ids)):
+            for i in self.rxn_met_indices[self.rxn_indptr[j]:self.rxn_indptr[j + 1]]:
+                met_reactions[i].append(j)
+        self.met_indptr, self.met_rxn_indices = _csr(met_reactions)
+        rxn_genes = []
+        for gpr in self.rxn_gprs:
+            genes = []
+            for token in _GPR_TOKEN.findall(gpr):
+                if token in ("and", "or"):
+                    continue
+                if token not in self.gene_index:
+                    # gene only in a rule, as COBRA creates it:
+                    self._add_gene(token, token, None)
+                if self.gene_index[token] not in genes:
+                    genes.append(self.gene_index[token])
+            rxn_genes.append(genes)
+        self.rxn_gene_indptr, self.rxn_gene_indices = _csr(rxn_genes)
+        gene_reactions = [[] for _ in self.gene_ids]
+        for j, genes in enumerate(rxn_genes):
+            for k in genes:
+                gene_reactions[k].append(j)
+        self.gene_indptr, self.gene_rxn_indices = _csr(gene_reactions)
+        return self
+
+    @classmethod
+    def from_yaml(cls, file_path):
+        """Builds the view of a RAVEN-format YAML file, streaming it (see `code.raven_yaml`). Metabolite
+        names are those of the file, i.e. without the compartment suffix of the SBML names.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the YAML file.
+
+        Returns
+        -------
+        ModelView
+        """
+        view = cls()
+        default_bounds = (-1000.0, 1000.0)
+        for section, entry in iter_raven_yaml(file_path, fields=YML_FIELDS):
+            if section == "metaData":
+                view.id = entry.pop("id", None)
+                view.name = entry.pop("name", None)
+                view.notes = entry
+                default_bounds = (float(entry.get("defaultLB", -1000)), float(entry.get("defaultUB", 1000)))
+            elif section == "metabolites":
+                view._add_metabolite(entry["id"], entry.get("name"), entry.get("compartment"),
+                                     entry.get("formula"), entry.get("charge"), entry.get("annotation"))
+            elif section == "reactions":
+                annotation = entry.get("annotation", {})
+                if "eccodes" in entry:
+                    annotation["ec-code"] = entry["eccodes"]
+                view._add_reaction(entry["id"], entry.get("name"), entry.get("metabolites", {}).items(),
+                                   float(entry.get("lower_bound", default_bounds[0])),
+                                   float(entry.get("upper_bound", default_bounds[1])),
+                                   entry.get("gene_reaction_rule"), "; ".join(_as_list(entry.get("subsystem"))),
+                                   annotation, float(entry.get("objective_coefficient", 0)))
+            elif section == "genes":
+                view._add_gene(entry["id"], entry.get("name"), entry.get("annotation"))
+            elif section == "compartments":
+                view.compartments = entry
+        return view._finish()
+
+    @classmethod
+    def from_sbml(cls, file_path=MODEL_PATH):
+        """Builds the view of an SBML file (level 3 with the fbc and groups packages), streaming it.
+
+        Ids, names, bounds, rules and annotations are read as `cobra.io.read_sbml_model` does; the
+        subsystems are the names of the groups of each reaction, joined by "; ".
+
+        Parameters
+        ----------
+        file_path : str, optional
+            Path of the SBML file.
+
+        Returns
+        -------
+        ModelView
+        """
+        view = cls()
+        parameters = {}
+        objective = {}
+        subsystems = {}
+        met_ids = set()
+        boundary_species = set()
+        for event, elem in iterparse(file_path, events=("start", "end")):
+            tag = _local(elem.tag)
+            if event == "start":
+                if tag == "model":
+                    attributes = _attributes(elem)
+                    view.id, view.name = attributes.get("id"), attributes.get("name")
+                continue
+            if tag == "compartment":
+                attributes = _attributes(elem)
+                view.compartments[attributes["id"]] = attributes.get("name", "")
+            elif tag == "parameter":
+                attributes = _attributes(elem)
+                parameters[attributes["id"]] = float(attributes["value"])
+            elif tag == "species":
+                attributes = _attributes(elem)
+                met_id = _sbml_id(attributes["id"], "M_")
+                if attributes.get("boundaryCondition") == "true":
+                    boundary_species.add(met_id)
+                met_ids.add(met_id)
+                view._add_metabolite(met_id, attributes.get("name"), attributes.get("compartment"),
+                                     attributes.get("chemicalFormula"), attributes.get("charge"),
+                                     _sbml_annotation(elem, attributes))
+            elif tag == "reaction":
+                attributes = _attributes(elem)
+                stoichiometry = {}
+                gpr = ""
+                for child in elem:
+                    child_tag = _local(child.tag)
+                    if child_tag in ("listOfReactants", "listOfProducts"):
+                        sign = -1 if child_tag == "listOfReactants" else 1
+                        for reference in child:
+                            reference_attributes = _attributes(reference)
+                            met_id = _sbml_id(reference_attributes["species"], "M_")
+                            if met_id not in boundary_species:
+                                stoichiometry[met_id] = (stoichiometry.get(met_id, 0)
+                                                         + sign * float(reference_attributes.get("stoichiometry", 1)))
+                    elif child_tag == "geneProductAssociation":
+                        gpr = _sbml_gpr(child)
+                view._add_reaction(_sbml_id(attributes["id"], "R_"), attributes.get("name"), stoichiometry.items(),
+                                   parameters.get(attributes.get("lowerFluxBound"), -1000.0),
+                                   parameters.get(attributes.get("upperFluxBound"), 1000.0), gpr, "",
+                                   _sbml_annotation(elem, attributes))
+            elif tag == "geneProduct":
+                attributes = _attributes(elem)
+                gene_id = _sbml_id(attributes["id"], "G_")
+                view._add_gene(gene_id, attributes.get("name", gene_id), _sbml_annotation(elem, attributes))
+            elif tag == "fluxObjective":
+                attributes = _attributes(elem)
+                objective[_sbml_id(attributes["reaction"], "R_")] = float(attributes.get("coefficient", 0))
+            elif tag == "member":
+                continue  # read with its group
+            elif tag == "group":
+                name = _attributes(elem).get("name", "")
+                for members in elem:
+                    for member in members:
+                        member_id = _sbml_id(_attributes(member).get("idRef", ""), "R_")
+                        subsystems.setdefault(member_id, []).append(name)
+            else:
+                continue
+            elem.clear()
+        for rxn_id, coefficient in objective.items():
+            view.objective[view.rxn_index[rxn_id]] = coefficient
+        for rxn_id, names in subsystems.items():
+            if rxn_id in view.rxn_index:
+                view.rxn_subsystems[view.rxn_index[rxn_id]] = "; ".join(names)
+        return view._finish()
+
+    @classmethod
+    def from_model(cls, model):
+        """Builds the view of a COBRA model.
+
+        Parameters
+        ----------
+        model : cobra.core.Model
+
+        Returns
+        -------
+        ModelView
+        """
+        view = cls()
+        view.id, view.name, view.notes = model.id, model.name, dict(model.notes)
+        view.compartments = dict(model.compartments)
+        for met in model.metabolites:
+            view._add_metabolite(met.id, met.name, met.compartment, met.formula, met.charge, dict(met.annotation))
+        for gene in model.genes:
+            view._add_gene(gene.id, gene.name, dict(gene.annotation))
+        for rxn in model.reactions:
+            view._add_reaction(rxn.id, rxn.name, [(met.id, coeff) for met, coeff in rxn.metabolites.items()],
+                               rxn.lower_bound, rxn.upper_bound, rxn.gene_reaction_rule, rxn.subsystem,
+                               dict(rxn.annotation), rxn.objective_coefficient)
+        return view._finish()
+
+
+def _csr(rows):
+    indptr = array("i", [0])
+    indices = array("i")
+    for row in rows:
+        indices.extend(row)
+        indptr.append(len(indices))
+    return indptr, indices
+
+
+def read_model_view(file_path=MODEL_PATH, use_cache=True):
+    """Reads the view of a model file, reusing the cached view of a file with the same content.
+
+    Parameters
+    ----------
+    file_path : str, optional
+        SBML file, or RAVEN YAML file (.yml/.yaml). Defaults to the SBML file of the yeast model.
+    use_cache : bool, optional
+        Whether to read and write the view cache.
+
+    Returns
+    -------
+    ModelView
+    """
+    is_yml = file_path.endswith((".yml", ".yaml"))
+    key = snapshot_key(file_hash(file_path), is_yml, VIEW_VERSION)
+    view = VIEW_CACHE.load(key) if use_cache else None
+    if view is None:
+        view = ModelView.from_yaml(file_path) if is_yml else ModelView.from_sbml(file_path)
+        if use_cache:
+            VIEW_CACHE.save(key, view)
+    return view
@@ -0,0 +1,248 @@
+"""
+Functions for OptKnock strain design (Burgard et al. 2003) on the yeast model: the bilevel problem
+(maximize a product, while the cell maximizes growth) is reformulated as a single MILP through the dual
+of the inner growth problem.
+"""
+
+import math
+import pandas as pd
+from optlang.exceptions import SolverError
+from optlang.symbolics import Zero
+from .knockout import BIOMASS_ID
+from .knockout_search import prune_candidates
+
+
+def _add_optknock_problem(model, target_id, groups, biomass_id, min_growth, max_knockouts, big_m):
+    """Adds the OptKnock variables and constraints to the solver of `model` (inside a model context).
+
+    Inner problem: max v_biomass s.t. S v = 0 and lb_j y_j <= v_j <= ub_j y_j for every reaction j of
+    a knocked out candidate group (y = 0), plain bounds otherwise. It is replaced by primal feasibility,
+    dual feasibility (S^T lambda + a - b = c, with a/b the duals of the upper/lower bounds) and strong
+    duality (c^T v = ub^T a - lb^T b). The products y_j * a_j and y_j * b_j are linearized with `big_m`.
+
+    Returns
+    -------
+    list of optlang.interface.Variable
+        Binary variable of each candidate group (1 = active, 0 = knocked out).
+    """
+    interface = model.problem
+    group_of = {rxn_id: index for index, group in enumerate(groups) for rxn_id in group}
+    to_add = []
+
+    # Knockout variables and knockout limit:
+    y_vars = [interface.Variable(f"optknock_y_{index}", type="binary") for index in range(len(groups))]
+    to_add += y_vars
+
+    # Dual variables:
+    met_duals = {met.id: interface.Variable(f"optknock_lambda_{met.id}", lb=None, ub=None)
+                 for met in model.metabolites}
+    to_add += list(met_duals.values())
+    ub_duals = {}
+    lb_duals = {}
+    for rxn in model.reactions:
+        is_candidate = rxn.id in group_of
+        if rxn.upper_bound != float("inf"):
+            ub_duals[rxn.id] = interface.Variable(f"optknock_a_{rxn.id}", lb=0,
+                                                  ub=big_m if is_candidate else None)
+        if rxn.lower_bound != -float("inf"):
+            lb_duals[rxn.id] = interface.Variable(f"optknock_b_{rxn.id}", lb=0,
+                                                  ub=big_m if is_candidate else None)
+    to_add += list(ub_duals.values()) + list(lb_duals.values())
+
+    constraints = []
+    coefficients = {}  # constraint -> linear coefficients, set after adding to the solver
+    duality_coefficients = {model.reactions.get_by_id(biomass_id).forward_variable: 1,
+                            model.reactions.get_by_id(biomass_id).reverse_variable: -1}
+    for rxn in model.reactions:
+        # Dual feasibility:
+        c_j = 1 if rxn.id == biomass_id else 0
+        dual_constraint = interface.Constraint(Zero, lb=c_j, ub=c_j, name=f"optknock_dual_{rxn.id}")
+        dual_coefficients = {met_duals[met.id]: coeff for met, coeff in rxn.metabolites.items()}
+        if rxn.id in ub_duals:
+            dual_coefficients[ub_duals[rxn.id]] = 1
+        if rxn.id in lb_duals:
+            dual_coefficients[lb_duals[rxn.id]] = -1
+        constraints.append(dual_constraint)
+        coefficients[dual_constraint] = dual_coefficients
+
+        if rxn.id not in group_of:
+            # Strong duality terms of the plain bounds:
+            if rxn.id in ub_duals:
+                duality_coefficients[ub_duals[rxn.id]] = -rxn.upper_bound
+            if rxn.id in lb_duals:
+                duality_coefficients[lb_duals[rxn.id]] = rxn.lower_bound
+            continue
+
+        # Primal bounds switched by the knockout variable:
+        y_var = y_vars[group_of[rxn.id]]
+        upper = interface.Constraint(Zero, ub=0, name=f"optknock_ub_{rxn.id}")
+        lower = interface.Constraint(Zero, lb=0, name=f"optknock_lb_{rxn.id}")
+        constraints += [upper, lower]
+        coefficients[upper] = {rxn.forward_variable: 1, rxn.reverse_variable: -1,
+                               y_var: -rxn.upper_bound}
+        coefficients[lower] = {rxn.forward_variable: 1, rxn.reverse_variable: -1,
+                               y_var: -rxn.lower_bound}
+
+        # Strong duality terms of the switched bounds, z = y * dual:
+        for dual_vars, bound, sign in ((ub_duals, rxn.upper_bound, -1), (lb_duals, rxn.lower_bound, 1)):
+            if rxn.id not in dual_vars:
+                continue
+            dual_var = dual_vars[rxn.id]
+            z_var = interface.Variable(f"optknock_z_{dual_var.name}", lb=0, ub=big_m)
+            to_add.append(z_var)
+            duality_coefficients[z_var] = sign * bound
+            z_upper_y = interface.Constraint(Zero, ub=0, name=f"optknock_zy_{dual_var.name}")
+            z_upper_dual = interface.Constraint(Zero, ub=0, name=f"optknock_zd_{dual_var.name}")
+            z_lower = interface.Constraint(Zero, lb=-big_m, name=f"optknock_zl_{dual_var.name}")
+            constraints += [z_upper_y, z_upper_dual, z_lower]
+            coefficients[z_upper_y] = {z_var: 1, y_var: -big_m}  # z <= M y
+            coefficients[z_upper_dual] = {z_var: 1, dual_var: -1}  # z <= dual
+            coefficients[z_lower] = {z_var: 1, dual_var: -1, y_var: -big_m}  # z >= dual - M (1 - y)
+
+    strong_duality = interface.Constraint(Zero, lb=0, ub=0, name="optknock_strong_duality")
+    constraints.append(strong_duality)
+    coefficients[strong_duality] = duality_coefficients
+
+    # Outer constraints:
+    knockout_limit = interface.Constraint(Zero, lb=len(groups) - max_knockouts,
+                                          name="optknock_max_knockouts")
+    constraints.append(knockout_limit)
+    coefficients[knockout_limit] = {y_var: 1 for y_var in y_vars}
+    growth_floor = interface.Constraint(Zero, lb=min_growth, name="optknock_min_growth")
+    constraints.append(growth_floor)
+    coefficients[growth_floor] = {model.reactions.get_by_id(biomass_id).forward_variable: 1,
+                                  model.reactions.get_by_id(biomass_id).reverse_variable: -1}
+
+    model.add_cons_vars(to_add + constraints)
+    model.solver.update()
+    for constraint, constraint_coefficients in coefficients.items():
+        constraint.set_linear_coefficients(constraint_coefficients)
+    model.objective = target_id
+    return y_vars
+
+
+def _incumbent(model, y_vars, biomass_rxn, target_rxn, min_growth, max_knockouts):
+    """Reads the design of the last MILP solution, which may be an incumbent kept at a time limit.
+
+    Returns
+    -------
+    tuple of (list of int, float, float)
+        Indices of the knocked out groups, production and growth, or None if the solver holds no feasible
+        solution.
+    """
+    try:
+        y_values = [y_var.primal for y_var in y_vars]
+        production = target_rxn.forward_variable.primal - target_rxn.reverse_variable.primal
+        growth = biomass_rxn.forward_variable.primal - biomass_rxn.reverse_variable.primal
+    except (SolverError, TypeError):
+        return None
+    if any(value is None for value in y_values):
+        return None
+    knocked_out = [group_index for group_index, value in enumerate(y_values) if value < 0.5]
+    if len(knocked_out) > max_knockouts or growth < min_growth - model.tolerance:
+        return None
+    return knocked_out, production, growth
+
+
+def iter_optknock(model, target_id, candidate_ids=None, biomass_id=BIOMASS_ID, growth_fraction=0.8,
+                  max_knockouts=3, n_solutions=1, time_limit=None, big_m=1000):
+    """Finds OptKnock designs one at a time, excluding each design with an integer cut before searching
+    for the next one.
+
+    Candidates are first reduced with `code.knockout_search.prune_candidates`, so that each binary
+    variable knocks out a whole group of fully coupled reactions. All changes to the model are reverted
+    when the generator finishes or is closed. The MILP can be solved by any optlang solver with integer
+    support, including the open-source GLPK that COBRA uses by default.
+
+    When a MILP hits `time_limit`, the best design found so far is yielded with the status "time_limit":
+    it is feasible, but it may not be optimal. The search stops at the first MILP without a feasible
+    solution.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the medium of the design.
+    target_id : str
+        Id of the product reaction to maximize, e.g. the MVA exchange "r_1547".
+    candidate_ids : list of str, optional
+        Reactions that may be knocked out. Defaults to all gene-associated reactions that are not
+        boundary reactions, the growth reaction or the target.
+    biomass_id : str, optional
+        Id of the growth reaction (inner objective).
+    growth_fraction : float, optional
+        Minimum growth of the designs, as fraction of the wild-type maximum.
+    max_knockouts : int, optional
+        Maximum number of knocked out candidate groups.
+    n_solutions : int, optional
+        Number of alternative designs to enumerate.
+    time_limit : float, optional
+        Time limit in seconds for each MILP (rounded up to whole seconds). Designs found at the time
+        limit may not be optimal.
+    big_m : float, optional
+        Bound on the dual variables of the knocked out reactions.
+
+    Yields
+    ------
+    dict
+        "knockouts" (list of reaction ids), "production", "biomass" and "status" of each design.
+    """
+    with model:
+        biomass_rxn = model.reactions.get_by_id(biomass_id)
+        target_rxn = model.reactions.get_by_id(target_id)
+        model.objective = biomass_rxn
+        min_growth = growth_fraction * model.slim_optimize(error_value=0.0)
+        if candidate_ids is None:
+            candidate_ids = [rxn.id for rxn in model.reactions
+                             if rxn.genes and not rxn.boundary and rxn.id not in (biomass_id, target_id)]
+        with model:
+            biomass_rxn.lower_bound = min_growth
+            groups = prune_candidates(model, candidate_ids)
+
+        y_vars = _add_optknock_problem(model, target_id, groups, biomass_id, min_growth, max_knockouts,
+                                       big_m)
+        timeout = model.solver.configuration.timeout
+        if time_limit is not None:
+            # rounded up to whole seconds, the only time limits that GLPK accepts through optlang:
+            model.solver.configuration.timeout = math.ceil(time_limit)
+        try:
+            for index in range(n_solutions):
+                model.slim_optimize()
+                status = model.solver.status
+                if status in ("infeasible", "infeasible_or_unbounded", "unbounded"):
+                    break
+                incumbent = _incumbent(model, y_vars, biomass_rxn, target_rxn, min_growth, max_knockouts)
+                if incumbent is None:
+                    break
+                knocked_out, production, growth = incumbent
+                yield {"knockouts": [rxn_id for group_index in knocked_out for rxn_id in groups[group_index]],
+                       "production": production, "biomass": growth, "status": status}
+                if not knocked_out:
+                    break
+                # Integer cut: exclude this design (and its supersets) from the next searches.
+                cut = model.problem.Constraint(Zero, lb=1, name=f"optknock_cut_{index}")
+                model.add_cons_vars([cut])
+                model.solver.update()
+                cut.set_linear_coefficients({y_vars[group_index]: 1 for group_index in knocked_out})
+        finally:
+            model.solver.configuration.timeout = timeout
+
+
+def optknock(model, target_id, **kwargs):
+    """Runs `iter_optknock` to completion.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model with the medium of the design.
+    target_id : str
+        Id of the product reaction to maximize.
+    **kwargs
+        Options of `iter_optknock`.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per design, with the columns "knockouts", "production", "biomass" and "status".
+    """
+    return pd.DataFrame(list(iter_optknock(model, target_id, **kwargs)),
+                        columns=["knockouts", "production", "biomass", "status"])
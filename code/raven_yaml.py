@@ -0,0 +1,360 @@
+"""
+Functions for reading and writing the RAVEN-format YAML file of the yeast model (model/yeast-GEM.yml)
+without a generic YAML parser.
+"""
+
+import json
+from cobra import Gene, Metabolite, Model, Reaction
+from .biomass import met_name
+from .io import YML_PATH
+
+# fields of the YAML file that have no COBRA attribute, and are therefore stored in the notes:
+MET_NOTES_FIELDS = ("smiles", "deltaG")
+RXN_NOTES_FIELDS = ("references", "deltaG", "confidence_score", "rxnNotes")
+
+
+def _parse_scalar(text):
+    """Parses a scalar as written by RAVEN: a double-quoted string or a plain number."""
+    if text.startswith('"'):
+        if "\\" in text:
+            return json.loads(text)
+        return text[1:-1]
+    try:
+        if text != "-0":  # kept as a float, to not lose the sign
+            return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def iter_raven_yaml(file_path=YML_PATH, sections=None, fields=None):
+    """Streams the entries of a RAVEN-format YAML file, one at a time.
+
+    The file is read line by line, relying on the fixed layout that RAVEN writes (one entry per
+    "- !!omap" block, fields indented by 6 spaces, nested maps/lists by 10 and 14 spaces), so only the
+    entry being read is kept in memory.
+
+    Parameters
+    ----------
+    file_path : str, optional
+        Path of the YAML file.
+    sections : iterable of str, optional
+        Sections to read ("metaData", "metabolites", "reactions", "genes", "compartments"). All other
+        sections are skipped without parsing. By default all sections are read.
+    fields : iterable of str, optional
+        Fields to keep in each entry (besides "id"). All other fields are skipped without parsing. By
+        default all fields are kept.
+
+    Yields
+    ------
+    tuple of (str, dict)
+        Section name and entry. Nested maps (metabolites, annotation) are dicts, and multi-valued
+        fields are lists. metaData and compartments are yielded as a single entry each.
+    """
+    sections = None if sections is None else set(sections)
+    fields = None if fields is None else set(fields) | {"id"}
+    section = None
+    entry = None
+    field = None  # container of the field being read, None if skipped
+    sub_field = None  # key of a multi-valued annotation being read
+    with open(file_path, encoding="utf-8") as yaml_file:
+        for line in yaml_file:
+            line = line.rstrip("\r\n")
+            if line.startswith("- "):
+                # New section:
+                if entry is not None:
+                    yield section, entry
+                section = line[2:].split(":", 1)[0]
+                entry = None
+                if sections is not None and section not in sections:
+                    section = None
+                elif section in ("metaData", "compartments"):
+                    entry = {}
+                continue
+            if section is None:
+                continue
+            if line.startswith("    - !!omap"):
+                # New entry:
+                if entry is not None:
+                    yield section, entry
+                entry = {}
+                field = None
+            elif line.startswith("              - "):
+                # Item of a multi-valued annotation:
+                if field is not None:
+                    field[sub_field].append(_parse_scalar(line[16:]))
+            elif line.startswith("          - "):
+                # Item of a list field, or key of a map field:
+                if field is None:
+                    continue
+                content = line[12:]
+                if isinstance(field, list):
+                    field.append(_parse_scalar(content))
+                elif content.endswith(":"):
+                    sub_field = content[:-1]
+                    field[sub_field] = []
+                else:
+                    key, _, value = content.partition(": ")
+                    field[key] = _parse_scalar(value)
+            elif line.startswith("      - "):
+                # Field of an entry:
+                key, separator, value = line[8:].partition(": ")
+                if fields is not None and key.rstrip(":") not in fields:
+                    field = None
+                elif not separator:
+                    field = entry[key.rstrip(":")] = []
+                elif value == "!!omap":
+                    field = entry[key] = {}
+                else:
+                    entry[key] = _parse_scalar(value)
+                    field = None
+            elif line.startswith("    "):
+                # Field of metaData, or compartment:
+                content = line[4:]
+                if content.startswith("- "):
+                    content = content[2:]
+                key, _, value = content.partition(": ")
+                entry[key] = _parse_scalar(value)
+    if entry is not None:
+        yield section, entry
+
+
+def read_raven_yaml_fields(section, fields, file_path=YML_PATH):
+    """Reads selected fields of one section of a RAVEN-format YAML file as columns.
+
+    Parameters
+    ----------
+    section : str
+        Section to read, e.g. "metabolites".
+    fields : list of str
+        Fields to read, e.g. ["deltaG", "smiles"].
+    file_path : str, optional
+        Path of the YAML file.
+
+    Returns
+    -------
+    dict
+        Field name -> list of values, aligned with the "id" column. Missing values are None.
+    """
+    columns = {"id": []}
+    for field in fields:
+        columns[field] = []
+    for _, entry in iter_raven_yaml(file_path, sections=[section], fields=fields):
+        for key, column in columns.items():
+            column.append(entry.get(key))
+    return columns
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def read_raven_yaml(file_path=YML_PATH):
+    """Reads a RAVEN-format YAML file directly into a COBRA model.
+
+    Fields without a COBRA attribute (smiles/deltaG of metabolites; references, deltaG,
+    confidence_score and rxnNotes of reactions) are kept in the notes of each element, and the metaData
+    in the notes of the model. EC codes are stored as the "ec-code" annotation.
+
+    Parameters
+    ----------
+    file_path : str, optional
+        Path of the YAML file.
+
+    Returns
+    -------
+    cobra.core.Model
+    """
+    model = Model()
+    metabolites = {}
+    reactions = []
+    genes = []
+    objective = {}
+    default_bounds = (-1000, 1000)
+    for section, entry in iter_raven_yaml(file_path):
+        if section == "metaData":
+            model.id = entry.pop("id", None)
+            model.name = entry.pop("name", None)
+            model.notes.update(entry)
+            default_bounds = (float(entry.get("defaultLB", -1000)), float(entry.get("defaultUB", 1000)))
+        elif section == "metabolites":
+            met = Metabolite(entry["id"], formula=entry.get("formula"), name=entry.get("name", ""),
+                             charge=entry.get("charge"), compartment=entry.get("compartment"))
+            met.annotation = entry.get("annotation", {})
+            for key in MET_NOTES_FIELDS:
+                if key in entry:
+                    met.notes[key] = entry[key]
+            metabolites[met.id] = met
+        elif section == "reactions":
+            rxn = Reaction(entry["id"], name=entry.get("name", ""),
+                           subsystem="; ".join(_as_list(entry.get("subsystem"))),
+                           lower_bound=entry.get("lower_bound", default_bounds[0]),
+                           upper_bound=entry.get("upper_bound", default_bounds[1]))
+            rxn.add_metabolites({metabolites[met_id]: coeff
+                                 for met_id, coeff in entry.get("metabolites", {}).items()})
+            rxn.gene_reaction_rule = entry.get("gene_reaction_rule", "")
+            rxn.annotation = entry.get("annotation", {})
+            if "eccodes" in entry:
+                rxn.annotation["ec-code"] = entry["eccodes"]
+            for key in RXN_NOTES_FIELDS:
+                if key in entry:
+                    rxn.notes[key] = entry[key]
+            if "objective_coefficient" in entry:
+                objective[rxn.id] = entry["objective_coefficient"]
+            reactions.append(rxn)
+        elif section == "genes":
+            gene = Gene(entry["id"], name=entry.get("name", ""))
+            gene.annotation = entry.get("annotation", {})
+            genes.append(gene)
+        elif section == "compartments":
+            model.compartments = entry
+
+    # Genes go first, so that the reactions get associated with them instead of their own copies:
+    model.genes += genes
+    for gene in genes:
+        gene._model = model
+    model.add_metabolites(list(metabolites.values()))
+    model.add_reactions(reactions)
+    for rxn_id, coefficient in objective.items():
+        model.reactions.get_by_id(rxn_id).objective_coefficient = coefficient
+    return model
+
+
+def ordered_compartments(model):
+    """Gets the names of the compartments of a model in the order they were declared (e.g. in the
+    compartments section of the YAML file), as `model.compartments` follows the order of the metabolites.
+
+    Returns
+    -------
+    dict
+        Compartment id -> name.
+    """
+    return {**model._compartments, **model.compartments}
+
+
+def _format_scalar(value):
+    """Formats a scalar as written by RAVEN: strings double-quoted, numbers with up to 15 significant
+    digits."""
+    if isinstance(value, str):
+        if '"' in value or "\\" in value or not value.isprintable():
+            return json.dumps(value, ensure_ascii=False)
+        return f'"{value}"'
+    if isinstance(value, float):
+        return f"{value:.0f}" if value.is_integer() else f"{value:.15g}"
+    return str(value)
+
+
+def _list_lines(key, values, indent):
+    """Formats a field as a scalar if it has one value, or as a list otherwise."""
+    if len(values) == 1:
+        return f"{indent}- {key}: {_format_scalar(values[0])}\n"
+    return f"{indent}- {key}:\n" + "".join(f"{indent}    - {_format_scalar(value)}\n" for value in values)
+
+
+def _annotation_lines(annotation, exclude=()):
+    lines = "".join(_list_lines(key, values, "          ") for key, values
+                    in ((key, _as_list(annotation[key])) for key in sorted(annotation) if key not in exclude)
+                    if values)
+    return "      - annotation: !!omap\n" + lines if lines else ""
+
+
+def _metabolite_entry(met, name):
+    entry = (f"    - !!omap\n      - id: {_format_scalar(met.id)}\n      - name: {_format_scalar(name)}\n"
+             f"      - compartment: {_format_scalar(met.compartment)}\n")
+    if met.formula:
+        entry += f"      - formula: {_format_scalar(met.formula)}\n"
+    if met.charge is not None:
+        entry += f"      - charge: {_format_scalar(met.charge)}\n"
+    if "smiles" in met.notes:
+        entry += f"      - smiles: {_format_scalar(met.notes['smiles'])}\n"
+    entry += _annotation_lines(met.annotation)
+    if "deltaG" in met.notes:
+        entry += f"      - deltaG: {_format_scalar(met.notes['deltaG'])}\n"
+    return entry
+
+
+def _reaction_entry(rxn):
+    stoichiometry = sorted((met.id, coeff) for met, coeff in rxn.metabolites.items())
+    entry = (f"    - !!omap\n      - id: {_format_scalar(rxn.id)}\n      - name: {_format_scalar(rxn.name)}\n"
+             "      - metabolites: !!omap\n"
+             + "".join(f"          - {met_id}: {_format_scalar(coeff)}\n" for met_id, coeff in stoichiometry)
+             + f"      - lower_bound: {_format_scalar(rxn.lower_bound)}\n"
+             f"      - upper_bound: {_format_scalar(rxn.upper_bound)}\n")
+    if rxn.objective_coefficient:
+        entry += f"      - objective_coefficient: {_format_scalar(rxn.objective_coefficient)}\n"
+    if rxn.gene_reaction_rule:
+        entry += f"      - gene_reaction_rule: {_format_scalar(rxn.gene_reaction_rule)}\n"
+    ec_codes = _as_list(rxn.annotation.get("ec-code"))
+    if ec_codes:
+        entry += _list_lines("eccodes", ec_codes, "      ")
+    if "references" in rxn.notes:
+        entry += f"      - references: {_format_scalar(rxn.notes['references'])}\n"
+    entry += "      - subsystem:\n" + "".join(f"          - {_format_scalar(subsystem)}\n"
+                                              for subsystem in rxn.subsystem.split("; ") if subsystem)
+    entry += _annotation_lines(rxn.annotation, exclude=("ec-code",))
+    for key in ("deltaG", "confidence_score", "rxnNotes"):
+        if key in rxn.notes:
+            entry += f"      - {key}: {_format_scalar(rxn.notes[key])}\n"
+    return entry
+
+
+def _gene_entry(gene):
+    entry = f"    - !!omap\n      - id: {_format_scalar(gene.id)}\n"
+    if gene.name:
+        entry += f"      - name: {_format_scalar(gene.name)}\n"
+    return entry + _annotation_lines(gene.annotation)
+
+
+def iter_raven_yaml_text(model):
+    """Streams the text of the RAVEN-format YAML file of a model, one entry at a time.
+
+    The layout is the one of RAVEN's writeYAMLmodel: fields in RAVEN's order, strings double-quoted,
+    numbers with up to 15 significant digits, reaction metabolites sorted by id, subsystems always as a
+    list and EC codes/annotations as a scalar when they have a single value.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to write. Fields without a COBRA attribute are taken from the notes, as stored by
+        `read_raven_yaml`.
+
+    Yields
+    ------
+    str
+        Text of the header, of each section title and of each entry.
+    """
+    names = ordered_compartments(model)
+    meta_data = {"id": model.id, "name": model.name, **model.notes}
+    yield "---\n!!omap\n- metaData:\n" + "".join(f"    {key}: {_format_scalar(str(value))}\n"
+                                                  for key, value in meta_data.items() if value is not None)
+    yield "- metabolites:\n"
+    for met in model.metabolites:
+        yield _metabolite_entry(met, met_name(met, names))
+    yield "- reactions:\n"
+    for rxn in model.reactions:
+        yield _reaction_entry(rxn)
+    yield "- genes:\n"
+    for gene in model.genes:
+        yield _gene_entry(gene)
+    yield "- compartments: !!omap\n" + "".join(f"    - {comp_id}: {_format_scalar(name)}\n"
+                                                for comp_id, name in names.items())
+
+
+def write_raven_yaml(model, file_path=YML_PATH):
+    """Writes a COBRA model as a RAVEN-format YAML file (the inverse of `read_raven_yaml`), streaming
+    one entry at a time (see `iter_raven_yaml_text`).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to write.
+    file_path : str, optional
+        Path of the YAML file.
+    """
+    with open(file_path, "w", encoding="utf-8", buffering=1 << 20) as yaml_file:
+        yaml_file.writelines(iter_raven_yaml_text(model))
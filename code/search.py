@@ -0,0 +1,271 @@
+"""
+Keyword search over the reactions and metabolites of a model, through a trigram index that is built once
+per model file and persisted in the cache.
+"""
+
+from collections import defaultdict
+from .cache import SnapshotCache, file_hash, snapshot_key
+from .io import CACHE_MAX_SIZE, CACHE_PATH, read_yeast_model, yeast_model_key
+
+INDEX_VERSION = 1  # increase when the index layout changes, to invalidate persisted indexes
+SEARCH_CACHE = SnapshotCache(f"{CACHE_PATH}/search", max_size=CACHE_MAX_SIZE)
+
+# searchable fields, the first ones being the fields searched by default:
+MET_FIELDS = ("id", "name", "formula", "compartment", "annotation")
+RXN_FIELDS = ("id", "name", "subsystem", "genes", "annotation")
+DEFAULT_MET_FIELDS = ("id", "name", "formula", "compartment")
+DEFAULT_RXN_FIELDS = ("id", "name")
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _annotation_text(annotation):
+    values = []
+    for key, value in annotation.items():
+        for item in (value if isinstance(value, list) else [value]):
+            values.append(f"{key}:{item}")
+    return " ".join(values)
+
+
+class SearchIndex:
+    """Trigram index over the ids, names, formulas, compartments, subsystems, genes and annotations of
+    the reactions and metabolites of a model.
+
+    Each searchable field value is a document. Keywords of 3 or more characters are looked up by
+    intersecting the documents of their trigrams, and confirmed with a substring test on the candidates
+    only; shorter keywords are tested against all documents of the requested fields.
+
+    Parameters
+    ----------
+    model : cobra.core.Model or code.model_view.ModelView
+        Model to index. The index keeps no reference to it.
+    """
+
+    def __init__(self, model):
+        self.docs = []  # (kind, element index, field, value, lowercase value)
+        self.postings = defaultdict(set)
+        self.metabolites = []  # (id, name, compartment)
+        self.reactions = []  # (id, name, reaction string, subsystem, lower bound, upper bound, mets)
+        self.met_reactions = []  # reaction indexes of each metabolite
+        met_index = {}
+        for i, met in enumerate(model.metabolites):
+            met_index[met.id] = i
+            self.metabolites.append((met.id, met.name, met.compartment))
+            self.met_reactions.append([])
+            values = {"id": met.id, "name": met.name, "formula": met.formula,
+                      "compartment": met.compartment, "annotation": _annotation_text(met.annotation)}
+            for field in MET_FIELDS:
+                self._add_doc("metabolite", i, field, values[field])
+        for j, rxn in enumerate(model.reactions):
+            mets = [(met_index[met.id], coeff) for met, coeff in rxn.metabolites.items()]
+            self.reactions.append((rxn.id, rxn.name, rxn.build_reaction_string(), rxn.subsystem,
+                                   rxn.lower_bound, rxn.upper_bound, mets))
+            for i, _ in mets:
+                self.met_reactions[i].append(j)
+            values = {"id": rxn.id, "name": rxn.name, "subsystem": rxn.subsystem,
+                      "genes": " ".join(gene.id for gene in rxn.genes),
+                      "annotation": _annotation_text(rxn.annotation)}
+            for field in RXN_FIELDS:
+                self._add_doc("reaction", j, field, values[field])
+        self.postings = dict(self.postings)
+
+    def _add_doc(self, kind, index, field, value):
+        # Same rule as the original scan: empty values never match.
+        if not value:
+            return
+        value = str(value)
+        lower_value = value.lower()
+        doc_id = len(self.docs)
+        self.docs.append((kind, index, field, value, lower_value))
+        for trigram in _trigrams(lower_value):
+            self.postings[trigram].add(doc_id)
+
+    @classmethod
+    def for_yeast_model(cls, make_bigg_compliant=False):
+        """Gets the index of the yeast model, building and persisting it only if the model file changed.
+
+        Parameters
+        ----------
+        make_bigg_compliant : bool, optional
+            Whether to index the BiGG compliant version of the model.
+
+        Returns
+        -------
+        SearchIndex
+        """
+        key = snapshot_key(yeast_model_key(make_bigg_compliant), INDEX_VERSION)
+        index = SEARCH_CACHE.load(key)
+        if index is None:
+            index = cls(read_yeast_model(make_bigg_compliant))
+            SEARCH_CACHE.save(key, index)
+        return index
+
+    @classmethod
+    def for_model_file(cls, file_path):
+        """Gets the index of a model file (SBML or RAVEN YAML), building and persisting it only if the
+        file changed. The model is read as a `code.model_view.ModelView`, without COBRA.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the model file.
+
+        Returns
+        -------
+        SearchIndex
+        """
+        # imported here, as the view depends on the paths of code.io too:
+        from .model_view import read_model_view
+        key = snapshot_key("file", file_hash(file_path), INDEX_VERSION)
+        index = SEARCH_CACHE.load(key)
+        if index is None:
+            index = cls(read_model_view(file_path))
+            SEARCH_CACHE.save(key, index)
+        return index
+
+    def match_docs(self, keywords, case_sensitive=False, kinds=None, fields=None):
+        """Finds the documents that contain any of the keywords.
+
+        Parameters
+        ----------
+        keywords : list of str
+            Substrings to look for.
+        case_sensitive : bool, optional
+            Whether the match is case sensitive.
+        kinds : iterable of str, optional
+            Restrict to "metabolite" and/or "reaction" documents.
+        fields : iterable of str, optional
+            Restrict to these fields.
+
+        Returns
+        -------
+        list of int
+            Sorted document ids.
+        """
+        matched = set()
+        for keyword in keywords:
+            lower_keyword = keyword.lower()
+            trigrams = _trigrams(lower_keyword)
+            if trigrams:
+                postings = sorted((self.postings.get(trigram, set()) for trigram in trigrams), key=len)
+                candidates = set.intersection(*postings) if postings[0] else set()
+            else:
+                candidates = range(len(self.docs))
+            for doc_id in candidates:
+                doc = self.docs[doc_id]
+                if kinds is not None and doc[0] not in kinds:
+                    continue
+                if fields is not None and doc[2] not in fields:
+                    continue
+                if (keyword in doc[3]) if case_sensitive else (lower_keyword in doc[4]):
+                    matched.add(doc_id)
+        return sorted(matched)
+
+    def find_reactions(self, keywords, case_sensitive=False, fields=DEFAULT_RXN_FIELDS):
+        """Finds the reactions with any of the keywords in the given fields.
+
+        Parameters
+        ----------
+        keywords : str or list of str
+            Substrings to look for.
+        case_sensitive : bool, optional
+            Whether the match is case sensitive.
+        fields : iterable of str, optional
+            Reaction fields to search (see RXN_FIELDS).
+
+        Returns
+        -------
+        list of str
+            Reaction ids, in model order.
+        """
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        doc_ids = self.match_docs(keywords, case_sensitive, kinds={"reaction"}, fields=set(fields))
+        rxn_indexes = sorted({self.docs[doc_id][1] for doc_id in doc_ids})
+        return [self.reactions[j][0] for j in rxn_indexes]
+
+    def search(self, keywords, case_sensitive=False, met_fields=DEFAULT_MET_FIELDS,
+               rxn_fields=DEFAULT_RXN_FIELDS):
+        """Finds the reactions and metabolites related to keywords.
+
+        The result has the same structure as `find_keyword_related_components` in Opt/Opt_t2.py:
+        metabolites matching in any of `met_fields`, and reactions matching in any of `rxn_fields` or
+        having a participant whose id or name matches.
+
+        Parameters
+        ----------
+        keywords : str or list of str
+            Substrings to look for.
+        case_sensitive : bool, optional
+            Whether the match is case sensitive.
+        met_fields : iterable of str, optional
+            Metabolite fields to search (see MET_FIELDS).
+        rxn_fields : iterable of str, optional
+            Reaction fields to search (see RXN_FIELDS).
+
+        Returns
+        -------
+        dict
+        """
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        results = {
+            'search_keywords': keywords,
+            'reactions': defaultdict(list),
+            'metabolites': defaultdict(list),
+            'summary': {}
+        }
+        met_fields = set(met_fields)
+        rxn_fields = set(rxn_fields)
+        rxn_matches = defaultdict(dict)
+        participant_matches = set()
+        for doc_id in self.match_docs(keywords, case_sensitive, fields=met_fields | rxn_fields | {"id", "name"}):
+            kind, index, field, value, _ = self.docs[doc_id]
+            if kind == "metabolite":
+                if field in ("id", "name"):
+                    participant_matches.add(index)
+                if field in met_fields:
+                    met_id, _, compartment = self.metabolites[index]
+                    results['metabolites'][met_id].append({
+                        'field': field,
+                        'value': value,
+                        'compartment': compartment
+                    })
+            elif field in rxn_fields:
+                rxn_matches[index][field] = value
+
+        rxn_indexes = set(rxn_matches)
+        for i in participant_matches:
+            rxn_indexes.update(self.met_reactions[i])
+        for j in sorted(rxn_indexes):
+            rxn_id, name, reaction_string, subsystem, lower_bound, upper_bound, mets = self.reactions[j]
+            met_matches = []
+            for i, coeff in mets:
+                if i in participant_matches:
+                    met_matches.append({
+                        'metabolite_id': self.metabolites[i][0],
+                        'metabolite_name': self.metabolites[i][1],
+                        'coefficient': coeff
+                    })
+            results['reactions'][rxn_id] = {
+                'name': name,
+                'matches': rxn_matches.get(j, {}),
+                'metabolite_matches': met_matches,
+                'reaction_string': reaction_string,
+                'subsystem': subsystem,
+                'lower_bound': lower_bound,
+                'upper_bound': upper_bound
+            }
+
+        last_rxn = self.reactions[-1] if self.reactions else (None, None)
+        results['summary'] = {
+            'Reaction ID': last_rxn[0],
+            'Name': last_rxn[1],
+            'total_reactions_matched': len(results['reactions']),
+            'total_metabolites_matched': len(results['metabolites']),
+            'matched_reaction_ids': list(results['reactions'].keys()),
+            'matched_metabolite_ids': list(results['metabolites'].keys())
+        }
+        return results
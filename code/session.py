@@ -0,0 +1,357 @@
+"""
+Simulation session that keeps one solver problem alive and runs batches of what-if scenarios (bound,
+objective and knockout changes) on it, changing only the solver variables that differ between consecutive
+scenarios so that each LP starts from the basis of the previous one.
+"""
+
+import math
+import pandas as pd
+from cobra import Configuration
+from cobra.util.solver import linear_reaction_coefficients
+from multiprocessing import Pool
+from optlang.symbolics import Zero
+from .gpr import gene_reaction_map, knockout_reactions
+from .knockout import BIOMASS_ID
+
+SCENARIO_KEYS = {"id", "bounds", "objective", "direction", "genes", "reactions"}
+
+# session of each worker process, set once by _init_worker:
+_worker_session = None
+
+
+def _variable_bounds(bounds):
+    """Splits reaction bounds into the bounds of its forward and reverse variables, as COBRA does."""
+    lower_bound, upper_bound = bounds
+    return (max(lower_bound, 0), max(upper_bound, 0)), (max(-upper_bound, 0), max(-lower_bound, 0))
+
+
+def _objective_dict(objective):
+    if objective is None:
+        return {}
+    if isinstance(objective, str):
+        return {objective: 1}
+    return dict(objective)
+
+
+class SimulationSession:
+    """Runs scenarios on the solver problem of a model, without COBRA contexts or model copies.
+
+    A scenario is a dict with any of the keys:
+
+    - "id": name of the scenario in the results (defaults to its position in the batch).
+    - "bounds": {reaction id: (lower bound, upper bound)}, as the "bounds" of the deltas of
+      `code.biomass`.
+    - "objective": reaction id or {reaction id: coefficient}, replacing the objective.
+    - "direction": "max" or "min".
+    - "genes": ids of genes to knock out (the reactions they inactivate are blocked).
+    - "reactions": ids of reactions to block.
+
+    Each scenario is relative to the base of the session: the model as it was when the session started,
+    plus the (optional) base scenario, e.g. a growth floor and a production objective. Only the solver
+    variables whose bounds or objective coefficients differ from the previous scenario are changed, so
+    batches of similar scenarios in a row mostly cost the LP re-optimizations.
+
+    The COBRA objects of the model are never changed, but its solver is: do not change the model while
+    the session is open, and close it (or use it as a context manager) to restore the solver.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to simulate.
+    flux_ids : iterable of str, optional
+        Ids of the reactions whose flux is reported for each scenario.
+    base : dict, optional
+        Scenario applied for the whole session (its "id" is ignored).
+    """
+
+    def __init__(self, model, flux_ids=(BIOMASS_ID,), base=None):
+        self.model = model
+        self.flux_ids = list(flux_ids)
+        self._variables = {rxn.id: (rxn.forward_variable, rxn.reverse_variable) for rxn in model.reactions}
+        self._model_bounds = {rxn.id: rxn.bounds for rxn in model.reactions}
+        self._model_objective = {rxn.id: coeff for rxn, coeff in linear_reaction_coefficients(model).items()}
+        self._model_direction = model.solver.objective.direction
+        self._rules, self._gene_reactions = gene_reaction_map(model)
+        # current state of the solver:
+        self._bounds = {}  # reaction id -> bounds, for the reactions that differ from the model
+        self._objective = dict(self._model_objective)
+        self._direction = self._model_direction
+        self._floor = None  # objective floor of pFBA, created when first needed
+        self._base_bounds = {}
+        self._base_objective = self._model_objective
+        self._base_direction = self._model_direction
+        if base is not None:
+            self.set_base(base)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _check(self, scenario):
+        unknown = set(scenario) - SCENARIO_KEYS
+        if unknown:
+            raise ValueError(f"Unknown scenario keys: {', '.join(sorted(unknown))}")
+
+    def _scenario_state(self, scenario):
+        """Gets the bounds (of the reactions that differ from the model), objective and direction of a
+        scenario on top of the base."""
+        self._check(scenario)
+        bounds = dict(self._base_bounds)
+        bounds.update(scenario.get("bounds", {}))
+        blocked = list(scenario.get("reactions", []))
+        if scenario.get("genes"):
+            blocked += knockout_reactions(scenario["genes"], self._rules, self._gene_reactions)
+        for rxn_id in blocked:
+            bounds[rxn_id] = (0, 0)
+        if "objective" in scenario:
+            objective = _objective_dict(scenario["objective"])
+        else:
+            objective = self._base_objective
+        return bounds, objective, scenario.get("direction", self._base_direction)
+
+    def _set_state(self, bounds, objective, direction):
+        """Changes the solver variables whose bounds or objective coefficients differ from the current
+        state."""
+        for rxn_id in [rxn_id for rxn_id in self._bounds if rxn_id not in bounds]:
+            self._set_bounds(rxn_id, self._model_bounds[rxn_id])
+            del self._bounds[rxn_id]
+        for rxn_id, rxn_bounds in bounds.items():
+            rxn_bounds = tuple(rxn_bounds)
+            if self._bounds.get(rxn_id, self._model_bounds[rxn_id]) != rxn_bounds:
+                self._set_bounds(rxn_id, rxn_bounds)
+            self._bounds[rxn_id] = rxn_bounds
+        coefficients = {}
+        for rxn_id in set(self._objective) | set(objective):
+            coeff = objective.get(rxn_id, 0)
+            if self._objective.get(rxn_id, 0) != coeff:
+                forward_variable, reverse_variable = self._variables[rxn_id]
+                coefficients[forward_variable] = coeff
+                coefficients[reverse_variable] = -coeff
+        if coefficients:
+            self.model.solver.objective.set_linear_coefficients(coefficients)
+        self._objective = dict(objective)
+        if self._direction != direction:
+            self.model.solver.objective.direction = direction
+            self._direction = direction
+
+    def _set_bounds(self, rxn_id, bounds):
+        forward_bounds, reverse_bounds = _variable_bounds(bounds)
+        forward_variable, reverse_variable = self._variables[rxn_id]
+        forward_variable.set_bounds(*forward_bounds)
+        reverse_variable.set_bounds(*reverse_bounds)
+
+    def set_base(self, scenario):
+        """Replaces the base of the session, i.e. the changes shared by all scenarios.
+
+        Parameters
+        ----------
+        scenario : dict
+            Changes applied on top of the model (see the class documentation). An empty dict restores
+            the model as it was when the session started.
+        """
+        self._base_bounds = {}
+        self._base_objective = self._model_objective
+        self._base_direction = self._model_direction
+        self._base_bounds, self._base_objective, self._base_direction = self._scenario_state(scenario)
+        self._set_state(self._base_bounds, self._base_objective, self._base_direction)
+
+    def _minimize_total_flux(self, optimum, fraction_of_optimum):
+        """Minimizes the sum of fluxes with the objective kept at a fraction of its optimum (as
+        `cobra.flux_analysis.pfba`), then restores the objective. The floor is relaxed by the tolerance of
+        the model, as a warm-started optimum can exceed the exact one by the solver tolerance."""
+        solver = self.model.solver
+        if self._floor is None:
+            self._floor = self.model.problem.Constraint(Zero, name="session_objective_floor")
+            solver.add(self._floor)
+            solver.update()
+        all_variables = [variable for pair in self._variables.values() for variable in pair]
+        floor_coefficients = dict.fromkeys(all_variables, 0)
+        for rxn_id, coeff in self._objective.items():
+            forward_variable, reverse_variable = self._variables[rxn_id]
+            floor_coefficients[forward_variable] = coeff
+            floor_coefficients[reverse_variable] = -coeff
+        self._floor.set_linear_coefficients(floor_coefficients)
+        if self._direction == "max":
+            self._floor.lb = fraction_of_optimum * optimum - self.model.tolerance
+        else:
+            self._floor.ub = fraction_of_optimum * optimum + self.model.tolerance
+        solver.objective.set_linear_coefficients(dict.fromkeys(all_variables, 1))
+        solver.objective.direction = "min"
+        try:
+            self.model.slim_optimize(error_value=math.nan)
+            return solver.status
+        finally:
+            restored = dict.fromkeys(all_variables, 0)
+            for variable, coeff in floor_coefficients.items():
+                if coeff:
+                    restored[variable] = coeff
+            solver.objective.set_linear_coefficients(restored)
+            solver.objective.direction = self._direction
+            self._floor.lb = None
+            self._floor.ub = None
+
+    def solve(self, scenario, method="fba", fraction_of_optimum=1.0):
+        """Applies a scenario and optimizes. The scenario stays applied until the next one is solved or
+        the session is reset.
+
+        Parameters
+        ----------
+        scenario : dict
+            Changes on top of the base (see the class documentation).
+        method : str, optional
+            "fba", or "pfba" to report the fluxes of the parsimonious solution.
+        fraction_of_optimum : float, optional
+            Fraction of the optimum kept by pFBA.
+
+        Returns
+        -------
+        tuple of (str, float, list of float)
+            Solver status, objective value and reported fluxes (NaN if not optimal).
+        """
+        self._set_state(*self._scenario_state(scenario))
+        objective_value = self.model.slim_optimize(error_value=math.nan)
+        status = self.model.solver.status
+        if status == "optimal" and method == "pfba":
+            status = self._minimize_total_flux(objective_value, fraction_of_optimum)
+        if status != "optimal":
+            return status, objective_value, [math.nan] * len(self.flux_ids)
+        fluxes = [self._variables[flux_id][0].primal - self._variables[flux_id][1].primal
+                  for flux_id in self.flux_ids]
+        return status, objective_value, fluxes
+
+    def _run_rows(self, scenarios, method, fraction_of_optimum):
+        rows = []
+        try:
+            for position, scenario in enumerate(scenarios):
+                status, objective_value, fluxes = self.solve(scenario, method, fraction_of_optimum)
+                rows.append((scenario.get("id", position), status, objective_value, *fluxes))
+        finally:
+            self.reset()
+        return rows
+
+    def run(self, scenarios, method="fba", fraction_of_optimum=1.0):
+        """Solves a batch of scenarios in order, and restores the base afterwards.
+
+        Consecutive scenarios that differ little (e.g. sorted by the reactions they change) re-optimize
+        fastest.
+
+        Parameters
+        ----------
+        scenarios : iterable of dict
+            Scenarios (see the class documentation).
+        method : str, optional
+            "fba" or "pfba".
+        fraction_of_optimum : float, optional
+            Fraction of the optimum kept by pFBA.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Indexed by scenario id, with the columns "status", "objective" and one column per flux id.
+        """
+        rows = self._run_rows(scenarios, method, fraction_of_optimum)
+        columns = ["scenario", "status", "objective", *self.flux_ids]
+        return pd.DataFrame(rows, columns=columns).set_index("scenario")
+
+    def reset(self):
+        """Restores the base of the session in the solver."""
+        self._set_state(self._base_bounds, self._base_objective, self._base_direction)
+
+    def close(self):
+        """Restores the solver of the model as it was when the session started."""
+        self._set_state({}, self._model_objective, self._model_direction)
+        if self._floor is not None:
+            self.model.solver.remove(self._floor)
+            self._floor = None
+
+
+def production_base(model, product_id, biomass_id=BIOMASS_ID, growth_fraction=0.8):
+    """Gets the base scenario of the production screens: growth kept above a fraction of its maximum
+    and the product as objective (as `code.knockout.set_production_objective`, without changing the
+    model).
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to simulate.
+    product_id : str
+        Id of the reaction to maximize, e.g. the MVA exchange "r_1547".
+    biomass_id : str, optional
+        Id of the growth reaction.
+    growth_fraction : float, optional
+        Fraction of the maximum growth rate used as lower bound of the growth reaction.
+
+    Returns
+    -------
+    dict
+    """
+    biomass_rxn = model.reactions.get_by_id(biomass_id)
+    with model:
+        model.objective = biomass_rxn
+        model.objective_direction = "max"
+        max_growth = model.slim_optimize(error_value=0.0)
+    return {"bounds": {biomass_id: (growth_fraction * max_growth, biomass_rxn.upper_bound)},
+            "objective": product_id, "direction": "max"}
+
+
+def _init_worker(model, flux_ids, base):
+    global _worker_session
+    _worker_session = SimulationSession(model, flux_ids, base)
+
+
+def _solve_chunk(task):
+    scenarios, method, fraction_of_optimum = task
+    return _worker_session._run_rows(scenarios, method, fraction_of_optimum)
+
+
+def run_scenarios(model, scenarios, flux_ids=(BIOMASS_ID,), base=None, method="fba", fraction_of_optimum=1.0,
+                  processes=None, chunks_per_process=4):
+    """Solves a batch of scenarios with one session per process.
+
+    Each worker receives the model once, when the pool starts, and contiguous chunks of the scenarios,
+    so that the order chosen by the caller (similar scenarios in a row) is kept within each worker.
+
+    Parameters
+    ----------
+    model : cobra.core.Model
+        Model to simulate. It is left unchanged.
+    scenarios : list of dict
+        Scenarios (see `SimulationSession`).
+    flux_ids : iterable of str, optional
+        Ids of the reactions whose flux is reported.
+    base : dict, optional
+        Scenario shared by all scenarios, e.g. from `production_base`.
+    method : str, optional
+        "fba" or "pfba".
+    fraction_of_optimum : float, optional
+        Fraction of the optimum kept by pFBA.
+    processes : int, optional
+        Number of processes. Defaults to the COBRA configuration.
+    chunks_per_process : int, optional
+        Number of chunks per process, for balancing the load.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Indexed by scenario id (defaults to the position in `scenarios`), with the columns "status",
+        "objective" and one column per flux id, in the order of `scenarios`.
+    """
+    flux_ids = list(flux_ids)
+    scenarios = [dict(scenario, id=scenario.get("id", position)) for position, scenario in enumerate(scenarios)]
+    if processes is None:
+        processes = Configuration().processes
+    processes = max(1, min(processes, len(scenarios)))
+    if processes == 1:
+        with SimulationSession(model, flux_ids, base) as session:
+            rows = session._run_rows(scenarios, method, fraction_of_optimum)
+    else:
+        chunk_size = math.ceil(len(scenarios) / (processes * chunks_per_process))
+        tasks = [(scenarios[i:i + chunk_size], method, fraction_of_optimum)
+                 for i in range(0, len(scenarios), chunk_size)]
+        rows = []
+        with Pool(processes, initializer=_init_worker, initargs=(model, flux_ids, base)) as pool:
+            for chunk_rows in pool.imap(_solve_chunk, tasks):
+                rows.extend(chunk_rows)
+    return pd.DataFrame(rows, columns=["scenario", "status", "objective", *flux_ids]).set_index("scenario")
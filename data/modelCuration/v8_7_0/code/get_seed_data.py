@@ -1,77 +1,71 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-from tqdm import tqdm, trange
+import argparse
 import re
+import sys
+from os.path import abspath, dirname
 import pandas as pd
+from tqdm import tqdm
 
+sys.path.insert(0, dirname(dirname(dirname(dirname(dirname(abspath(__file__)))))))
+from code.fetch import RESPONSE_CACHE, DirectorySource, HttpSource, run_fetch
 
+URL_TEMPLATE = '/solr/compounds/select?wt=json&q=id:{key}'
 
 
-def crawler_modelseed(id):
-
-    headers = {
-        'user-agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36",
-        }
-    url = 'https://modelseed.org/solr/compounds/select?wt=json&q=id:{}'.format(id)
-    response = requests.request("GET", url, headers=headers)
-    rawdata = BeautifulSoup(response.text, 'html.parser')
+def parse_modelseed(id, rawdata):
     try:
-        abbreviation_r = re.findall(r'"abbreviation":".*"', str(rawdata))
+        abbreviation_r = re.findall(r'"abbreviation":".*"', rawdata)
         abbreviation = abbreviation_r[0].split('"')[3]
     except IndexError:
         abbreviation_r = abbreviation = 'nan'
     try:
-        aliases_r = re.findall(r'"aliases":\["Name: .*', str(rawdata))
+        aliases_r = re.findall(r'"aliases":\["Name: .*', rawdata)
         aliases = aliases_r[0].split(';')[0].split(':')[2]
     except IndexError:
         aliases_r = aliases = 'nan'
     try:
-        deltag_r = re.findall(r'"deltag":.*,', str(rawdata))
+        deltag_r = re.findall(r'"deltag":.*,', rawdata)
         deltag = deltag_r[0].split(':')[1].split(',')[0]
     except IndexError:
         deltag_r = deltag = 'nan'
     try:
-        smiles_r = re.findall(r'"smiles":".*"', str(rawdata))
+        smiles_r = re.findall(r'"smiles":".*"', rawdata)
         smiles = smiles_r[0].split('"')[3]
     except IndexError:
         smiles_r = smiles = 'nan'
     try:
-        kegg_r = re.findall(r'"KEGG: .*"', str(rawdata))
+        kegg_r = re.findall(r'"KEGG: .*"', rawdata)
         kegg = kegg_r[0].split(' ')[1].split('"')[0].split(';')[0]
     except IndexError:
         kegg_r = kegg = 'nan'
-    print('id:{} aliases:{}'.format(id, aliases))
     return [aliases, abbreviation, deltag, smiles, kegg, aliases_r, abbreviation_r, deltag_r, smiles_r, kegg_r, rawdata]
 
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gets name, abbreviation, deltaG, SMILES and KEGG id of '
+                                                 'ModelSEED compounds.')
+    parser.add_argument('--first', type=int, default=1, help='first compound number (cpd00001)')
+    parser.add_argument('--last', type=int, default=14, help='last compound number')
+    parser.add_argument('--base-url', default='https://modelseed.org', help='ModelSEED API (or a fixture server)')
+    parser.add_argument('--fixtures', help='directory with saved responses ({id}.json), used instead of the API')
+    parser.add_argument('--checkpoint', default='./seeddata.checkpoint.jsonl')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=4, help='requests per second')
+    parser.add_argument('--no-cache', action='store_true', help='fetch all responses again, without caching them')
+    args = parser.parse_args()
 
-num = list(range(1, 15))
-idlist = []
-for n in num:
-    if n <= 9:
-        id = 'cpd' + '0000' + str(n)
-    elif 10 <= n <= 99:
-        id = 'cpd' + '000' + str(n)
-    elif 100 <= n <= 999:
-        id = 'cpd' + '00' + str(n)
-    elif 1000 <= n <= 9999:
-        id = 'cpd' + '0' + str(n)
+    idlist = ['cpd{:05d}'.format(n) for n in range(args.first, args.last + 1)]
+    if args.fixtures:
+        source = DirectorySource(args.fixtures)
     else:
-        id = 'cpd' + str(n)
-    idlist.append(id)
-
-out = pd.DataFrame(index=idlist, columns=['aliases', 'abbreviation', 'deltag', 'smiles', 'kegg', 'aliases_r', 'abbreviation_r', 'deltag_r', 'smiles_r', 'kegg_r', 'rawdata'])
-for i in trange(len(idlist)):
-    time.sleep(0.25)
-    data = crawler_modelseed(idlist[i])
-    out.loc[idlist[i], :] = data
-
-out2 = pd.DataFrame(index=idlist, columns=['aliases', 'abbreviation', 'deltag', 'smiles', 'kegg'])
-out2.loc[:, 'aliases'] = out.loc[:, 'aliases']
-out2.loc[:, 'abbreviation'] = out.loc[:, 'abbreviation']
-out2.loc[:, 'deltag'] = out.loc[:, 'deltag']
-out2.loc[:, 'smiles'] = out.loc[:, 'smiles']
-out2.loc[:, 'kegg'] = out.loc[:, 'kegg']
-out2.to_excel('./seeddata.xlsx')
+        source = HttpSource(URL_TEMPLATE, base_url=args.base_url)
+    with tqdm(total=len(idlist)) as bar:
+        data = run_fetch(idlist, source, parse_modelseed, checkpoint_path=args.checkpoint,
+                         concurrency=args.concurrency, rate=args.rate,
+                         cache=None if args.no_cache else RESPONSE_CACHE,
+                         progress=lambda done, total: bar.update(done - bar.n))
 
+    out = pd.DataFrame.from_dict(data, orient='index',
+                                 columns=['aliases', 'abbreviation', 'deltag', 'smiles', 'kegg', 'aliases_r',
+                                          'abbreviation_r', 'deltag_r', 'smiles_r', 'kegg_r', 'rawdata'])
+    out2 = out.loc[:, ['aliases', 'abbreviation', 'deltag', 'smiles', 'kegg']]
+    out2.to_excel('./seeddata.xlsx')
@@ -3,21 +3,30 @@ import numpy as np
 import re
 import json
 import joblib
+import os
 import sys
+from scipy import sparse
+from scipy.special import logsumexp
 
 # to your dGPredictor\CC path
 sys.path.append(r"D:\model_research\dGPredictor\CC")
 sys.path.append('./CC/')
 # to your ChemAxon\MarvinSuite\bin\cxcalc.exe path
 sys.path.append(r"C:\Program Files\ChemAxon\MarvinSuite\bin\cxcalc.exe")
+# yeast-GEM repository, for the code package (needs code/requirements/requirements.txt installed as well)
+REPO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', '..'))
+sys.path.insert(0, REPO_PATH)
 
 import chemaxon
 from chemaxon import *
 from compound import Compound
 from compound_cacher import CompoundCacher
+from thermodynamic_constants import R, debye_huckel
 from rdkit.Chem import rdChemReactions as Reactions
 from rdkit.Chem import Draw
 from rdkit import Chem
+from code.decomposition import decompose_smiles
+from code.raven_yaml import YML_PATH, iter_raven_yaml
 
 # to your dGPredictor\data\cache_compounds_20160818.csv path
 def load_smiles():
@@ -44,9 +53,15 @@ def load_model():
     return loaded_model
 
 
+# compound cache of this process, loaded once and shared by all calls:
+_ccache = None
+
+
 def load_compound_cache():
-    ccache = CompoundCacher()
-    return ccache
+    global _ccache
+    if _ccache is None:
+        _ccache = CompoundCacher()
+    return _ccache
 
 
 def count_substructures(radius, molecule):
@@ -92,28 +107,17 @@ def count_substructures(radius, molecule):
     return smi_count
 
 
-def decompse_novel_mets_rad1(novel_smiles, radius=1):
-    decompose_vector = dict()
+def decompse_novel_mets(novel_smiles, radii=(1, 2)):
+    # both radii in one pass per molecule, memoized on disk by canonical SMILES
+    return decompose_smiles(novel_smiles, radii)
 
-    for cid, smiles_pH7 in novel_smiles.items():
-        mol = Chem.MolFromSmiles(smiles_pH7)
-        mol = Chem.RemoveHs(mol)
-        # Chem.RemoveStereochemistry(mol)
-        smi_count = count_substructures(radius, mol)
-        decompose_vector[cid] = smi_count
-    return decompose_vector
 
+def decompse_novel_mets_rad1(novel_smiles, radius=1):
+    return decompse_novel_mets(novel_smiles, (radius,))[radius]
 
-def decompse_novel_mets_rad2(novel_smiles, radius=2):
-    decompose_vector = dict()
 
-    for cid, smiles_pH7 in novel_smiles.items():
-        mol = Chem.MolFromSmiles(smiles_pH7)
-        mol = Chem.RemoveHs(mol)
-        # Chem.RemoveStereochemistry(mol)
-        smi_count = count_substructures(radius, mol)
-        decompose_vector[cid] = smi_count
-    return decompose_vector
+def decompse_novel_mets_rad2(novel_smiles, radius=2):
+    return decompse_novel_mets(novel_smiles, (radius,))[radius]
 
 # def parse_rule(rxn,df_rule):
 #     df = df_rule
@@ -321,7 +325,7 @@ def get_rule(rxn_dict, molsig1, molsig2, novel_decomposed1, novel_decomposed2):
 
 
 def get_ddG0(rxn_dict, pH, I, novel_mets):
-    ccache = CompoundCacher()
+    ccache = load_compound_cache()
     # ddG0 = get_transform_ddG0(rxn_dict, ccache, pH, I, T)
     T = 298.15
     ddG0_forward = 0
@@ -379,6 +383,270 @@ def parse_novel_smiles(result):
     return novel_smiles
 
 
+# to your dGPredictor\data\group_names_r1.txt and group_names_r2_py3_modified_manual.txt paths
+def load_group_names():
+    with open(r'D:\model_research\dGPredictor\data\group_names_r1.txt') as moieties_r1:
+        moie_r1 = moieties_r1.read().splitlines()
+    with open(r'D:\model_research\dGPredictor\data\group_names_r2_py3_modified_manual.txt') as moieties_r2:
+        moie_r2 = moieties_r2.read().splitlines()
+    return moie_r1, moie_r2
+
+
+def get_molsig_matrix(molsig, group_names, novel_decomposed=None):
+    """Builds the molecular signature of all compounds once, as a sparse matrix.
+
+    Returns
+    -------
+    scipy.sparse.csc_matrix
+        Count of each group (rows, in the order of group_names) in each compound (columns).
+    dict
+        Column index of each compound id.
+    """
+    if novel_decomposed is not None:
+        molsig = {**molsig, **novel_decomposed}
+    group_index = {group: i for i, group in enumerate(group_names)}
+    compound_index = {cid: j for j, cid in enumerate(molsig)}
+    rows, cols, values = [], [], []
+    for cid, groups in molsig.items():
+        for group, count in groups.items():
+            # groups missing from group_names are dropped, as by the reindex of get_rule:
+            if group in group_index and count:
+                rows.append(group_index[group])
+                cols.append(compound_index[cid])
+                values.append(count)
+    matrix = sparse.csc_matrix((values, (rows, cols)), shape=(len(group_names), len(compound_index)))
+    return matrix, compound_index
+
+
+def get_rules_batch(rxn_dicts, molsig_matrices):
+    """Builds the rule matrix (same features as get_rule) of many reactions with one sparse product per
+    radius.
+
+    Returns
+    -------
+    numpy.ndarray
+        Rule of each valid reaction (rows).
+    list of int
+        Positions in rxn_dicts of the valid reactions.
+    dict
+        Position -> error message of the reactions with compounds without molecular signature.
+    """
+    errors = {}
+    valid = []
+    for position, rxn_dict in enumerate(rxn_dicts):
+        for _, compound_index in molsig_matrices:
+            missing = [met for met in rxn_dict if met not in ("C00080", "C00282") and met not in compound_index]
+            if missing:
+                errors[position] = 'KeyError arised:{}'.format(KeyError(missing[0]))
+                break
+        else:
+            valid.append(position)
+
+    blocks = []
+    for matrix, compound_index in molsig_matrices:
+        rows, cols, values = [], [], []
+        for column, position in enumerate(valid):
+            for met, stoic in rxn_dicts[position].items():
+                if met == "C00080" or met == "C00282":
+                    continue  # hydogen is zero
+                rows.append(compound_index[met])
+                cols.append(column)
+                values.append(stoic)
+        stoichiometry = sparse.csc_matrix((values, (rows, cols)), shape=(matrix.shape[1], len(valid)))
+        rules = (matrix @ stoichiometry).T.toarray()
+        blocks += [rules, np.zeros((len(valid), 44))]
+    return np.concatenate(blocks, 1), valid, errors
+
+
+class CompoundTable:
+    """Pseudoisomer tables of a set of compounds as padded arrays, to evaluate their transformed
+    formation energies (Compound.transform_pH7) over whole grids of conditions at once.
+
+    Parameters
+    ----------
+    compounds : dict
+        Compound id -> Compound.
+    """
+
+    def __init__(self, compounds):
+        self.compound_ids = list(compounds)
+        self.compound_index = {cid: j for j, cid in enumerate(self.compound_ids)}
+        n_species = max([len(comp.zs) for comp in compounds.values() if comp.inchi is not None] + [1])
+        shape = (len(self.compound_ids), n_species)
+        # cumulative pKa sums give the dG0 of each species relative to the least protonated one:
+        self.pka_sums = np.zeros(shape)
+        self.nHs = np.zeros(shape)
+        self.zs = np.zeros(shape)
+        self.species_mask = np.zeros(shape, dtype=bool)
+        self.major_pka_sums = np.zeros(len(self.compound_ids))
+        for j, comp in enumerate(compounds.values()):
+            if comp.inchi is None:
+                self.species_mask[j, 0] = True  # no transform
+                continue
+            n = len(comp.zs)
+            self.pka_sums[j, :n] = np.cumsum([0] + list(comp.pKas))
+            self.nHs[j, :n] = comp.nHs
+            self.zs[j, :n] = comp.zs
+            self.species_mask[j, :n] = True
+            self.major_pka_sums[j] = self.pka_sums[j, comp.majorMSpH7]
+
+    @classmethod
+    def from_ids(cls, compound_ids, novel_mets=None, ccache=None):
+        """Builds the table of compounds of the cache (or novel compounds).
+
+        Returns
+        -------
+        CompoundTable
+        dict
+            Compound id -> error message of the compounds that are not in the cache.
+        """
+        if ccache is None:
+            ccache = load_compound_cache()
+        compounds = {}
+        errors = {}
+        for compound_id in compound_ids:
+            try:
+                if novel_mets != None and compound_id in novel_mets:
+                    compounds[compound_id] = novel_mets[compound_id]
+                else:
+                    compounds[compound_id] = ccache.get_compound(compound_id)
+            except KeyError as e:
+                errors[compound_id] = 'KeyError arised:{}'.format(e)
+        return cls(compounds), errors
+
+    def transform_pH7(self, pH, I, T=298.15):
+        """Transform of the major species at pH 7 of every compound, over a grid of conditions.
+
+        Parameters
+        ----------
+        pH, I, T : float or numpy.ndarray
+            Conditions, broadcast against each other (e.g. np.meshgrid of pH and I values).
+
+        Returns
+        -------
+        numpy.ndarray
+            Transforms in kJ/mol, of shape (number of compounds, *grid shape).
+        """
+        pH, I, T = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (pH, I, T)))
+        grid_shape = pH.shape
+        pH, I, T = pH.ravel(), I.ravel(), T.ravel()
+        # Debye-Huckel term, once per distinct (I, T):
+        conditions, inverse = np.unique(np.stack([I, T], 1), axis=0, return_inverse=True)
+        DH = np.array([debye_huckel((i, t)) for i, t in conditions])[inverse.ravel()]
+        RT = R * T
+        RTln10 = RT * np.log(10)
+
+        # dG0' = dG0 + nH * (R T ln(10) pH + DH) - charge^2 * DH, for each species and condition
+        dG0_prime = (-self.pka_sums[:, :, None] * RTln10 + self.nHs[:, :, None] * (RTln10 * pH + DH)
+                     - self.zs[:, :, None] ** 2 * DH)
+        exponents = np.where(self.species_mask[:, :, None], dG0_prime / -RT, -np.inf)
+        transforms = -RT * logsumexp(exponents, axis=1) + self.major_pka_sums[:, None] * RTln10
+        return transforms.reshape((len(self.compound_ids),) + grid_shape)
+
+
+def get_ddG0_grid(rxn_dicts, pH, I, T=298.15, novel_mets=None, ccache=None):
+    """Computes the transformed energy of many reactions over a grid of conditions, as a product of the
+    sparse stoichiometric matrix and the transforms of all compounds (see CompoundTable).
+
+    Returns
+    -------
+    numpy.ndarray
+        ddG0 of each reaction (rows, NaN if a compound is not in the cache) in each condition.
+    dict
+        Position -> error message of the reactions with unknown compounds.
+    """
+    compound_ids = list(dict.fromkeys(met for rxn_dict in rxn_dicts for met in rxn_dict))
+    table, compound_errors = CompoundTable.from_ids(compound_ids, novel_mets, ccache)
+    errors = {}
+    rows, cols, values = [], [], []
+    for position, rxn_dict in enumerate(rxn_dicts):
+        missing = [met for met in rxn_dict if met in compound_errors]
+        if missing:
+            errors[position] = compound_errors[missing[0]]
+            continue
+        for compound_id, coeff in rxn_dict.items():
+            rows.append(position)
+            cols.append(table.compound_index[compound_id])
+            values.append(coeff)
+    stoichiometry = sparse.csr_matrix((values, (rows, cols)), shape=(len(rxn_dicts), len(table.compound_ids)))
+    transforms = table.transform_pH7(pH, I, T)
+    grid_shape = transforms.shape[1:]
+    ddG0s = stoichiometry @ transforms.reshape(len(table.compound_ids), -1)
+    ddG0s = ddG0s.reshape((len(rxn_dicts),) + grid_shape)
+    ddG0s[list(errors)] = np.nan
+    return ddG0s, errors
+
+
+def get_ddG0_batch(rxn_dicts, pH, I, novel_mets=None, ccache=None):
+    """Computes the transformed energy of many reactions in one condition (see get_ddG0_grid).
+
+    Returns
+    -------
+    list of float
+        ddG0 of each reaction (None if a compound is not in the cache).
+    dict
+        Position -> error message of the reactions with unknown compounds.
+    """
+    ddG0s, errors = get_ddG0_grid(rxn_dicts, pH, I, 298.15, novel_mets, ccache)
+    return [None if position in errors else ddG0 for position, ddG0 in enumerate(ddG0s)], errors
+
+
+def get_dG0_batch(rxn_strs, pH, I, loaded_model, molsig_r1, molsig_r2, group_names=None, novel_decomposed_r1=None,
+                  novel_decomposed_r2=None, novel_mets=None, batch_size=512):
+    """Batch version of get_dG0: the molecular signatures are built once as sparse matrices, and the
+    regressor is called once per batch of reactions.
+
+    Returns
+    -------
+    pandas.DataFrame
+        In the format of dgpred_rxnG.csv: the columns 'eq' and 'detaG' (dG0 in kJ/mol, or the error
+        message of the reaction).
+    """
+    if group_names is None:
+        group_names = load_group_names()
+    molsig_matrices = [get_molsig_matrix(molsig_r1, group_names[0], novel_decomposed_r1),
+                       get_molsig_matrix(molsig_r2, group_names[1], novel_decomposed_r2)]
+    rxn_dicts = [parse_formula(rxn_str) for rxn_str in rxn_strs]
+    results = [None] * len(rxn_strs)
+    X, valid, errors = get_rules_batch(rxn_dicts, molsig_matrices)
+    ddG0s, ddG0_errors = get_ddG0_batch(rxn_dicts, pH, I, novel_mets)
+    for start in range(0, len(valid), batch_size):
+        ymean, _ = loaded_model.predict(X[start:start + batch_size], return_std=True)
+        for position, mu in zip(valid[start:start + batch_size], ymean):
+            if position not in ddG0_errors:
+                results[position] = mu + ddG0s[position]
+    for position, error in {**ddG0_errors, **errors}.items():
+        results[position] = error
+    return pd.DataFrame({'eq': rxn_strs, 'detaG': results})
+
+
+def get_model_formulas(yml_path=None):
+    """Gets the reactions of the model as KEGG formulas (e.g. 'C00256 + 2.0 C00125 <=> 2.0 C00126 +
+    C00022'). Metabolites without KEGG id keep their model id, so that they are reported as missing
+    compounds.
+
+    Returns
+    -------
+    list of str
+        One formula per reaction, in the order of data/databases/model_rxnDeltaG.csv.
+    """
+    kegg_ids = {}
+    formulas = {}
+    for section, entry in iter_raven_yaml(yml_path or YML_PATH, sections={'metabolites', 'reactions'},
+                                          fields={'id', 'annotation', 'metabolites'}):
+        if section == 'metabolites':
+            kegg_id = entry.get('annotation', {}).get('kegg.compound', entry['id'])
+            kegg_ids[entry['id']] = kegg_id[0] if isinstance(kegg_id, list) else kegg_id
+        else:
+            sides = [[], []]
+            for met_id, coeff in entry.get('metabolites', {}).items():
+                amount = '' if abs(coeff) == 1 else '{} '.format(float(abs(coeff)))
+                sides[coeff > 0].append(amount + kegg_ids[met_id])
+            formulas[entry['id']] = ' + '.join(sides[0]) + ' <=> ' + ' + '.join(sides[1])
+    rxn_ids = pd.read_csv(os.path.join(REPO_PATH, 'data', 'databases', 'model_rxnDeltaG.csv'))['Var1']
+    return [formulas[rxn_id] for rxn_id in rxn_ids]
+
+
 if __name__ == '__main__':
 
     pH = 7.0
@@ -387,6 +655,19 @@ if __name__ == '__main__':
     molsig_r1 = load_molsig_rad1()
     molsig_r2 = load_molsig_rad2()
     loaded_model = load_model()
+
+    # batch mode: python run_dgpredictor.py batch [formula list, one KEGG formula per line]
+    # predicts all model reactions (or the listed formulas) and writes dgpred_rxnG.csv
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        if len(sys.argv) > 2:
+            with open(sys.argv[2]) as formula_file:
+                rxn_strs = [line.strip() for line in formula_file if line.strip()]
+        else:
+            rxn_strs = get_model_formulas()
+        result = get_dG0_batch(rxn_strs, pH, I, loaded_model, molsig_r1, molsig_r2)
+        result.to_csv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dgpred_rxnG.csv'))
+        sys.exit()
+
     # provide the rxn with full kegg annotation
     rxn_str = 'C03044 + C00003 <=> C00810 + C00080 + C00004'
     try:
@@ -1,45 +1,51 @@
-import requests
-from bs4 import BeautifulSoup
-import time
-from tqdm import tqdm, trange
+import argparse
 import re
+import sys
+from os.path import abspath, dirname
 import pandas as pd
-import time
+from tqdm import tqdm
 
-def crawler_uniprot(gene):
-    headers = {'user-agent': "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36"}
-    url = r'https://rest.uniprot.org/uniprotkb/search?fields=accession%2Creviewed%2Cid%2Cprotein_name%2Cgene_names%2Corganism_name%2Clength&query=%28{}%29'.format(gene)
-    response = requests.request("GET", url, headers=headers)
-    rawdata = BeautifulSoup(response.text, 'html.parser')
+sys.path.insert(0, dirname(dirname(dirname(dirname(abspath(__file__))))))
+from code.fetch import RESPONSE_CACHE, DirectorySource, HttpSource, run_fetch
+from code.io import REPO_PATH
+
+URL_TEMPLATE = ('/uniprotkb/search?fields=accession%2Creviewed%2Cid%2Cprotein_name%2Cgene_names%2Corganism_name'
+                '%2Clength&query=%28{key}%29')
+
+
+def parse_uniprot(gene, text):
     try:
         recom0 = re.compile(r'"primaryAccession".*S288c')
-        id0 = recom0.findall(str(rawdata))
+        id0 = recom0.findall(text)
         recom = re.compile(r'"primaryAccession":"[0-9a-zA-Z]*"')
         id = recom.findall(id0[0])
         uniprotid = id[0].split('"')[3]
-    except:
+    except IndexError:
         uniprotid = ""
     return uniprotid
 
-sgd = pd.read_table('../../databases/SGDgeneNames.tsv')
-sgd.index = sgd.loc[:, 'Systematic_name']
-genename = list(sgd.loc[:, 'Systematic_name'])
-c = 0
-for g in genename:
-    try:
-        time.sleep(0.5)
-        print(c/len(genename))
-        print(g)
-        sgd.loc[g, 'Uniprot_id'] = crawler_uniprot(g)
-        print(sgd.loc[g, 'Uniprot_id'])
-        c += 1
-    except requests.exceptions.ConnectionError:
-        time.sleep(5)
-        print(c/len(genename))
-        print(g)
-        sgd.loc[g, 'Uniprot_id'] = crawler_uniprot(g)
-        print(sgd.loc[g, 'Uniprot_id'])
-        c += 1
-sgd.to_csv('./SGD_with_Uniprot.csv', index=False)
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Adds the UniProt id of each gene of SGDgeneNames.tsv.')
+    parser.add_argument('--base-url', default='https://rest.uniprot.org', help='UniProt API (or a fixture server)')
+    parser.add_argument('--fixtures', help='directory with saved responses ({gene}.json), used instead of the API')
+    parser.add_argument('--checkpoint', default='./SGD_with_Uniprot.checkpoint.jsonl')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=5, help='requests per second')
+    parser.add_argument('--no-cache', action='store_true', help='fetch all responses again, without caching them')
+    args = parser.parse_args()
 
+    sgd = pd.read_table(f'{REPO_PATH}/data/databases/SGDgeneNames.tsv')
+    sgd.index = sgd.loc[:, 'Systematic_name']
+    genename = list(sgd.loc[:, 'Systematic_name'])
+    if args.fixtures:
+        source = DirectorySource(args.fixtures)
+    else:
+        source = HttpSource(URL_TEMPLATE, base_url=args.base_url)
+    with tqdm(total=len(genename)) as bar:
+        uniprot_ids = run_fetch(genename, source, parse_uniprot, checkpoint_path=args.checkpoint,
+                                concurrency=args.concurrency, rate=args.rate,
+                                cache=None if args.no_cache else RESPONSE_CACHE,
+                                progress=lambda done, total: bar.update(done - bar.n))
+    sgd.loc[:, 'Uniprot_id'] = [uniprot_ids[g] for g in genename]
+    sgd.to_csv('./SGD_with_Uniprot.csv', index=False)